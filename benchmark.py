@@ -0,0 +1,500 @@
+#!/usr/bin/python2.7
+
+"""
+Copyright (C) 2012 KevinX Chang.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, Inc., 675 Mass Ave, Cambridge MA 02139,
+USA; either version 2 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+Benchmark of the checkers on a synthetic git repository.
+
+A throwaway repository is generated with the requested number of files,
+lines, TODOs, style violations, commits and authors. Every tool then runs
+on it in a forked process of its own, which records:
+
+  wall                 seconds, end to end (the best of --repeat runs)
+  max_rss_kb           peak resident memory of the tool's process
+  children_max_rss_kb  peak resident memory of the commands it ran
+  subprocesses         number of commands it ran (os.popen, os.system and
+                       subprocess)
+  phases               seconds spent in discovery, linting, blaming, the
+                       result cache, ...; 'other' is the rest
+  startup              seconds that 'pynalysis.py TOOL --help' takes in
+                       a fresh interpreter, the best of --repeat runs: the
+                       cost of starting the tool, before it does any work
+
+The results are printed (or saved with --output) as JSON. Given the saved
+results of an earlier run as --baseline, the benchmark exits with an error
+if a tool got slower, bigger or ran more commands by more than
+--threshold.
+
+Usage:
+benchmark.py --files=200 --lines=150 --output=bench.json
+benchmark.py --files=200 --lines=150 --baseline=bench.json --threshold=0.2
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+import types
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# tool => (module, arguments)
+TOOLS = (
+    ('pylint', ('check_pylint',
+                ['--recursive', '--no-cache',
+                 '--rcfile=%s' % os.path.join(PACKAGE_DIR, 'pylint.rc')])),
+    ('pep8', ('check_pep8', ['--recursive', '--no-cache'])),
+    ('todos', ('check_todos', ['--no-cache'])),
+    ('misc', ('check_misc', [])),
+    # last, since it rewrites the files
+    ('fix', ('fix_python_code', ['--single-pass'])),
+)
+TOOL_NAMES = [name for name, _ in TOOLS]
+
+# phase => functions the phase is made of, as 'module:attribute'. These
+# are patched before any tool is imported, so the names the tools import
+# are the timed ones.
+PHASES = (
+    ('discovery', ('discovery:iter_files',)),
+    ('blame', ('vcs:run_blame', 'vcs:run_blame_lines')),
+    ('cache', ('result_cache:ResultCache.get',
+               'result_cache:ResultCache.put')),
+    ('lint', ('linter_backends:SubprocessPep8.check',
+              'linter_backends:InProcessPep8.check',
+              'linter_backends:SubprocessPylint.check',
+              'linter_backends:SubprocessPylint.check_batch',
+              'linter_backends:InProcessPylint.check',
+              'linter_backends:InProcessPylint.check_batch')),
+)
+# phases made of functions of the tool itself, patched once it's imported
+TOOL_PHASES = {
+    'misc': (('check', ('check_misc:FileRules.check_file',)),),
+    'fix': (('fix', ('fix_python_code:apply_fix',)),
+            ('io', ('fix_python_code:read_lines',
+                    'fix_python_code:write_lines'))),
+}
+METRICS = ('wall', 'max_rss_kb', 'subprocesses', 'startup')
+DEFAULT_THRESHOLD = 0.1
+
+WORDS = ('alpha', 'beta', 'gamma', 'delta', 'count', 'value', 'total',
+         'index', 'result', 'item', 'name', 'data')
+# a clean line and its variant with a style violation
+VIOLATIONS = (
+    ('    x = [a, b]', '    x = [a,b]'),
+    ('    x = a + b', '    x = a + b   '),
+    ('    x = a', '    x = a + \\'),
+    ('    x = %s' % ' + '.join(['value'] * 8),
+     '    x = %s' % ' + '.join(['value'] * 16)),
+    ('    x = (a, b)', '    x = ( a, b )'),
+)
+
+
+def configure_argument_parser(parser=argparse.ArgumentParser()):
+    """
+    param {argparse.ArgumentParser} parser: a parser that we populate
+        specific options.
+    """
+    parser.add_argument('--files', dest='files',
+                        action='store', type=int,
+                        help='Number of files in the repository',
+                        default=100)
+    parser.add_argument('--lines', dest='lines',
+                        action='store', type=int,
+                        help='Lines per file', default=100)
+    parser.add_argument('--todo-density', dest='todo_density',
+                        action='store', type=float,
+                        help='Ratio of lines with a TODO', default=0.02)
+    parser.add_argument('--violation-density', dest='violation_density',
+                        action='store', type=float,
+                        help='Ratio of lines with a style violation',
+                        default=0.05)
+    parser.add_argument('--commits', dest='commits',
+                        action='store', type=int,
+                        help='Number of commits in the history', default=10)
+    parser.add_argument('--authors', dest='authors',
+                        action='store', type=int,
+                        help='Number of committers', default=3)
+    parser.add_argument('--seed', dest='seed',
+                        action='store', type=int,
+                        help='Seed of the generator', default=0)
+    parser.add_argument('--tools', dest='tools',
+                        nargs='*', choices=TOOL_NAMES,
+                        help='[optional] Only benchmark these tools')
+    parser.add_argument('--repeat', dest='repeat',
+                        action='store', type=int,
+                        help='Runs per tool, the fastest is kept',
+                        default=1)
+    parser.add_argument('--repo', dest='repo',
+                        action='store',
+                        help='[optional] Generate the repository here and '
+                             'keep it, rather than in a temporary directory',
+                        default=None)
+    parser.add_argument('--output', dest='output',
+                        action='store',
+                        help='[optional] Save the results to this file',
+                        default=None)
+    parser.add_argument('--baseline', dest='baseline',
+                        action='store',
+                        help='[optional] Results of an earlier run to '
+                             'compare with',
+                        default=None)
+    parser.add_argument('--threshold', dest='threshold',
+                        action='store', type=float,
+                        help='Allowed relative regression against the '
+                             'baseline',
+                        default=DEFAULT_THRESHOLD)
+    return parser
+
+
+def _git(repo, args, author=None, date=None):
+    env = dict(os.environ)
+    if author:
+        for role in ('AUTHOR', 'COMMITTER'):
+            env['GIT_%s_NAME' % role] = author
+            env['GIT_%s_EMAIL' % role] = '%s@example.com' % author
+            env['GIT_%s_DATE' % role] = '%d +0000' % date
+    subprocess.check_call(['git'] + args, cwd=repo, env=env,
+                          stdout=open(os.devnull, 'w'))
+
+
+def generate_line(rand, todo_density, violation_density, authors):
+    """
+    Return a line of a function body, which may have a TODO or a style
+    violation.
+    """
+    dice = rand.random()
+    if dice < todo_density:
+        if rand.random() < 0.5:
+            return '    # TODO(%s): use %s' % (rand.choice(authors),
+                                               rand.choice(WORDS))
+        return '    # FIXME: %s is slow' % rand.choice(WORDS)
+    clean, violation = rand.choice(VIOLATIONS)
+    if dice < todo_density + violation_density:
+        return violation
+    return clean
+
+
+def generate_file(rand, lines, todo_density, violation_density, authors):
+    """
+    Return the lines of a Python module of functions.
+    """
+    buff = ['"""', 'Generated module.', '"""', '']
+    func_idx = 0
+    while len(buff) < lines:
+        buff.extend(['', 'def %s_%d(a, b):' % (rand.choice(WORDS), func_idx)])
+        for _ in range(rand.randint(3, 12)):
+            buff.append(generate_line(rand, todo_density,
+                                      violation_density, authors))
+        buff.append('    return x')
+        func_idx += 1
+    return buff[:lines - 1] + ['    return x']
+
+
+def generate_repo(repo, files=100, lines=100, todo_density=0.02,
+                  violation_density=0.05, commits=10, authors=3, seed=0):
+    """
+    Create a git repository of Python files in repo. The first commit adds
+    all of the files; every later commit, by the next author, rewrites
+    some lines of a few files, so that blame has some history to walk.
+    """
+    rand = random.Random(seed)
+    author_names = ['author%d' % idx for idx in range(max(authors, 1))]
+    _git(repo, ['init', '-q', '.'])
+    contents = {}
+    for idx in range(files):
+        path = os.path.join('pkg%d' % (idx / 20), 'module%d.py' % idx)
+        contents[path] = generate_file(rand, lines, todo_density,
+                                       violation_density, author_names)
+    date = 1300000000
+    for commit_idx in range(max(commits, 1)):
+        if commit_idx:
+            for path in rand.sample(sorted(contents),
+                                    max(1, files / max(commits, 1))):
+                lines_of_file = contents[path]
+                for _ in range(max(1, lines / 10)):
+                    row = rand.randrange(4, len(lines_of_file) - 1)
+                    if lines_of_file[row].startswith('    '):
+                        lines_of_file[row] = generate_line(
+                            rand, todo_density, violation_density,
+                            author_names)
+        for path, lines_of_file in contents.iteritems():
+            dirname = os.path.join(repo, os.path.dirname(path))
+            if not os.path.isdir(dirname):
+                os.makedirs(dirname)
+            fd = open(os.path.join(repo, path), 'w')
+            fd.write("\n".join(lines_of_file) + "\n")
+            fd.close()
+        _git(repo, ['add', '-A', '.'])
+        date += 86400
+        _git(repo, ['commit', '-q', '-m', 'commit %d' % commit_idx],
+             author=author_names[commit_idx % len(author_names)], date=date)
+
+
+_ACTIVE_PHASE = []
+
+
+def _timed(phases, phase, func):
+    """
+    Wrap func so that its time adds up in phases[phase]. Calls made while
+    another phase is timed count for the outer phase only. The time spent
+    in a generator is what its iteration takes.
+    """
+    def timed_generator(generator):
+        while True:
+            start = time.time()
+            _ACTIVE_PHASE.append(phase)
+            try:
+                item = next(generator)
+            finally:
+                _ACTIVE_PHASE.pop()
+                phases[phase] += time.time() - start
+            yield item
+
+    def wrapper(*args, **kwargs):
+        if _ACTIVE_PHASE:
+            return func(*args, **kwargs)
+        start = time.time()
+        _ACTIVE_PHASE.append(phase)
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            _ACTIVE_PHASE.pop()
+            phases[phase] += time.time() - start
+        if isinstance(result, types.GeneratorType):
+            return timed_generator(result)
+        return result
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
+def _patch_phases(phases, phase_specs):
+    for phase, targets in phase_specs:
+        phases.setdefault(phase, 0.0)
+        for target in targets:
+            module_name, attribute = target.split(':')
+            owner = __import__(module_name)
+            names = attribute.split('.')
+            for name in names[:-1]:
+                owner = getattr(owner, name)
+            func = getattr(owner, names[-1])
+            func = getattr(func, 'im_func', func)  # unbound method
+            setattr(owner, names[-1], _timed(phases, phase, func))
+
+
+def _count_subprocesses(counter):
+    """
+    Count every command run through os.popen, os.system and subprocess.
+    """
+    def counted(func):
+        def wrapper(*args, **kwargs):
+            counter[0] += 1
+            return func(*args, **kwargs)
+        return wrapper
+    os.popen = counted(os.popen)
+    os.system = counted(os.system)
+    popen_init = subprocess.Popen.__init__
+
+    def init(self, *args, **kwargs):
+        counter[0] += 1
+        popen_init(self, *args, **kwargs)
+    subprocess.Popen.__init__ = init
+
+
+def _run_tool_in_child(tool, module_name, args):
+    """
+    The forked half of run_tool: run the tool with its output thrown away
+    and return its measurements.
+    """
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+    sys.path.insert(0, PACKAGE_DIR)
+    subprocesses = [0]
+    phases = {}
+    _count_subprocesses(subprocesses)
+    _patch_phases(phases, PHASES)
+    module = __import__(module_name)
+    _patch_phases(phases, TOOL_PHASES.get(tool, ()))
+    sys.argv = [module_name + '.py'] + args
+    error = None
+    exit_code = 0
+    start = time.time()
+    try:
+        module.run()
+    except SystemExit as e:
+        exit_code = e.code
+    except Exception:
+        error = traceback.format_exc()
+    wall = time.time() - start
+    sys.stdout.flush()
+    phases['other'] = max(0.0, wall - sum(phases.values()))
+    return {
+        'wall': wall,
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'children_max_rss_kb': resource.getrusage(
+            resource.RUSAGE_CHILDREN).ru_maxrss,
+        'subprocesses': subprocesses[0],
+        'phases': phases,
+        'exit_code': exit_code,
+        'error': error,
+    }
+
+
+def run_tool(repo, tool):
+    """
+    Run a tool on repo in a forked process, and return its measurements.
+    The tools are only ever imported in the child, so that every run pays
+    for its imports and detects the VCS of the repository.
+    """
+    module_name, args = dict(TOOLS)[tool]
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        try:
+            os.chdir(repo)
+            result = _run_tool_in_child(tool, module_name, args)
+        except BaseException:
+            result = {'error': traceback.format_exc()}
+        os.write(write_fd, json.dumps(result))
+        os._exit(0)
+    os.close(write_fd)
+    chunks = []
+    while True:
+        chunk = os.read(read_fd, 1 << 16)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    os.close(read_fd)
+    os.waitpid(pid, 0)
+    return json.loads(''.join(chunks) or '{"error": "no result"}')
+
+
+def measure_startup(repo, tool, repeat=1):
+    """
+    Return the seconds that 'pynalysis.py TOOL --help' takes in repo, in
+    a fresh interpreter, the best of repeat runs.
+    """
+    cmd = [sys.executable, os.path.join(PACKAGE_DIR, 'pynalysis.py'), tool,
+           '--help']
+    best = None
+    devnull = open(os.devnull, 'w')
+    try:
+        for _ in range(max(repeat, 1)):
+            start = time.time()
+            if subprocess.call(cmd, cwd=repo, stdout=devnull,
+                               stderr=devnull) != 0:
+                raise RuntimeError("%s failed: %s" % (tool, ' '.join(cmd)))
+            wall = time.time() - start
+            if best is None or wall < best:
+                best = wall
+    finally:
+        devnull.close()
+    return best
+
+
+def run_benchmark(repo, tools, repeat=1):
+    """
+    Return tool => measurements of the fastest of repeat runs.
+    """
+    results = {}
+    for tool in tools:
+        for _ in range(max(repeat, 1)):
+            result = run_tool(repo, tool)
+            if result.get('error'):
+                raise RuntimeError("%s failed:\n%s" % (tool, result['error']))
+            if tool not in results or result['wall'] < results[tool]['wall']:
+                results[tool] = result
+        results[tool]['startup'] = measure_startup(repo, tool, repeat)
+    return results
+
+
+def compare_results(baseline, results, threshold):
+    """
+    Return a description of every metric of a tool that regressed by more
+    than threshold against the baseline.
+    """
+    regressions = []
+    for tool, result in sorted(results.iteritems()):
+        if tool not in baseline:
+            continue
+        for metric in METRICS:
+            old = baseline[tool].get(metric)
+            new = result.get(metric)
+            if not old or new is None:
+                continue
+            change = float(new - old) / old
+            if change > threshold:
+                regressions.append(
+                    "%s %s regressed by %.0f%%: %s => %s" % (
+                        tool, metric, change * 100, old, new))
+    return regressions
+
+
+def run():
+    parser = configure_argument_parser()
+    options = parser.parse_args(sys.argv[1:])
+
+    params = dict((name, getattr(options, name)) for name in (
+        'files', 'lines', 'todo_density', 'violation_density', 'commits',
+        'authors', 'seed'))
+    tools = [tool for tool in TOOL_NAMES
+             if not options.tools or tool in options.tools]
+    repo = options.repo or tempfile.mkdtemp(prefix='pynalysis-bench-')
+    try:
+        if not os.path.isdir(repo):
+            os.makedirs(repo)
+        generate_repo(repo, **params)
+        results = run_benchmark(repo, tools, options.repeat)
+    finally:
+        if not options.repo:
+            shutil.rmtree(repo)
+
+    report = {'params': params, 'tools': results}
+    if options.output:
+        fd = open(options.output, 'w')
+        json.dump(report, fd, indent=2, sort_keys=True)
+        fd.close()
+    else:
+        print json.dumps(report, indent=2, sort_keys=True)
+
+    if options.baseline:
+        fd = open(options.baseline)
+        baseline = json.load(fd)
+        fd.close()
+        if baseline['params'] != params:
+            print "Warning, the baseline was generated with %s" % (
+                baseline['params'])
+        regressions = compare_results(baseline['tools'], results,
+                                      options.threshold)
+        for regression in regressions:
+            print regression
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,182 @@
+"""
+Copyright (C) 2012 KevinX Chang.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, Inc., 675 Mass Ave, Cambridge MA 02139,
+USA; either version 2 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+Persistent blame index shared by the checkers.
+
+Blaming is the slowest step on a repository with a deep history, so the
+blame of every committed file is stored in the result cache, keyed by the
+file's path and the SHA of its blob at HEAD. After HEAD moves only the
+files whose blob changed are blamed again. Files with uncommitted changes
+are always blamed live. Callers that only need a few lines use
+blame_lines(), which indexes the full blame of a committed file all the
+same, so that the next run doesn't blame it again, and blames just those
+lines of a file with uncommitted changes.
+
+With svn, where every blame is a round trip to the server, a file is
+keyed by its URL and last changed revision instead, which 'svn info'
+reads from the working copy. svn blames the BASE of a file, whatever its
+local changes, so every file can be indexed.
+"""
+import hashlib
+import os
+from xml.etree import ElementTree
+
+from command_runner import read_command
+from profiling import span
+from vcs import (get_blame_cmd, get_blame_regex, get_vcs, run_blame,
+                 run_blame_lines)
+
+# the format of the blame entries, part of the keys of the index
+BLAME_FORMAT = 'epoch'
+
+_BLOB_SHAS = {}  # rev => mapping of load_blob_shas()
+
+
+def load_blob_shas(rev=None):
+    """
+    Map the path of every file that is unchanged since HEAD to the SHA of
+    its blob (with svn, every file to its URL@last changed revision).
+    Paths are relative to the current directory. The mapping is built
+    once per process.
+
+    param {str} rev: [optional] map the files of this revision instead.
+    """
+    if rev not in _BLOB_SHAS:
+        with span('blob index'):
+            if get_vcs() == 'git':
+                _BLOB_SHAS[rev] = _read_blob_shas(rev)
+            elif rev is None:
+                _BLOB_SHAS[rev] = _read_svn_revisions()
+            else:
+                _BLOB_SHAS[rev] = {}
+    return _BLOB_SHAS[rev]
+
+
+def reset_blob_shas():
+    """
+    Forget the mapping of load_blob_shas(), for long-running processes
+    that see HEAD move or files change.
+    """
+    _BLOB_SHAS.clear()
+
+
+def _read_svn_revisions():
+    svn_revisions = {}
+    info_output = read_command('svn info -R --xml 2>/dev/null')
+    try:
+        info = ElementTree.fromstring(info_output)
+    except ElementTree.ParseError:
+        return svn_revisions
+    for entry in info.iter('entry'):
+        commit = entry.find('commit')
+        url = entry.findtext('url')
+        if (entry.get('kind') != 'file' or commit is None or not url or
+                not commit.get('revision')):
+            continue  # such as added but not committed yet
+        svn_revisions[os.path.normpath(entry.get('path'))] = '%s@%s' % (
+            url, commit.get('revision'))
+    return svn_revisions
+
+
+def _read_blob_shas(rev=None):
+    blob_shas = {}
+    # <mode> SP <type> SP <sha> TAB <path> NUL
+    ls_tree_output = read_command('git ls-tree -r -z %s 2>/dev/null' % (
+        rev or 'HEAD'))
+    for entry in ls_tree_output.split("\0"):
+        info, _, path = entry.partition("\t")
+        info = info.split(' ')
+        if len(info) == 3 and info[1] == 'blob':
+            blob_shas[path] = info[2]
+    if rev is not None:
+        return blob_shas
+    diff_output = read_command('git diff --name-only --relative -z HEAD '
+                               '2>/dev/null')
+    for path in diff_output.split("\0"):
+        blob_shas.pop(path, None)
+    return blob_shas
+
+
+class BlameIndex(object):
+    """
+    Memoizes run_blame() across runs in a ResultCache. Without a cache
+    every file is blamed live.
+    """
+    def __init__(self, cache, rev=None):
+        """
+        param {str} rev: [optional] blame the files as of this revision
+            rather than as they are in the work tree.
+        """
+        self.cache = cache
+        self.rev = rev
+
+    def get_blob_sha(self, file_path):
+        """
+        Return the blob SHA of a file at HEAD (or at the revision), or
+        None if the file has uncommitted changes. See load_blob_shas for
+        svn.
+        """
+        return load_blob_shas(self.rev).get(os.path.normpath(file_path))
+
+    def _get_key(self, file_path, blob_sha):
+        blame_regex = get_blame_regex()
+        return hashlib.sha1("\0".join(
+            ['blame', BLAME_FORMAT, get_blame_cmd(),
+             blame_regex and blame_regex.pattern or '',
+             os.path.normpath(file_path), blob_sha])).hexdigest()
+
+    def blame(self, file_path, timeout=None):
+        """
+        Same as vcs.run_blame(file_path, timeout), served from the index
+        if the file was already blamed at its current blob.
+        """
+        with span('blame'):
+            return self._blame(file_path, timeout)
+
+    def _blame(self, file_path, timeout):
+        if not self.cache:
+            return run_blame(file_path, timeout, self.rev)
+        blob_sha = self.get_blob_sha(file_path)
+        if not blob_sha:
+            return run_blame(file_path, timeout, self.rev)
+        key = self._get_key(file_path, blob_sha)
+        cached = self.cache.get(key)
+        if cached:
+            return cached['lines']
+        blame_lines = run_blame(file_path, timeout, self.rev)
+        self.cache.put(key, {'lines': blame_lines})
+        return blame_lines
+
+    def blame_lines(self, file_path, line_numbers):
+        """
+        Same as vcs.run_blame_lines(file_path, line_numbers). A file that
+        can be indexed is blamed in full, once, and its lines are read
+        from the index; only files with uncommitted changes (or without a
+        cache) have just those lines blamed.
+        """
+        with span('blame'):
+            return self._blame_lines(file_path, line_numbers)
+
+    def _blame_lines(self, file_path, line_numbers):
+        if not (self.cache and self.get_blob_sha(file_path)):
+            return run_blame_lines(file_path, line_numbers, self.rev)
+        blame_lines = self._blame(file_path, None)
+        return dict((line_number, blame_lines[line_number])
+                    for line_number in line_numbers
+                    if line_number < len(blame_lines))
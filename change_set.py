@@ -0,0 +1,100 @@
+"""
+Copyright (C) 2012 KevinX Chang.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, Inc., 675 Mass Ave, Cambridge MA 02139,
+USA; either version 2 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+Restricts the checkers to the files changed in git (--since/--staged).
+"""
+import os
+import subprocess
+
+
+def add_change_set_arguments(parser):
+    """
+    param {argparse.ArgumentParser} parser: a parser that we populate
+        with the options that restrict a checker to changed files.
+    """
+    parser.add_argument('--since', dest='since',
+                        action='store',
+                        metavar='REF',
+                        help='Only check files changed since this git ref',
+                        default=None)
+    parser.add_argument('--staged', dest='staged',
+                        action='store_true',
+                        help='Only check files staged for commit',
+                        default=False)
+    return parser
+
+
+def change_set_from_options(options):
+    """
+    Return the ChangeSet selected by add_change_set_arguments, or None if
+    every file should be checked.
+    """
+    if not options.since and not options.staged:
+        return None
+    return ChangeSet(get_changed_files(options.since, options.staged))
+
+
+def _git_paths(args):
+    process = subprocess.Popen(['git'] + args, stdout=subprocess.PIPE)
+    output = process.communicate()[0]
+    if process.returncode != 0:
+        raise RuntimeError("--since and --staged need a git repository, "
+                           "failed to run: git %s" % ' '.join(args))
+    return [path for path in output.split("\0") if path]
+
+
+def get_changed_files(since=None, staged=False):
+    """
+    Return the paths, relative to the current directory, that differ from
+    the since ref (the working tree plus untracked files), or that are
+    staged (compared to since, or HEAD). Deleted paths are included.
+    """
+    args = ['diff', '--name-only', '--relative', '-z']
+    if staged:
+        args.append('--cached')
+    if since:
+        args.append(since)
+    paths = _git_paths(args)
+    if not staged:
+        paths.extend(_git_paths(['ls-files', '--others', '--exclude-standard',
+                                 '-z']))
+    return paths
+
+
+class ChangeSet(object):
+    """
+    A set of changed paths, and of the directories that contain them.
+    """
+    def __init__(self, paths):
+        self.paths = set(os.path.normpath(path) for path in paths)
+        self.dirs = set(['.'])
+        for path in self.paths:
+            dirname = os.path.dirname(path)
+            while dirname and dirname not in self.dirs:
+                self.dirs.add(dirname)
+                dirname = os.path.dirname(dirname)
+
+    def __contains__(self, path):
+        return os.path.normpath(path) in self.paths
+
+    def contains_dir(self, dirname):
+        """
+        Tell whether a changed path lives under dirname.
+        """
+        return os.path.normpath(dirname) in self.dirs
@@ -27,6 +27,13 @@ import os
 import re
 import sys
 
+from change_set import add_change_set_arguments, change_set_from_options
+from discovery import iter_files
+from file_buffer import count_newlines, get_line, read_buffer
+from profiling import (add_profile_arguments, profiler_from_options,
+                       report_from_options, span, FILE)
+from records import add_format_arguments, writer_from_options
+
 
 def configure_argument_parser(parser=argparse.ArgumentParser()):
     """
@@ -37,6 +44,9 @@ def configure_argument_parser(parser=argparse.ArgumentParser()):
                         action='store',
                         help='Directories to skip, separated by commas.',
                         default=[])
+    add_change_set_arguments(parser)
+    add_format_arguments(parser)
+    add_profile_arguments(parser)
     return parser
 
 
@@ -79,77 +89,232 @@ class FileCheckList:
     }
 
 
-def print_and_get_num_of_errors_in_file(rootpath, filename, attribute_hash):
+TAB_REGEX = re.compile(r'\t')
+TRAILING_SPACE_REGEX = re.compile(r'(\s+)$')
+TRAILING_BACKSLASH_REGEX = re.compile(r'\\\s*$')
+TRAILING_SPACES = (' ', '\t', '\x0b', '\x0c')
+
+
+class FileRules(object):
     """
-    Look at each filename and print out reasons for errors.
+    The checks of one file type, compiled from its attribute hash.
+
+    A few substring searches over the whole file first tell which checks
+    can fail at all, which rules out most clean files without any
+    per-line work. The checks that can fail are folded into a single
+    regex that matches the lines that may have an error; the file is
+    scanned with it in one pass, and only those lines are checked in
+    detail.
     """
-    max_columns = attribute_hash.get(FileCheckList.max_columns, 80)
-    allow_tab = attribute_hash.get(FileCheckList.allow_tab, False)
-    allow_empty_trailing_space = (
-        attribute_hash.get(FileCheckList.allow_empty_trailing_space), False)
-    allow_trailing_backslash = (
-        attribute_hash.get(FileCheckList.allow_trailing_backslash, True))
+    def __init__(self, attribute_hash):
+        self.max_columns = attribute_hash.get(FileCheckList.max_columns, 80)
+        self.allow_tab = attribute_hash.get(FileCheckList.allow_tab, False)
+        self.allow_empty_trailing_space = attribute_hash.get(
+            FileCheckList.allow_empty_trailing_space, True)
+        self.allow_trailing_backslash = attribute_hash.get(
+            FileCheckList.allow_trailing_backslash, True)
 
-    file_path = os.path.join(rootpath, filename)
-    fd = open(file_path)
-    line_num = 0
+        # each regex matches a superset of the lines with that error
+        self.suspect_patterns = {
+            'columns': r'^[^\n]{%d,}' % (self.max_columns + 1),
+            'tab': r'\t',
+            'space': r'[ \t\x0b\x0c]\r*$',
+            'backslash': r'\\[^\S\n]*$',
+        }
+        self.suspect_regexes = {}
+        self.long_line_regex = re.compile(r'\n[^\n]{%d}' %
+                                          (self.max_columns + 1))
 
-    errors = 0
-    for line in fd.readlines():
-        line = re.sub(r'[\n\r]+$', '', line)
-
-        line_num += 1
-        if not allow_tab and re.search(r'\t', line):
-            print("%s:%d: Should not contain tab:" %
-                  (file_path, line_num))
-            line = re.sub('\t', '<TAB>', line)
-            print "  %s" % line
+    def get_failing_checks(self, buff):
+        """
+        Whole-file fast path: return the names of the checks that may
+        fail somewhere in buff.
+        """
+        checks = []
+        first_line_end = buff.find('\n')
+        if first_line_end == -1:
+            first_line_end = len(buff)
+        if (first_line_end > self.max_columns or
+                self.long_line_regex.search(buff)):
+            checks.append('columns')
+        if not self.allow_tab and buff.find('\t') != -1:
+            checks.append('tab')
+        if not self.allow_empty_trailing_space:
+            if (buff.find('\r') != -1 or buff[-1:] in TRAILING_SPACES or
+                    any(buff.find(space + '\n') != -1
+                        for space in TRAILING_SPACES)):
+                checks.append('space')
+        if not self.allow_trailing_backslash and buff.find('\\') != -1:
+            checks.append('backslash')
+        return tuple(checks)
+
+    def get_suspect_regex(self, checks):
+        """
+        Return the regex that matches the lines that may fail checks.
+        """
+        if checks not in self.suspect_regexes:
+            self.suspect_regexes[checks] = re.compile(
+                '|'.join(self.suspect_patterns[check] for check in checks),
+                re.MULTILINE)
+        return self.suspect_regexes[checks]
+
+    def check_line(self, file_path, line_num, line, writer=None):
+        """
+        Print the errors of a line, and return how many there are.
+
+        param {RecordWriter} writer: [optional] write records to, rather
+            than print the errors.
+        """
+        errors = 0
+        if not self.allow_tab and '\t' in line:
+            line = TAB_REGEX.sub('<TAB>', line)
+            if writer:
+                writer.write('misc', file_path, line=line_num, code='tab',
+                             message='Should not contain tab')
+            else:
+                print("%s:%d: Should not contain tab:" %
+                      (file_path, line_num))
+                print "  %s" % line
             errors += 1
-        space_match = re.search('(\s+)$', line)
-        if not allow_empty_trailing_space and space_match:
-            print("%s:%d: Should not contain "
-                  "trailing space:" %
-                  (file_path, line_num))
-            line = re.sub('\s+$', '', line) + (
+        space_match = TRAILING_SPACE_REGEX.search(line)
+        if not self.allow_empty_trailing_space and space_match:
+            line = line[:space_match.start()] + (
                 '_' * len(space_match.group(1)))
-            print "  %s <= space" % line
+            if writer:
+                writer.write('misc', file_path, line=line_num,
+                             code='trailing-space',
+                             message='Should not contain trailing space')
+            else:
+                print("%s:%d: Should not contain "
+                      "trailing space:" %
+                      (file_path, line_num))
+                print "  %s <= space" % line
             errors += 1
-        if len(line) > max_columns:
-            print("%s:%d: Has %d columns (exceeds limit of %d):" %
-                  (file_path, line_num, len(line), max_columns))
-            line = line[:max_columns - 4]
-            print "  %s..." % line
+        if len(line) > self.max_columns:
+            message = "Has %d columns (exceeds limit of %d)" % (
+                len(line), self.max_columns)
+            line = line[:self.max_columns - 4]
+            if writer:
+                writer.write('misc', file_path, line=line_num,
+                             code='columns', message=message)
+            else:
+                print "%s:%d: %s:" % (file_path, line_num, message)
+                print "  %s..." % line
             errors += 1
-        if not allow_trailing_backslash:
-            no_comment_line = re.sub(r'#.*$', '', line)
-            if re.search(r'\\\s*$', line):
+        if (not self.allow_trailing_backslash and
+                TRAILING_BACKSLASH_REGEX.search(line)):
+            if writer:
+                writer.write('misc', file_path, line=line_num,
+                             code='backslash',
+                             message='Please replace backslash with '
+                                     'parenthesis')
+            else:
                 print("%s:%d: Please replace backslash with parenthesis" % (
                     file_path, line_num))
-                errors += 1
+            errors += 1
+        return errors
+
+    def check_buffer(self, file_path, buff, writer=None):
+        """
+        Print the errors of a file's contents, and return how many there
+        are. buff can be a string or an mmap.
+        """
+        errors = 0
+        checks = self.get_failing_checks(buff)
+        if not checks:
+            return errors
+        suspect_regex = self.get_suspect_regex(checks)
+        line_num = 1
+        line_start = 0
+        matched = suspect_regex.search(buff)
+        while matched:
+            start, line_end = get_line(buff, matched.start())
+            line_num += count_newlines(buff, line_start, start)
+            line_start = start
+            line = buff[line_start:line_end].rstrip('\r')
+            errors += self.check_line(file_path, line_num, line, writer)
+            matched = suspect_regex.search(buff, line_end + 1)
+        return errors
+
+    def check_file(self, file_path, writer=None):
+        """
+        Print the errors of a file, and return how many there are.
+        """
+        with read_buffer(file_path) as buff:
+            return self.check_buffer(file_path, buff, writer)
+
+
+_FILE_RULES = {}
+
+
+def get_file_rules(attribute_hash):
+    """
+    Return the compiled FileRules of an attribute hash.
+    """
+    key = id(attribute_hash)
+    if key not in _FILE_RULES:
+        _FILE_RULES[key] = FileRules(attribute_hash)
+    return _FILE_RULES[key]
+
+
+def _compile_filename_regex():
+    """
+    Fold the file name regexes of FILE_CHECK_ATTRIBUTES into one regex,
+    with a named group per file type.
+    """
+    patterns = []
+    group_to_attributes = {}
+    for idx, (check_regex, attribute_hash) in enumerate(
+            FileCheckList.FILE_CHECK_ATTRIBUTES.iteritems()):
+        group = 'type%d' % idx
+        patterns.append('(?P<%s>%s)' % (group, check_regex.pattern))
+        group_to_attributes[group] = attribute_hash
+    return (re.compile('|'.join(patterns), flags=re.IGNORECASE),
+            group_to_attributes)
+
+
+FILENAME_REGEX, GROUP_TO_ATTRIBUTES = _compile_filename_regex()
+
 
-    return errors
+def get_attribute_hash(filename):
+    """
+    Return the attribute hash of the file type of filename, or None.
+    """
+    matched = FILENAME_REGEX.search(filename)
+    if matched:
+        return GROUP_TO_ATTRIBUTES[matched.lastgroup]
+    return None
 
 
-def traverse_files(skip_regex):
+def print_and_get_num_of_errors_in_file(rootpath, filename, attribute_hash,
+                                        writer=None):
+    """
+    Look at each filename and print out reasons for errors.
+    """
+    file_path = os.path.join(rootpath, filename)
+    return get_file_rules(attribute_hash).check_file(file_path, writer)
+
+
+def traverse_files(skip_regex, changed_files=None, writer=None):
     """
     Check Python programs for Todo strings
+
+    param {ChangeSet} changed_files: [optional] only check these files.
+    param {RecordWriter} writer: [optional] write records to, rather than
+        print the errors.
     """
     errors = 0
-    for rootpath, _dirs, files in os.walk("./"):
-        rootpath = os.path.normpath(rootpath)
-        if skip_regex.search(rootpath):
-            continue
-        for filename in files:
-            for check_regex, attribute_hash in (
-                    FileCheckList.FILE_CHECK_ATTRIBUTES.iteritems()):
-                match = check_regex.search(filename)
-                if match:
-                    errors += print_and_get_num_of_errors_in_file(
-                        rootpath, filename, attribute_hash)
-                    continue
+    for entry in iter_files('.', skip_regex, changed_files=changed_files,
+                            skip_file_names=True):
+        attribute_hash = get_attribute_hash(entry.name)
+        if attribute_hash:
+            with span(entry.path, FILE):
+                errors += print_and_get_num_of_errors_in_file(
+                    entry.dirname, entry.name, attribute_hash, writer)
 
     if errors:
-        print "File contains %d errors." % errors
+        if not writer:
+            print "File contains %d errors." % errors
         sys.exit(1)
 
 
@@ -162,7 +327,12 @@ def run():
     else:
         skip_regex = re.compile(r"(^.idea|^.git|^auto|check_todos.py)")
 
-    traverse_files(skip_regex)
+    profiler_from_options(options)
+    try:
+        traverse_files(skip_regex, change_set_from_options(options),
+                       writer_from_options(options))
+    finally:
+        report_from_options(options)
 
 
 if __name__ == '__main__':
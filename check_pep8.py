@@ -28,10 +28,18 @@ Usage:
 check_pep8.py --recursive --skip=^auto,^crawler,^chef
 """
 import argparse
-import glob
-import os
 import re
 from sys import maxint
+import tokenize
+
+from change_set import add_change_set_arguments, change_set_from_options
+from discovery import iter_files, PYTHON_FILE_REGEX
+from linter_backends import (add_backend_arguments, get_pep8_backend,
+                             DEFAULT_BACKEND)
+from profiling import (add_profile_arguments, profiler_from_options,
+                       report_from_options, span, FILE)
+from records import add_format_arguments, writer_from_options
+from result_cache import add_cache_arguments, cache_from_options
 
 __author__ = 'kevinx'
 
@@ -51,51 +59,174 @@ def configure_argument_parser(parser=argparse.ArgumentParser()):
     parser.add_argument('--skip', dest='skip',
                         action='store',
                         help='directories to skip', default=[])
+    add_cache_arguments(parser)
+    add_backend_arguments(parser)
+    add_change_set_arguments(parser)
+    add_format_arguments(parser)
+    add_profile_arguments(parser)
     return parser
 
 
-def count_lines_in_code(pyfile):
+# pep8 reads its project configuration from these files
+PEP8_CONFIG_FILES = ('setup.cfg', 'tox.ini')
+
+
+# tokens that don't make a line a line of code
+NON_CODE_TOKENS = frozenset([tokenize.COMMENT, tokenize.NL, tokenize.NEWLINE,
+                             tokenize.INDENT, tokenize.DEDENT,
+                             tokenize.ENDMARKER])
+
+
+def read_lines(pyfile):
+    """
+    Return the contents of a file, and its lines with universal newlines
+    (as pep8 reads them).
+    """
+    fd = open(pyfile, 'rb')
+    try:
+        contents = fd.read()
+    finally:
+        fd.close()
+    lines = contents.replace('\r\n', '\n').replace('\r', '\n')
+    return contents, lines.splitlines(True)
+
+
+def count_lines_in_code(pyfile, lines=None):
+    """
+    Count the lines of a file that are neither blank nor only a comment.
+    The lines are tokenized, so a '#' in a string does not start a comment.
+
+    param {list} lines: [optional] the lines of the file, if already read.
+    """
+    if lines is None:
+        lines = read_lines(pyfile)[1]
+    code_rows = set()
+    try:
+        for kind, text, (row, _col), _end, _line in tokenize.generate_tokens(
+                iter(lines).next):
+            if kind in NON_CODE_TOKENS:
+                continue
+            # a string can span lines, some of them blank
+            for offset, text_line in enumerate(text.split('\n')):
+                if text_line.strip():
+                    code_rows.add(row + offset)
+    except (tokenize.TokenError, IndentationError):
+        return _count_lines_without_comments(lines)
+    return len(code_rows)
+
+
+def _count_lines_without_comments(lines):
+    # for files that don't tokenize: anything after a '#' is a comment
     line_count = 0
-    fd = open(pyfile)
-    for line in fd.readlines():
+    for line in lines:
         line = re.sub(r'#.*', '', line)
         line = re.sub('\s+', '', line)
         if line:
             line_count += 1
-    fd.close()
     return line_count
 
 
-def check_for_pep8_error(current_path, recursive, error_threshold, skip_regex):
+def get_pep8_results(pyfile, cache=None, backend=DEFAULT_BACKEND):
+    """
+    Return the pep8 messages [row, col, code, text] of a file, and its
+    number of lines of code if it has messages (None otherwise). The file
+    is read once for both, and both are cached together, so that they are
+    reused if the file did not change since it was last checked.
+    """
+    pep8_backend = get_pep8_backend(backend)
+    try:
+        contents, lines = read_lines(pyfile)
+    except IOError:
+        contents, lines = None, None
+    if cache and contents is not None:
+        key = cache.make_key(pep8_backend.name, pyfile,
+                             config_files=PEP8_CONFIG_FILES,
+                             version=pep8_backend.version, contents=contents)
+        cached = cache.get(key)
+        if cached and 'lines_of_code' in cached:
+            return cached['messages'], cached['lines_of_code']
+
+    with span('pep8'):
+        messages = pep8_backend.check(pyfile, lines)
+    lines_of_code = None
+    if messages and lines is not None:
+        with span('count lines'):
+            lines_of_code = count_lines_in_code(pyfile, lines)
+    if cache and contents is not None:
+        cache.put(key, {'messages': messages, 'lines_of_code': lines_of_code})
+    return messages, lines_of_code
+
+
+def get_pep8_messages(pyfile, cache=None, backend=DEFAULT_BACKEND):
+    """
+    Return the pep8 messages [row, col, code, text] of a file, reusing
+    them from cache if the file did not change since it was last checked.
+    """
+    return get_pep8_results(pyfile, cache, backend)[0]
+
+
+def format_pep8_messages(pyfile, messages):
+    """
+    Format pep8 messages the way the pep8 command prints them.
+    """
+    return "\n".join("%s:%d:%d: %s %s" % (pyfile, row, col, code, text)
+                     for row, col, code, text in messages)
+
+
+def get_pep8_output(pyfile, cache=None, backend=DEFAULT_BACKEND):
+    """
+    Return the pep8 output of a file.
+    """
+    return format_pep8_messages(pyfile,
+                                get_pep8_messages(pyfile, cache, backend))
+
+
+def write_pep8_records(writer, pyfile, messages, lines_of_code,
+                       too_many_errors):
+    """
+    Write a record per pep8 message of a file, and one for the file if it
+    has too many errors.
+    """
+    if too_many_errors:
+        writer.write('pep8', pyfile, code='too-many-errors',
+                     message='TOO MANY ERRORS', lines=lines_of_code)
+    for row, col, code, text in messages:
+        writer.write('pep8', pyfile, line=row, column=col, code=code,
+                     message=text)
+
+
+def check_for_pep8_error(current_path, recursive, error_threshold, skip_regex,
+                         cache=None, backend=DEFAULT_BACKEND,
+                         changed_files=None, writer=None):
     """
     Check Python programs, see if they reach the threshold of
     errors:lines. If so, return True
+
+    param {ChangeSet} changed_files: [optional] only check these files.
+    param {RecordWriter} writer: [optional] write records to, rather than
+        print the pep8 output.
     """
     has_error = False
-    for pyfile in glob.glob(current_path + '/*.py'):
-        pyfile = pyfile.replace('./', '')
-        if skip_regex.search(pyfile):
-            continue
-        pep8_output = os.popen('pep8 %s' % pyfile).read().rstrip()
-        if pep8_output:
-            lines_of_code = count_lines_in_code(pyfile)
-            if lines_of_code == 0:
+    for entry in iter_files(current_path, skip_regex, recursive,
+                            PYTHON_FILE_REGEX, changed_files):
+        pyfile = entry.path
+        with span(pyfile, FILE):
+            messages, lines_of_code = get_pep8_results(pyfile, cache,
+                                                       backend)
+        if messages:
+            if not lines_of_code:
                 error_ratio = maxint
             else:
-                error_ratio = (float(len(pep8_output.split("\n"))) /
-                               lines_of_code)
-            if error_ratio > error_threshold:
-                has_error = True
-                print "TOO MANY ERRORS: " + pyfile
-            print pep8_output
-
-    if recursive:
-        for dir in [dir for dir in glob.glob(current_path + '/*')
-                    if os.path.isdir(dir)]:
-            if skip_regex.search(dir):
-                continue
-            if check_for_pep8_error(dir, True, error_threshold, skip_regex):
-                has_error = True
+                error_ratio = float(len(messages)) / lines_of_code
+            too_many_errors = error_ratio > error_threshold
+            has_error = has_error or too_many_errors
+            if writer:
+                write_pep8_records(writer, pyfile, messages, lines_of_code,
+                                   too_many_errors)
+            else:
+                if too_many_errors:
+                    print "TOO MANY ERRORS: " + pyfile
+                print format_pep8_messages(pyfile, messages)
 
     return has_error
 
@@ -112,10 +243,20 @@ def run():
         # dummy placeholder to match nothing
         skip_regex = re.compile('____')
 
-    if check_for_pep8_error('.',
-                            options.recursive,
-                            float(error_lines) / float(good_lines),
-                            skip_regex):
+    profiler_from_options(options)
+    cache = cache_from_options(options)
+    has_error = check_for_pep8_error('.',
+                                     options.recursive,
+                                     float(error_lines) / float(good_lines),
+                                     skip_regex,
+                                     cache,
+                                     options.backend,
+                                     change_set_from_options(options),
+                                     writer_from_options(options))
+    if cache:
+        cache.prune()
+    report_from_options(options)
+    if has_error:
         sys.exit(1)
 
 
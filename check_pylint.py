@@ -26,17 +26,35 @@ such as object oriented design/patterns/structures.
 
 Usage:
 check_pylint.py --recursive --skip=^auto
+check_pylint.py --recursive --jobs=8 --max-worker-memory=1024
+check_pylint.py --recursive --path-depth=0
+check_pylint.py --recursive --backend=subprocess --batch-size=50
+check_pylint.py --recursive --shard=1/4 --partial=pylint-1.json
+check_pylint.py --recursive --rev=v1.0
+check_pylint.py --recursive --sample=0.1 --time-budget=60
 """
 import re
 import argparse
+import functools
+import json
+import multiprocessing
 import os
-import glob
-# TODO(kevinx): move the two imports into a common sharable module.
-from check_todos import get_author_alias, BLAME_CMD, BLAME_REGEX
-
-
-PYLINT_SCORE_REGEX = re.compile(r'Your code has been rated at '
-                                '(\-?\d+(\.\d+)?)')
+from contextlib import closing
+from blame_index import BlameIndex
+from change_set import add_change_set_arguments, change_set_from_options
+from discovery import iter_files, PYTHON_FILE_REGEX
+from linter_backends import (add_backend_arguments, get_pylint_backend,
+                             get_pylint_batches, DEFAULT_BACKEND)
+from profiling import (add_profile_arguments, add_spans, collect_spans,
+                       profiler_from_options, report_from_options, span,
+                       FILE)
+from records import add_format_arguments, writer_from_options
+from result_cache import add_cache_arguments, cache_from_options
+from revision import add_revision_arguments, revision_from_options
+from sampling import add_sample_arguments, sampler_from_options, RatioEstimate
+from scheduler import add_scheduler_arguments, scheduler_from_options
+from sharding import add_shard_arguments, shard_from_options, write_partial
+from vcs import get_author_alias, get_vcs
 
 
 def configure_argument_parser(parser=argparse.ArgumentParser()):
@@ -61,19 +79,67 @@ def configure_argument_parser(parser=argparse.ArgumentParser()):
     parser.add_argument('--authors', dest='authors',
                         nargs='*',
                         help='[optional] Only output these authors')
+    parser.add_argument('--path-depth', dest='path_depth',
+                        action='store',
+                        type=int,
+                        help='Directory levels of the path summary, 0 for '
+                             'all of them',
+                        default=1)
+    parser.add_argument('--jobs', dest='jobs',
+                        action='store',
+                        type=int,
+                        help='Number of files to score in parallel',
+                        default=1)
+    parser.add_argument('--batch-size', dest='batch_size',
+                        action='store',
+                        type=int,
+                        help='Number of files that a pylint run checks at '
+                             'once',
+                        default=1)
+    parser.add_argument('--max-worker-memory', dest='max_worker_memory',
+                        action='store',
+                        type=int,
+                        help='[optional] Memory cap per --jobs worker, in MB',
+                        default=None)
+    add_cache_arguments(parser)
+    add_backend_arguments(parser)
+    add_change_set_arguments(parser)
+    add_revision_arguments(parser)
+    parser.add_argument('--baseline', dest='baseline',
+                        action='store',
+                        help='[optional] JSON file of per-file results that '
+                             'this run updates, and that the report is '
+                             'built from',
+                        default=None)
+    add_format_arguments(parser)
+    add_profile_arguments(parser)
+    add_scheduler_arguments(parser)
+    add_shard_arguments(parser)
+    add_sample_arguments(parser)
     return parser
 
 
 class Info(object):
     """
-    Base container that holds line and author statistics.
+    Base container that holds line and author statistics. There is one
+    per file, directory and author, however many lines they have, so it
+    keeps no per-instance __dict__.
     """
-    def __init__(self, name, authors):
+    __slots__ = ('name', 'authors', 'line_count', 'author_line_count',
+                 'sum_score', 'sampler', 'estimate')
+
+    def __init__(self, name, authors, sampler=None):
+        """
+        param {Sampler} sampler: [optional] the scores come from a sample
+            of the files, and are estimated by it.
+        """
         self.name = name
         self.authors = authors
         self.line_count = 0
         self.author_line_count = {}
         self.sum_score = 0
+        self.sampler = sampler
+        self.estimate = RatioEstimate() if sampler else None
 
     def add_line_count(self, author, line_count, score=None):
         self.line_count += line_count
@@ -82,23 +148,52 @@ class Info(object):
         else:
             self.author_line_count[author] += line_count
 
+    def get_score(self):
+        """
+        Return (lines, average score, half width of its confidence
+        interval). The half width is None unless the score is estimated
+        from a sample.
+        """
+        if self.sampler:
+            return self.sampler.estimate(self.estimate)
+        if self.line_count:
+            return self.line_count, self.sum_score / self.line_count, None
+        return self.line_count, None, None
+
+
+def format_estimate(avg_score, half_width):
+    """
+    Return an estimated score and its confidence interval as text.
+    """
+    if avg_score is None:
+        return "~?"  # no lines in the files done so far
+    if half_width is None:
+        return "~{0:.2f} +/- ?".format(avg_score)
+    return "~{0:.2f} +/- {1:.2f}".format(avg_score, half_width)
+
 
 class AuthorInfo(Info):
     """
     Container for author statistics.
     """
+    __slots__ = ()
+
     def add_line_count(self, author, line_count, score):
         super(AuthorInfo, self).add_line_count(author, line_count)
-        self.sum_score += score
+        # every line weighs the same in the average
+        self.sum_score += score * line_count
 
     def __str__(self):
         if self.authors and self.name not in self.authors:
             return ""
 
-        if self.line_count:
-            avg_score = self.sum_score / self.line_count
-        else:
-            avg_score = None
+        lines, avg_score, half_width = self.get_score()
+        if self.sampler:
+            return ("{author_name} scores {estimate} "
+                    "(~{lines:.0f} lines)".format(
+                        author_name=self.name,
+                        estimate=format_estimate(avg_score, half_width),
+                        lines=lines))
         # return author information
         return ("{author_name} scores {avg_score:.2f} ({lines} lines)".format(
             author_name=self.name, avg_score=avg_score, lines=self.line_count))
@@ -109,9 +204,11 @@ class FilePathInfo(Info):
     Container for file or path statistics. Generates file/path score and
     the authors' contributions.
     """
+    __slots__ = ()
+
     def add_line_count(self, author, line_count, score):
         super(FilePathInfo, self).add_line_count(author, line_count)
-        self.sum_score += score
+        self.sum_score += score * line_count
 
     def __str__(self):
         if (self.authors and
@@ -121,38 +218,105 @@ class FilePathInfo(Info):
 
         buff = []
         # return the general file information
-        if self.line_count:
-            avg_score = self.sum_score / self.line_count
+        lines, avg_score, half_width = self.get_score()
+        if self.sampler:
+            buff.append("{filename} scores {estimate} "
+                        "with ~{lines:.0f} lines".format(
+                            filename=self.name,
+                            estimate=format_estimate(avg_score, half_width),
+                            lines=lines))
+            line_format = "  {author_name} wrote {line_count} sampled lines"
         else:
-            avg_score = None
-        buff.append("{filename} scores {avg_score:.2f} "
-                    "with {lines} lines".format(filename=self.name,
-                                                avg_score=avg_score,
-                                                lines=self.line_count))
+            buff.append("{filename} scores {avg_score:.2f} "
+                        "with {lines} lines".format(filename=self.name,
+                                                    avg_score=avg_score,
+                                                    lines=lines))
+            line_format = "  {author_name} wrote {line_count} lines"
         # return the breakdown of author contribution to this file
         for author_name, line_count in self.author_line_count.iteritems():
             if self.authors and author_name not in self.authors:
                 continue
-            buff.append("  {author_name} wrote {line_count} lines".format(
-                author_name=author_name, line_count=line_count))
+            buff.append(line_format.format(author_name=author_name,
+                                           line_count=line_count))
         return "\n".join(buff)
 
 
+class PathNode(object):
+    """
+    A node of the prefix tree of paths: the statistics of a directory (or
+    of a top-level file) and its subdirectories by name.
+    """
+    __slots__ = ('info', 'children')
+
+    def __init__(self, info):
+        self.info = info
+        self.children = {}
+
+
 class InfoContainer(object):
     """ Root container """
     everyone = '<everyone>'
 
-    def __init__(self, authors):
+    def __init__(self, authors, path_depth=1, sampler=None):
+        """
+        param {list} authors: [optional] only output these authors.
+        param {int} path_depth: number of directory levels of the path
+            summary, or 0 for all of them.
+        param {Sampler} sampler: [optional] the files are a sample; the
+            path and author summaries are estimated by it.
+        """
         # mapping of author to AuthorInfo objects
-        self.authorinfo = {self.everyone: AuthorInfo(self.everyone, authors)}
-        # mapping of file/path to FilePathInfo objects
+        self.authorinfo = {self.everyone: AuthorInfo(self.everyone, authors,
+                                                     sampler)}
+        # mapping of file to FilePathInfo objects
         self.fileinfo = {}
-        self.pathinfo = {}
+        # prefix tree of the directories, rolled up at every depth
+        self.pathtree = {}
         self.authors = authors  # only output these authors
+        self.path_depth = path_depth
+        self.sampler = sampler
+
+    @property
+    def pathinfo(self):
+        """
+        Mapping of path to the FilePathInfo of the path summary.
+        """
+        pathinfo = {}
+        stack = [(name, node, 1) for name, node in
+                 self.pathtree.iteritems()]
+        while stack:
+            path, node, depth = stack.pop()
+            pathinfo[path] = node.info
+            if self.path_depth and depth >= self.path_depth:
+                continue
+            for name, child in node.children.iteritems():
+                stack.append((path + '/' + name, child, depth + 1))
+        return pathinfo
+
+    def _get_path_nodes(self, filename):
+        """
+        Return the PathNode of every directory of filename, creating the
+        missing ones. A top-level file is its own first-level node.
+        """
+        parts = filename.split('/')
+        dirs = parts[:-1] or parts
+        nodes = []
+        children = self.pathtree
+        for depth, name in enumerate(dirs):
+            if name not in children:
+                path = '/'.join(dirs[:depth + 1])
+                children[name] = PathNode(FilePathInfo(path, self.authors,
+                                                       self.sampler))
+            nodes.append(children[name])
+            children = children[name].children
+        return nodes
 
     def __str__(self):
         sortfunc = lambda x: x[0].lower()
-        buff = ["File Statistics:"]
+        buff = []
+        if self.sampler:
+            buff.extend([str(self.sampler), ""])
+        buff.append("File Statistics:")
         for _, fileinfo in sorted(self.fileinfo.iteritems(), key=sortfunc):
             output = str(fileinfo)
             if output:
@@ -178,72 +342,469 @@ class InfoContainer(object):
         """
         Given an email and a score, aggregate scores.
         """
+        self.add_file_scores(filename, {author: line_count}, score)
+
+    def add_file_scores(self, filename, author_line_count, score):
+        """
+        Aggregate the score of a file, given the number of lines of each
+        of its authors: one update per author rather than per line.
+        """
         if filename not in self.fileinfo:
             self.fileinfo[filename] = FilePathInfo(filename, self.authors)
-        self.fileinfo[filename].add_line_count(author, line_count, score)
+        infos = [self.fileinfo[filename]]
+        infos.extend(node.info for node in self._get_path_nodes(filename))
+        # total count of everyone (complete summary)
+        infos.append(self.authorinfo[self.everyone])
+
+        for author, line_count in author_line_count.iteritems():
+            if author not in self.authorinfo:
+                self.authorinfo[author] = AuthorInfo(author, self.authors,
+                                                     self.sampler)
+            self.authorinfo[author].add_line_count(author, line_count, score)
+            for info in infos:
+                info.add_line_count(author, line_count, score)
+
+        if self.sampler:
+            # the estimates take the lines of the file as a whole
+            stratum = self.sampler.strata[filename]
+            for info in infos[1:]:
+                info.estimate.add(stratum, sum(author_line_count.values()),
+                                  score)
+            for author, line_count in author_line_count.iteritems():
+                self.authorinfo[author].estimate.add(stratum, line_count,
+                                                     score)
+
+
+def count_authors(emails):
+    """
+    Return the number of lines of each author, given the author of every
+    line.
+    """
+    author_line_count = {}
+    for email in emails:
+        author_line_count[email] = author_line_count.get(email, 0) + 1
+    return author_line_count
 
-        path = re.sub(r'/.+', '', filename)
-        if path not in self.pathinfo:
-            self.pathinfo[path] = FilePathInfo(path, self.authors)
-        self.pathinfo[path].add_line_count(author, line_count, score)
 
-        if author not in self.authorinfo:
-            self.authorinfo[author] = AuthorInfo(author, self.authors)
-        self.authorinfo[author].add_line_count(author, line_count, score)
+def find_pyfiles(current_path, recursive, skip_regex, changed_files=None,
+                 revision=None):
+    """
+    Yield the Python files under current_path, in the order that
+    aggregate_pylint_scores visits them.
+
+    param {ChangeSet} changed_files: [optional] only yield these files.
+    param {Revision} revision: [optional] yield the files of this revision
+        rather than those of the work tree.
+    """
+    paths = revision and revision.get_paths()
+    for entry in iter_files(current_path, skip_regex, recursive,
+                            PYTHON_FILE_REGEX, changed_files, paths=paths):
+        yield entry.path
+
+
+def score_pyfile(pyfile, pylint_rcfile=None, cache=None,
+                 backend=DEFAULT_BACKEND, revision=None):
+    """
+    Run Pylint and 'git blame' on a single file.
+
+    Returns a tuple (pyfile, score, emails), where emails lists the author
+    of every blamed line of code. score is None when Pylint did not rate
+    the file. Nothing is printed, so that this can run in a worker process.
+
+    param {ResultCache} cache: [optional] where Pylint scores and blames
+        are reused from, for files whose contents did not change.
+    param {Revision} revision: [optional] score the file as of this
+        revision, which was checked out (see Revision.checkout).
+    """
+    with span(pyfile, FILE):
+        score = get_pylint_score(pyfile, pylint_rcfile, cache, backend,
+                                 revision=revision)
+        if not score:
+            return pyfile, None, []
+        return pyfile, score, get_blamed_authors(pyfile, cache,
+                                                 revision=revision)
+
+
+def score_pyfiles(pyfiles, pylint_rcfile=None, cache=None,
+                  backend=DEFAULT_BACKEND, revision=None):
+    """
+    Same as score_pyfile for a batch of files (see
+    linter_backends.get_pylint_batches), linted by a single pylint run.
+    Returns a list of (pyfile, score, emails).
+    """
+    if len(pyfiles) == 1:
+        return [score_pyfile(pyfiles[0], pylint_rcfile, cache, backend,
+                             revision)]
+    scores = get_pylint_scores(pyfiles, pylint_rcfile, cache, backend,
+                               revision=revision)
+    results = []
+    for pyfile, score in zip(pyfiles, scores):
+        with span(pyfile, FILE):
+            if not score:
+                results.append((pyfile, None, []))
+            else:
+                results.append((pyfile, score,
+                                get_blamed_authors(pyfile, cache,
+                                                   revision=revision)))
+    return results
+
+
+def get_blamed_authors(pyfile, cache=None, timeout=None, revision=None):
+    """
+    Return the author of every blamed line of code of a file.
+
+    param {Revision} revision: [optional] blame the file as of this
+        revision.
+    """
+    emails = []
+    blame_index = BlameIndex(cache, revision and revision.sha)
+    for blame_line in blame_index.blame(pyfile, timeout):
+        if blame_line:
+            email, _datestamp, has_code = blame_line
+            if not has_code:
+                continue
+            emails.append(get_author_alias(email))
+    return emails
+
+
+def blame_pyfiles(pyfiles, cache=None, timeout=None, revision=None):
+    """
+    Return the get_blamed_authors of every file of a batch.
+    """
+    return [get_blamed_authors(pyfile, cache, timeout, revision)
+            for pyfile in pyfiles]
+
+
+def get_pylint_score(pyfile, pylint_rcfile=None, cache=None,
+                     backend=DEFAULT_BACKEND, timeout=None, revision=None):
+    """
+    Return the Pylint score of a file, from cache if the file did not
+    change since it was last scored.
+
+    param {Revision} revision: [optional] score the file as of this
+        revision, which was checked out (see Revision.checkout).
+    """
+    return get_pylint_scores([pyfile], pylint_rcfile, cache, backend,
+                             timeout, revision)[0]
+
+
+def get_pylint_scores(pyfiles, pylint_rcfile=None, cache=None,
+                      backend=DEFAULT_BACKEND, timeout=None, revision=None):
+    """
+    Same as get_pylint_score for a batch of files (see
+    linter_backends.get_pylint_batches): the files that are not cached are
+    checked by a single pylint run. Returns the scores in order.
+    """
+    pylint_backend = get_pylint_backend(backend, pylint_rcfile)
+    if revision:
+        lint_paths = [revision.get_path(pyfile) for pyfile in pyfiles]
+    else:
+        lint_paths = pyfiles
+    scores = [None] * len(pyfiles)
+    keys = {}
+    unscored = []
+    for index, pyfile in enumerate(pyfiles):
+        if cache:
+            # the module name (and so the path) affects Pylint's messages
+            keys[index] = cache.make_key(pylint_backend.name,
+                                         lint_paths[index],
+                                         config_files=[pylint_rcfile],
+                                         extra=[pyfile],
+                                         version=pylint_backend.version)
+            cached = cache.get(keys[index])
+            if cached:
+                scores[index] = cached['score']
+                continue
+        unscored.append(index)
+    if not unscored:
+        return scores
+
+    with span('pylint', files=len(unscored)):
+        if len(unscored) == 1:
+            checked = [pylint_backend.check(lint_paths[unscored[0]],
+                                            timeout)]
+        else:
+            checked = pylint_backend.check_batch(
+                [lint_paths[index] for index in unscored], timeout)
+    for index, score in zip(unscored, checked):
+        scores[index] = score
+        if cache:
+            cache.put(keys[index], {'score': score})
+    return scores
+
+
+def add_pyfile_scores(rootinfo, pyfile, score, emails):
+    """
+    Merge the result of score_pyfile into rootinfo.
+    """
+    if not score:
+        print "Error, no score: %s" % pyfile
+        return
+    rootinfo.add_file_scores(pyfile, count_authors(emails), score)
+
+
+def write_pyfile_records(writer, authors, pyfile, score, emails):
+    """
+    Write the result of score_pyfile as a record per author of the file.
+
+    param {list} authors: [optional] only write records of these authors.
+    """
+    if not score:
+        writer.write('pylint', pyfile, code='no-score',
+                     message='Error, no score')
+        return
+    for author, line_count in sorted(count_authors(emails).iteritems()):
+        if authors and author not in authors:
+            continue
+        writer.write('pylint', pyfile, author=author, score=score,
+                     lines=line_count)
+
+
+def add_partial_scores(partial, shard, pyfile, score, emails):
+    """
+    Append the result of score_pyfile to the partial report of a shard.
+    """
+    partial.append([shard.positions[pyfile], pyfile,
+                    [score, count_authors(emails)]])
+
+
+def merge_sample(sampler, merge, pyfile, score, emails):
+    """
+    Count the result of score_pyfile as done in the sample, and merge it.
+    """
+    sampler.record(pyfile)
+    merge(pyfile, score, emails)
+
+
+def update_baseline(baseline, pyfile, score, emails):
+    """
+    Store the result of score_pyfile in baseline.
+    """
+    if not score:
+        print "Error, no score: %s" % pyfile
+        return
+    baseline[pyfile] = [score, emails]
+
+
+def load_baseline(baseline_file):
+    """
+    Return the per-file results saved by save_baseline, if any.
+    """
+    if not os.path.exists(baseline_file):
+        return {}
+    fd = open(baseline_file)
+    try:
+        return json.load(fd)['files']
+    finally:
+        fd.close()
 
-        # total count of everyone (complete summary)
-        self.authorinfo[self.everyone].add_line_count(
-            author, line_count, score)
+
+def save_baseline(baseline_file, baseline):
+    """
+    Save the per-file results of pyfile => [score, emails].
+    """
+    tmp_file = baseline_file + '.tmp'
+    fd = open(tmp_file, 'w')
+    try:
+        json.dump({'files': baseline}, fd, sort_keys=True)
+    finally:
+        fd.close()
+    os.rename(tmp_file, baseline_file)
+
+
+def _limit_worker_memory(max_worker_memory):
+    """
+    Pool initializer: cap the address space of a worker, and thereby of
+    the pylint and blame processes it spawns, to max_worker_memory MB.
+    """
+    if max_worker_memory:
+        import resource
+        limit = max_worker_memory * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def select_pyfiles(pyfiles, shard=None, sampler=None, revision=None):
+    """
+    Return the files of pyfiles that are in the shard and the sample.
+
+    param {Revision} revision: [optional] weigh the files by their size
+        in this revision rather than in the work tree.
+    """
+    if shard:
+        if revision:
+            pyfiles = shard.select(pyfiles, revision.get_size)
+        else:
+            pyfiles = shard.select(pyfiles)
+    if sampler:
+        if revision:
+            pyfiles = sampler.select(pyfiles, revision.get_size)
+        else:
+            pyfiles = sampler.select(pyfiles)
+    return pyfiles
+
+
+def iter_serial_results(batches, pylint_rcfile=None, cache=None,
+                        backend=DEFAULT_BACKEND, revision=None):
+    """
+    Score the batches one after the other in this process, and yield the
+    score_pyfiles results of each.
+    """
+    for batch in batches:
+        yield score_pyfiles(batch, pylint_rcfile, cache, backend, revision)
+
+
+def iter_pool_results(batches, jobs, max_worker_memory=None,
+                      pylint_rcfile=None, cache=None,
+                      backend=DEFAULT_BACKEND, revision=None):
+    """
+    Score the batches in a pool of jobs worker processes, and yield the
+    score_pyfiles results of each, in order. Closing the generator drops
+    the batches in flight.
+    """
+    scorer = functools.partial(score_pyfiles, pylint_rcfile=pylint_rcfile,
+                               cache=cache, backend=backend,
+                               revision=revision)
+    pool = multiprocessing.Pool(jobs,
+                                initializer=_limit_worker_memory,
+                                initargs=(max_worker_memory,))
+    try:
+        # the spans of the workers are sent back with their results
+        for results, spans in pool.imap(
+                functools.partial(collect_spans, scorer), batches):
+            add_spans(spans)
+            yield results
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def iter_scheduled_results(batches, scheduler, pylint_rcfile=None,
+                           cache=None, backend=DEFAULT_BACKEND,
+                           revision=None):
+    """
+    Lint and blame the batches concurrently with a Scheduler, and yield
+    the score_pyfiles results of each, in order.
+    """
+    if not get_pylint_backend(backend, pylint_rcfile).thread_safe:
+        scheduler.limit('lint', 1)
+    lint = functools.partial(get_pylint_scores,
+                             pylint_rcfile=pylint_rcfile, cache=cache,
+                             backend=backend, revision=revision)
+    blame = functools.partial(blame_pyfiles, cache=cache, revision=revision)
+    for batch, (scores, authors) in scheduler.imap(
+            batches, [('lint', lint), ('blame', blame)]):
+        # a task that failed has no results for the whole batch
+        scores = scores or [None] * len(batch)
+        authors = authors or [None] * len(batch)
+        results = []
+        for pyfile, score, emails in zip(batch, scores, authors):
+            if not score:
+                results.append((pyfile, None, []))
+            else:
+                results.append((pyfile, score, emails or []))
+        yield results
 
 
 def aggregate_pylint_scores(rootinfo, current_path, recursive, skip_regex,
                             pylint_rcfile=None,
-                            output_pylint_cmd=False):
+                            output_pylint_cmd=False,
+                            jobs=1,
+                            max_worker_memory=None,
+                            cache=None,
+                            backend=DEFAULT_BACKEND,
+                            changed_files=None,
+                            baseline=None,
+                            writer=None,
+                            scheduler=None,
+                            batch_size=1,
+                            shard=None,
+                            partial=None,
+                            revision=None,
+                            sampler=None):
     """
     Run Pylint and 'git blame', gather score, and return scores.
-    """
-    for pyfile in glob.glob(current_path + '/*.py'):
-        pyfile = pyfile.replace('./', '')
-        if skip_regex.search(pyfile):
-            continue
-        cmd = 'pylint --rcfile=%s %s' % (pylint_rcfile, pyfile)
-        if output_pylint_cmd:
-            print cmd
-            continue
-        pylint_output = os.popen(cmd).read().rstrip()
-        score = None
-        for line in pylint_output.split("\n"):
-            matched = PYLINT_SCORE_REGEX.match(line)
-            if matched:
-                score = float(matched.group(1))
-                if score < 0:
-                    score = -0.01
 
-        if not score:
-            print "Error, no score: %s" % pyfile
-            continue
-        git_blame_output = os.popen(BLAME_CMD % pyfile).read().rstrip()
-        for line in git_blame_output.split("\n"):
-            matched = BLAME_REGEX.match(line)
-            if matched:
-                email, code_line = matched.group('email', 'msg')
-                if not code_line:
-                    continue
-                email = get_author_alias(email)
-                rootinfo.add_score(pyfile, email, 1, score)
-
-    if recursive:
-        for dirname in [dirname for dirname in glob.glob(current_path + '/*')
-                        if os.path.isdir(dirname)]:
-            if skip_regex.search(dirname):
-                continue
-            aggregate_pylint_scores(
-                rootinfo,
-                dirname,
-                recursive,
-                skip_regex,
-                pylint_rcfile=pylint_rcfile,
-                output_pylint_cmd=output_pylint_cmd)
+    With jobs > 1 the files are scored by a pool of worker processes. The
+    results are merged in traversal order, so the report is the same as
+    the one from a serial run.
+
+    param {ChangeSet} changed_files: [optional] only score these files.
+    param {dict} baseline: [optional] pyfile => [score, emails] of earlier
+        runs. The files scored now replace their entries, changed files
+        that are gone are dropped, and rootinfo is built from all of it.
+    param {RecordWriter} writer: [optional] write records of the scores
+        to, rather than add them to rootinfo.
+    param {Scheduler} scheduler: [optional] lint and blame the files
+        concurrently with it, rather than one after the other. Ignored
+        with jobs > 1.
+    param {int} batch_size: number of files that a pylint run checks at
+        once; a batch is then the unit of work of the workers.
+    param {Shard} shard: [optional] only score the files of this shard.
+    param {list} partial: [optional] append the results of the shard to,
+        for sharding.write_partial, rather than add them to rootinfo.
+    param {Revision} revision: [optional] score the files of this revision
+        rather than those of the work tree.
+    param {Sampler} sampler: [optional] only score a sample of the files,
+        until its time budget runs out; rootinfo estimates the summaries
+        from them.
+    """
+    pyfiles = select_pyfiles(
+        find_pyfiles(current_path, recursive, skip_regex, changed_files,
+                     revision), shard, sampler, revision)
+    if output_pylint_cmd:
+        for pyfile in pyfiles:
+            print 'pylint --rcfile=%s %s' % (pylint_rcfile, pyfile)
+        return
+
+    if writer:
+        report = functools.partial(write_pyfile_records, writer,
+                                   rootinfo.authors)
+    elif partial is not None:
+        report = functools.partial(add_partial_scores, partial, shard)
+    else:
+        report = functools.partial(add_pyfile_scores, rootinfo)
+    if baseline is None:
+        merge = report
+    else:
+        if changed_files is None:
+            baseline.clear()
+        else:
+            for pyfile in changed_files.paths:
+                baseline.pop(pyfile, None)
+        merge = functools.partial(update_baseline, baseline)
+    if sampler:
+        merge = functools.partial(merge_sample, sampler, merge)
+
+    if revision:
+        # every Python file, so that pylint can resolve the imports
+        with span('checkout'):
+            revision.checkout(PYTHON_FILE_REGEX)
+    batches = get_pylint_batches(pyfiles, batch_size)
+    if jobs > 1:
+        batch_results = iter_pool_results(batches, jobs, max_worker_memory,
+                                          pylint_rcfile, cache, backend,
+                                          revision)
+    elif scheduler:
+        batch_results = iter_scheduled_results(batches, scheduler,
+                                               pylint_rcfile, cache,
+                                               backend, revision)
+    else:
+        batch_results = iter_serial_results(batches, pylint_rcfile, cache,
+                                            backend, revision)
+    # closing the results stops the work still in flight
+    with closing(batch_results):
+        for results in batch_results:
+            with span('merge'):
+                for result in results:
+                    merge(*result)
+            if sampler and sampler.expired():
+                break
+
+    if baseline is not None:
+        with span('merge'):
+            for pyfile in sorted(baseline):
+                report(pyfile, *baseline[pyfile])
 
 
 def run():
@@ -257,17 +818,70 @@ def run():
         # dummy placeholder to match nothing
         skip_regex = re.compile('\.svn|\.git')
 
-    rootinfo = InfoContainer(options.authors)
-    aggregate_pylint_scores(
-        rootinfo,
-        '.',
-        options.recursive,
-        skip_regex,
-        pylint_rcfile=options.pylint_rcfile,
-        output_pylint_cmd=options.cmd)
-
-    if not options.cmd:
-        print(rootinfo)
+    profiler_from_options(options)
+    cache = cache_from_options(options)
+    baseline = None
+    if options.baseline:
+        baseline = load_baseline(options.baseline)
+    writer = writer_from_options(options)
+    shard = shard_from_options(options)
+    partial = None
+    if shard and not writer:
+        if baseline is not None:
+            parser.error("--baseline can't be used with --shard")
+        partial = []
+    changed_files = change_set_from_options(options)
+    if options.rev and changed_files is not None:
+        parser.error("--rev can't be used with --since or --staged")
+    try:
+        if not options.cmd:
+            get_vcs()  # before any work, since blaming needs it
+        revision = revision_from_options(options)
+    except RuntimeError as e:
+        print "Error, %s" % e
+        sys.exit(1)
+    sampler = sampler_from_options(options)
+    if sampler and (baseline is not None or shard):
+        parser.error("--sample and --time-budget can't be used with "
+                     "--baseline or --shard")
+    rootinfo = InfoContainer(options.authors, options.path_depth, sampler)
+    try:
+        aggregate_pylint_scores(
+            rootinfo,
+            '.',
+            options.recursive,
+            skip_regex,
+            pylint_rcfile=options.pylint_rcfile,
+            output_pylint_cmd=options.cmd,
+            jobs=options.jobs,
+            max_worker_memory=options.max_worker_memory,
+            cache=cache,
+            backend=options.backend,
+            changed_files=changed_files,
+            baseline=baseline,
+            writer=writer,
+            scheduler=scheduler_from_options(options),
+            batch_size=options.batch_size,
+            shard=shard,
+            partial=partial,
+            revision=revision,
+            sampler=sampler)
+    finally:
+        if revision:
+            revision.close()
+    if cache:
+        cache.prune()
+    if baseline is not None and not options.cmd:
+        save_baseline(options.baseline, baseline)
+
+    if options.cmd:
+        pass  # the commands were printed instead
+    elif partial is not None:
+        write_partial(options.partial, 'pylint', shard, partial)
+    elif not writer:
+        with span('report'):
+            print(rootinfo)
+    report_from_options(options)
 
 
 if __name__ == '__main__':
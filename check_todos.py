@@ -21,51 +21,37 @@ Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
 
 Usage:
 check_todo.py --skip=^.idea/,^.git/,^auto/,^chef/
+check_todos.py --shard=1/4 --partial=todos-1.json
+check_todos.py --rev=HEAD~10
+check_todos.py --blame-jobs=8
 """
 import argparse
 from datetime import datetime
-import os
+import functools
 import re
-import subprocess
-
 
+from blame_index import BlameIndex
+from change_set import add_change_set_arguments, change_set_from_options
+from discovery import iter_files
+from file_buffer import count_newlines, get_line, read_buffer
+from profiling import (add_profile_arguments, profiler_from_options,
+                       report_from_options, span, FILE)
+from records import add_format_arguments, writer_from_options
+from result_cache import add_cache_arguments, cache_from_options
+from revision import add_revision_arguments, revision_from_options
+from scheduler import Scheduler
+from sharding import add_shard_arguments, shard_from_options, write_partial
+from vcs import get_author_alias, get_vcs
+
+
+TODO_FILE_REGEX = re.compile(r'\.(py|rb|java|pl|sh|sql|r)$|^Makefile')
 Todo_REGEX = re.compile(r'((TODO|FIXME)\((?P<name>[^\)]+)\)(?P<msg1>.*))|'
                         '((TODO|FIXME)[:\s](?P<msg2>.*))')
-
-BLAME_CMDS = (('git status',
-               'git blame --show-email -t %s',
-               r'\w+ .*\(\<(?P<email>[^\>]+)\>'
-               '\s+'
-               '(?P<datestamp>\d+)[^\)]+\) '
-               '(?P<msg>.*)'),
-              (('svn status',
-                'svn blame -v %s',
-                r'\s+\d+\s+(?P<email>.+)\s+'
-                '(?P<datestamp>\d{4}.+ \(.+\d{4}\)) '
-                '(?P<msg>.+)')))
-BLAME_CMD = None
-for _check_cmd, _blame_cmd, _blame_regex in BLAME_CMDS:
-    try:
-        if subprocess.call(_check_cmd.split(' '),
-                           stdout=subprocess.PIPE,
-                           stderr=subprocess.PIPE) == 0:
-            BLAME_CMD = _blame_cmd
-            BLAME_REGEX = re.compile(_blame_regex)
-            break
-    except OSError as e:
-        pass
-if not BLAME_CMD:
-    raise RuntimeError("Please run this in a git or svn directory")
+TODO_MARKER_REGEX = re.compile(r'TODO|FIXME')
 
 UNKNOWN = 'UNKNOWN'
 
 
-try:
-    from author_mapping import AUTHOR_MAPPING
-except ImportError:
-    AUTHOR_MAPPING = {}
-
-
 def configure_argument_parser(parser=argparse.ArgumentParser()):
     """
     param {argparse.ArgumentParser} parser: a parser that we populate
@@ -75,21 +61,27 @@ def configure_argument_parser(parser=argparse.ArgumentParser()):
                         action='store',
                         help='Directories to skip, separated by commas.',
                         default=[])
+    parser.add_argument('--blame-jobs', dest='blame_jobs',
+                        action='store',
+                        type=int,
+                        help='Number of files checked at once, in threads, '
+                             'since blaming them mostly waits (for svn, on '
+                             'its server)',
+                        default=1)
+    add_cache_arguments(parser)
+    add_change_set_arguments(parser)
+    add_revision_arguments(parser)
+    add_format_arguments(parser)
+    add_profile_arguments(parser)
+    add_shard_arguments(parser)
     return parser
 
 
-def get_author_alias(author):
-    """
-    Todo(kevinx): move mapping function elsewhere
-    """
-    if author in AUTHOR_MAPPING:
-        return AUTHOR_MAPPING[author]
-    return author
-
-
 class Todo():
-    def __init__(self, filename, datestamp, name, checkin_name, msg):
+    def __init__(self, filename, datestamp, name, checkin_name, msg,
+                 line=None):
         self.filename = filename
+        self.line = line
         self.datestamp = datestamp
         self.name = name
         self.checkin_name = checkin_name
@@ -100,15 +92,10 @@ class Todo():
             author = "%s->%s" % (self.checkin_name, self.name)
         else:
             author = self.name or self.checkin_name or UNKNOWN
-        if self.datestamp.isdigit():
-            date = datetime.fromtimestamp(self.datestamp).strftime("%Y-%m-%d")
+        if self.datestamp is None:
+            date = UNKNOWN
         else:
-            m = re.search(r'(\d{4}\-\d{2}\-\d{2})', self.datestamp)
-            # TODO(kevinx): convert this to a printable string
-            if m:
-                date = m.group(1)
-            else:
-                date = UNKNOWN
+            date = datetime.fromtimestamp(self.datestamp).strftime("%Y-%m-%d")
         return "%s %s: TODO(%s): %s" % (
             date, self.filename, author, self.msg)
 
@@ -116,74 +103,190 @@ class Todo():
         return self.name or self.checkin_name or UNKNOWN
 
 
-def parse_file_and_get_todo_list(file_path):
+def parse_file_and_get_todo_list(file_path, blame_index=None,
+                                 contents=None):
     """
     Parse a file, then return a list of Todo objects, if any.
+
+    Most files have no TODO at all, so the whole file is searched for
+    TODO_MARKER_REGEX first, and Todo_REGEX only runs on the lines that
+    have a marker. Only those lines are blamed.
+
+    param {BlameIndex} blame_index: [optional] index to read the blame of
+        the file from.
+    param {str} contents: [optional] see scan_todos.
     """
+    line_to_todo = scan_todos(file_path, contents)
+    if len(line_to_todo) > 0:
+        blame_index = blame_index or BlameIndex(None)
+        blame_lines = blame_index.blame_lines(file_path, line_to_todo.keys())
+        backfill_todos(line_to_todo, blame_lines)
+    return line_to_todo.values()
+
+
+def scan_todos(file_path, contents=None):
+    """
+    Return a dict of 0-based line number to the Todo of that line, whose
+    checkin name and datestamp are still unknown.
+
+    param {str} contents: [optional] the contents of the file (such as
+        those of a revision), rather than reading it.
+    """
+    with span('scan'):
+        if contents is not None:
+            return _scan_buffer(file_path, contents)
+        with read_buffer(file_path) as buff:
+            return _scan_buffer(file_path, buff)
+
+
+def _scan_buffer(file_path, buff):
     line_to_todo = {}
+    # substring searches are much cheaper than the regex
+    if buff.find('TODO') == -1 and buff.find('FIXME') == -1:
+        return line_to_todo
     line_count = 0
-    for line in (open(file_path).read().rstrip()).split("\n"):
-        match = Todo_REGEX.search(line)
+    line_start = 0
+    line_end = -1
+    for marker in TODO_MARKER_REGEX.finditer(buff):
+        if marker.start() <= line_end:
+            continue  # another marker on an already parsed line
+        start, line_end = get_line(buff, marker.start())
+        line_count += count_newlines(buff, line_start, start)
+        line_start = start
+        match = Todo_REGEX.search(buff[start:line_end])
         if match:
             name = (match and match.group('name')) or None
             name = get_author_alias(name)
             msg = match.group('msg1') or match.group('msg2') or ''
             msg = msg.rstrip()
-            line_to_todo[line_count] = Todo(file_path, None, name, None, msg)
-        line_count += 1
+            line_to_todo[line_count] = Todo(file_path, None, name, None,
+                                            msg, line_count + 1)
+    return line_to_todo
 
-    if len(line_to_todo) > 0:
-        git_blame_output = os.popen(BLAME_CMD % file_path).read().rstrip()
-        line_count = 0
-        for line in git_blame_output.split("\n"):
-            if line_count in line_to_todo:
-                matched = BLAME_REGEX.match(line)
-                if matched:
-                    email, datestamp, _code_line = matched.group(
-                        'email', 'datestamp', 'msg')
-                    # backfill the checkin author name
-                    line_to_todo[line_count].checkin_name = (
-                        get_author_alias(email))
-                    if datestamp.isdigit():
-                        line_to_todo[line_count].datestamp = int(datestamp)
-                    else:
-                        # TODO(kevinx): convert this to integer
-                        line_to_todo[line_count].datestamp = datestamp
-                #print "***%s" % line_to_todo[line_count]
-            line_count += 1
-    return line_to_todo.values()
+
+def backfill_todos(line_to_todo, blame_lines):
+    """
+    Fill in the checkin name and datestamp of the Todos of scan_todos()
+    from the blame of their lines (a dict of 0-based line number to blame
+    entry).
+    """
+    for line_count, blame_line in blame_lines.iteritems():
+        if not blame_line or line_count not in line_to_todo:
+            continue
+        email, datestamp, _has_code = blame_line
+        # backfill the checkin author name
+        line_to_todo[line_count].checkin_name = get_author_alias(email)
+        line_to_todo[line_count].datestamp = datestamp
+
+
+def write_todo_record(writer, todo):
+    """
+    Write the record of a Todo.
+    """
+    writer.write('todos', todo.filename, line=todo.line,
+                 author=todo.get_author(), code='TODO', message=todo.msg,
+                 timestamp=todo.datestamp)
+
+
+def get_todo_fields(todo):
+    """
+    Return the arguments that make a Todo again, for partial reports.
+    """
+    return [todo.filename, todo.datestamp, todo.name, todo.checkin_name,
+            todo.msg, todo.line]
+
+
+def get_todo_list(path, blame_index=None, revision=None, timeout=None):
+    """
+    Return the Todos of a file of the work tree, or of the revision.
+    timeout is ignored; it's there for the Scheduler.
+    """
+    with span(path, FILE):
+        contents = revision and revision.read(path)
+        return parse_file_and_get_todo_list(path, blame_index, contents)
 
 
-def print_todos(skip_regex):
+def iter_todo_lists(paths, blame_index=None, revision=None, blame_jobs=1):
+    """
+    Yield (path, Todos) of every file, in the order of paths. With
+    blame_jobs > 1 that many files are checked at once by a Scheduler, so
+    at most that many blames run at a time.
+    """
+    check = functools.partial(get_todo_list, blame_index=blame_index,
+                              revision=revision)
+    if blame_jobs <= 1:
+        for path in paths:
+            yield path, check(path)
+        return
+    scheduler = Scheduler({'blame': blame_jobs})
+    for path, (todo_list,) in scheduler.imap(paths, [('blame', check)]):
+        # a file that failed was reported by the Scheduler
+        yield path, todo_list or []
+
+
+def print_todos(skip_regex, blame_index=None, changed_files=None,
+                writer=None, shard=None, partial=None, revision=None,
+                blame_jobs=1):
     """
     Check Python programs for Todo strings
+
+    param {ChangeSet} changed_files: [optional] only check these files.
+    param {RecordWriter} writer: [optional] write a record per TODO as
+        soon as it's found, rather than print them by author.
+    param {Shard} shard: [optional] only check the files of this shard.
+    param {list} partial: [optional] append the TODOs of the shard to, for
+        sharding.write_partial, rather than print them.
+    param {Revision} revision: [optional] check the files of this revision
+        rather than those of the work tree; blame_index should blame them
+        as of the revision too.
+    param {int} blame_jobs: number of files checked at once.
     """
+    paths = [entry.path for entry in
+             iter_files('.', skip_regex, name_regex=TODO_FILE_REGEX,
+                        changed_files=changed_files,
+                        paths=revision and revision.get_paths(),
+                        skip_file_names=True)]
+    if shard:
+        if revision:
+            paths = shard.select(paths, revision.get_size)
+        else:
+            paths = shard.select(paths)
     author_to_todolist = {}
-    for root, _dirs, files in os.walk("./"):
-        root = os.path.normpath(root)
-        if skip_regex.search(root):
+    for path, todo_list in iter_todo_lists(paths, blame_index, revision,
+                                           blame_jobs):
+        if writer:
+            for todo in sorted(todo_list, key=lambda todo: todo.line):
+                write_todo_record(writer, todo)
             continue
-        for filename in files:
-            if (skip_regex.search(filename) or
-                not (re.search(r'\.(py|rb|java|pl|sh|sql|r)$', filename)
-                     or filename.startswith("Makefile"))):
-                continue
-            file_path = os.path.join(root, filename)
-            todo_list = parse_file_and_get_todo_list(file_path)
-            for todo in todo_list:
-                name = todo.get_author()
-                if name not in author_to_todolist:
-                    author_to_todolist[name] = []
-                author_to_todolist[name].append(todo)
-
-    author_idx = 0
+        if partial is not None:
+            if todo_list:
+                partial.append([shard.positions[path], path,
+                                [get_todo_fields(todo)
+                                 for todo in todo_list]])
+            continue
+        for todo in todo_list:
+            name = todo.get_author()
+            if name not in author_to_todolist:
+                author_to_todolist[name] = []
+            author_to_todolist[name].append(todo)
+
+    if author_to_todolist:
+        print format_todos(author_to_todolist)
+
+
+def format_todos(author_to_todolist):
+    """
+    Return the report of the TODOs, by author.
+    """
+    buff = []
     for author, todo_list in sorted(author_to_todolist.iteritems()):
-        if author_idx > 0:
-            print ""
-        print "TODO(%s): %s has %d items." % (author, author, len(todo_list))
+        if buff:
+            buff.append("")
+        buff.append("TODO(%s): %s has %d items." % (
+            author, author, len(todo_list)))
         for todo in todo_list:
-            print todo
-        author_idx += 1
+            buff.append(str(todo))
+    return "\n".join(buff)
 
 
 def run():
@@ -196,7 +299,34 @@ def run():
     else:
         skip_regex = re.compile(r"(^.idea|^.git|^auto|check_todos.py)")
 
-    print_todos(skip_regex)
+    profiler_from_options(options)
+    cache = cache_from_options(options)
+    writer = writer_from_options(options)
+    shard = shard_from_options(options)
+    partial = None
+    if shard and not writer:
+        partial = []
+    changed_files = change_set_from_options(options)
+    if options.rev and changed_files is not None:
+        parser.error("--rev can't be used with --since or --staged")
+    try:
+        get_vcs()  # before any work, since blaming needs it
+        revision = revision_from_options(options)
+    except RuntimeError as e:
+        print "Error, %s" % e
+        sys.exit(1)
+    try:
+        print_todos(skip_regex, BlameIndex(cache, revision and revision.sha),
+                    changed_files, writer, shard, partial, revision,
+                    options.blame_jobs)
+    finally:
+        if revision:
+            revision.close()
+    if partial is not None:
+        write_partial(options.partial, 'todos', shard, partial)
+    if cache:
+        cache.prune()
+    report_from_options(options)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,184 @@
+"""
+Copyright (C) 2012 KevinX Chang.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, Inc., 675 Mass Ave, Cambridge MA 02139,
+USA; either version 2 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+
+Commands run by the checkers: git, svn and the linters.
+
+A command is a shell command line or, for anything that takes a path, an
+argument vector run without a shell. Each one is timed as a SUBPROCESS
+span (see profiling), runs in a session of its own so that a timeout
+kills it with everything it started, and can be read as a whole
+(read_command) or line by line as it runs (iter_command_lines).
+"""
+import os
+import signal
+import subprocess
+import sys
+import threading
+from contextlib import contextmanager
+from distutils.spawn import find_executable
+
+from profiling import span, SUBPROCESS
+
+# makes a session, then runs the command of its arguments
+_SETSID_SCRIPT = ('import os, sys; os.setsid(); '
+                  'os.execvp(sys.argv[1], sys.argv[1:])')
+
+_SETSID_ARGS = None  # see _get_session_args
+
+
+class CommandTimeout(RuntimeError):
+    """
+    Raised by read_command when a command runs out of time.
+    """
+
+
+def read_command(cmd, timeout=None):
+    """
+    Same as os.popen(cmd).read(), timed as a SUBPROCESS span.
+
+    param {str|list} cmd: a shell command line, or the argument vector of
+        a command to run without a shell.
+    param {float} timeout: [optional] seconds after which the command
+        (with everything it started) is killed, and CommandTimeout raised.
+    """
+    with _command_span(cmd) as cmd_span:
+        if not isinstance(cmd, basestring):
+            output = _read_command_with_timeout(cmd, timeout)
+        elif timeout is None:
+            output = os.popen(cmd).read()
+        else:
+            output = _read_command_with_timeout(cmd, timeout)
+        cmd_span.set(output_bytes=len(output))
+    return output
+
+
+def iter_command_lines(cmd, timeout=None, quiet=False, env=None):
+    """
+    Yield the output of a command line by line, as it comes off the pipe,
+    timed as a SUBPROCESS span. Closing the generator before the end of
+    the output (see contextlib.closing) kills the command, so that callers
+    can stop reading once they found what they need.
+
+    param {str|list} cmd: see read_command.
+    param {float} timeout: [optional] see read_command; CommandTimeout is
+        raised once the lines read so far were consumed.
+    param {bool} quiet: throw away what the command writes to stderr.
+    param {dict} env: [optional] the environment of the command, rather
+        than that of this process.
+    """
+    with _command_span(cmd) as cmd_span:
+        process = _popen_session(cmd, quiet, env)
+        output_bytes = 0
+        complete = False
+        try:
+            with _killed_after(timeout, process, cmd):
+                for line in iter(process.stdout.readline, ''):
+                    output_bytes += len(line)
+                    yield line
+                complete = True
+        finally:
+            if not complete:
+                _kill_session(process)
+            process.stdout.close()
+            process.wait()
+            cmd_span.set(output_bytes=output_bytes, complete=complete)
+
+
+def _format(cmd):
+    if isinstance(cmd, basestring):
+        return cmd
+    return ' '.join(cmd)
+
+
+def _command_span(cmd):
+    cmd = _format(cmd)
+    return span(cmd.split(' ', 1)[0], SUBPROCESS, cmd=cmd)
+
+
+def _get_session_args(cmd):
+    """
+    Return the argument vector that runs a command in a session of its
+    own, so that the shell and its children are killed together. The
+    session is made by the setsid command (or, without it, a python that
+    calls setsid and execs the command) rather than by a preexec_fn,
+    which can deadlock the child of a process that has other threads.
+    """
+    global _SETSID_ARGS
+    if _SETSID_ARGS is None:
+        setsid = find_executable('setsid')
+        _SETSID_ARGS = setsid and [setsid] or [sys.executable, '-c',
+                                               _SETSID_SCRIPT]
+    if isinstance(cmd, basestring):
+        cmd = ['/bin/sh', '-c', cmd]
+    return _SETSID_ARGS + list(cmd)
+
+
+def _popen_session(cmd, quiet=False, env=None):
+    stderr = None
+    if quiet:
+        stderr = open(os.devnull, 'w')
+    try:
+        # close_fds, so that the child doesn't hold the pipes of commands
+        # that other threads are starting
+        return subprocess.Popen(_get_session_args(cmd),
+                                stdout=subprocess.PIPE, stderr=stderr,
+                                bufsize=1 << 16, close_fds=True, env=env)
+    finally:
+        if stderr:
+            stderr.close()
+
+
+def _kill_session(process):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+
+@contextmanager
+def _killed_after(timeout, process, cmd):
+    """
+    Kill the session of a process if what this wraps is still running
+    after timeout seconds, in which case CommandTimeout is raised once it
+    returns. Without a timeout, nothing is killed.
+    """
+    if timeout is None:
+        yield
+        return
+    timed_out = []
+
+    def kill():
+        timed_out.append(True)
+        _kill_session(process)
+    timer = threading.Timer(timeout, kill)
+    timer.start()
+    try:
+        yield
+    finally:
+        timer.cancel()
+    if timed_out:
+        raise CommandTimeout("Timed out after %ss: %s" % (
+            timeout, _format(cmd)))
+
+
+def _read_command_with_timeout(cmd, timeout=None):
+    process = _popen_session(cmd)
+    with _killed_after(timeout, process, cmd):
+        return process.communicate()[0]
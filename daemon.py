@@ -0,0 +1,390 @@
+#!/usr/bin/python2.7
+
+"""
+Copyright (C) 2012 KevinX Chang.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, Inc., 675 Mass Ave, Cambridge MA 02139,
+USA; either version 2 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+Daemon that keeps the reports of check_pylint and check_todos warm.
+
+'daemon.py serve' analyses the work tree once, then polls the mtimes of
+its files every --interval seconds and re-analyses only the files that
+changed (and blames every file again when HEAD moves). It keeps the
+per-file scores, blames and TODOs in memory, along with the reports built
+from them, and answers queries on a Unix socket; any number of clients
+can query it at the same time.
+
+The other commands are the client: they print the report the daemon
+holds for the directory they run in.
+
+Usage:
+daemon.py serve --rcfile=pylint.rc --skip=^auto &
+daemon.py pylint
+daemon.py pylint --authors=kevinx
+daemon.py todos
+daemon.py status
+daemon.py stop
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import socket
+import SocketServer
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+from command_runner import read_command
+from discovery import iter_files, PYTHON_FILE_REGEX
+from linter_backends import (add_backend_arguments, get_pylint_backend,
+                             DEFAULT_BACKEND)
+from result_cache import add_cache_arguments, cache_from_options
+
+SERVE = 'serve'
+PYLINT = 'pylint'
+TODOS = 'todos'
+STATUS = 'status'
+STOP = 'stop'
+COMMANDS = (SERVE, PYLINT, TODOS, STATUS, STOP)
+
+DEFAULT_INTERVAL = 1.0  # seconds
+# how long a client waits for the first analysis of the work tree
+QUERY_TIMEOUT = 600  # seconds
+
+
+def get_default_socket_path():
+    """
+    Return the socket of the daemon of the current directory.
+    """
+    digest = hashlib.sha1(os.path.abspath('.')).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), 'pynalysis-%s.sock' % digest)
+
+
+def configure_argument_parser(parser=argparse.ArgumentParser()):
+    """
+    param {argparse.ArgumentParser} parser: a parser that we populate
+        specific options.
+    """
+    parser.add_argument('command', choices=COMMANDS,
+                        help='Run the daemon (serve), print one of its '
+                             'reports (pylint, todos, status) or stop it')
+    parser.add_argument('--socket', dest='socket',
+                        action='store',
+                        help='Unix socket of the daemon, by default one per '
+                             'directory',
+                        default=None)
+    parser.add_argument('--authors', dest='authors',
+                        nargs='*',
+                        help='[optional] Only output these authors')
+    parser.add_argument('--skip', dest='skip',
+                        action='store',
+                        help='directories to skip', default=[])
+    parser.add_argument('--rcfile', dest='pylint_rcfile',
+                        action='store',
+                        type=str,
+                        help='Pylint rcfile', default=None)
+    parser.add_argument('--interval', dest='interval',
+                        action='store',
+                        type=float,
+                        help='Seconds between two polls of the work tree',
+                        default=DEFAULT_INTERVAL)
+    add_cache_arguments(parser)
+    add_backend_arguments(parser)
+    return parser
+
+
+class WorkTreeState(object):
+    """
+    The per-file results of the work tree and the reports built from
+    them. poll() runs in a single thread; the reports are read by any
+    number of request threads.
+
+    The checkers are only imported here, so that the client, which has no
+    use for them, starts quickly.
+    """
+    def __init__(self, skip_regex, pylint_rcfile=None, cache=None,
+                 backend=DEFAULT_BACKEND):
+        import check_pylint
+        import check_todos
+        from blame_index import BlameIndex
+        self.check_pylint = check_pylint
+        self.check_todos = check_todos
+        self.skip_regex = skip_regex
+        self.pylint_rcfile = pylint_rcfile
+        self.cache = cache
+        self.backend = backend
+        self.pylint_backend = get_pylint_backend(self.backend, pylint_rcfile)
+        self.blame_index = BlameIndex(cache)
+
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        self.head = None
+        self.stamps = {}  # path => (mtime, size)
+        self.scores = {}  # pyfile => (score, emails)
+        self.todos = {}  # path => list of Todo
+        self.reports = {}  # command => report of everyone
+        self.polls = 0
+        self.last_poll = None
+        self.last_changes = 0
+
+    def _get_head(self):
+        from vcs import get_vcs
+        if get_vcs() != 'git':
+            return None
+        return read_command('git rev-parse HEAD 2>/dev/null').strip()
+
+    def _get_stamps(self):
+        stamps = {}
+        for entry in iter_files('.', self.skip_regex):
+            if not (self.check_todos.TODO_FILE_REGEX.search(entry.name) or
+                    PYTHON_FILE_REGEX.search(entry.name)):
+                continue
+            try:
+                stat = os.stat(entry.path)
+            except OSError:
+                continue
+            stamps[entry.path] = (stat.st_mtime, stat.st_size)
+        return stamps
+
+    def _analyse(self, path):
+        """
+        Return the (score, emails) and the TODOs of a file; score is
+        None for files that are not Python.
+        """
+        score = None
+        if PYTHON_FILE_REGEX.search(path):
+            score = self.check_pylint.score_pyfile(
+                path, self.pylint_rcfile, self.cache, self.backend)[1:]
+        todos = []
+        if self.check_todos.TODO_FILE_REGEX.search(os.path.basename(path)):
+            todos = self.check_todos.parse_file_and_get_todo_list(
+                path, self.blame_index)
+        return score, todos
+
+    def poll(self):
+        """
+        Re-analyse the files that changed since the last poll, and
+        rebuild the reports if any did. Returns the number of files that
+        changed.
+        """
+        from blame_index import reset_blob_shas
+        head = self._get_head()
+        stamps = self._get_stamps()
+        if head != self.head:
+            # every blame may have changed
+            changed = set(stamps)
+        else:
+            changed = set(path for path, stamp in stamps.iteritems()
+                          if self.stamps.get(path) != stamp)
+        removed = set(self.stamps).difference(stamps)
+        if changed or removed:
+            reset_blob_shas()
+
+        results = {}
+        for path in sorted(changed):
+            try:
+                results[path] = self._analyse(path)
+            except Exception:
+                sys.stderr.write("Error, failed to analyse %s:\n%s" % (
+                    path, traceback.format_exc()))
+                stamps.pop(path, None)
+
+        with self.lock:
+            for path in removed:
+                self.scores.pop(path, None)
+                self.todos.pop(path, None)
+            for path, (score, todos) in results.iteritems():
+                if score is not None:
+                    self.scores[path] = score
+                self.todos[path] = todos
+            self.head = head
+            self.stamps = stamps
+            if changed or removed or not self.ready.is_set():
+                self.reports = {PYLINT: self._format_pylint(),
+                                TODOS: self._format_todos()}
+            self.polls += 1
+            self.last_poll = time.time()
+            self.last_changes = len(changed) + len(removed)
+        self.ready.set()
+        return self.last_changes
+
+    def _format_pylint(self, authors=None):
+        rootinfo = self.check_pylint.InfoContainer(authors)
+        buff = []
+        for pyfile, (score, emails) in sorted(self.scores.iteritems()):
+            if not score:
+                buff.append("Error, no score: %s" % pyfile)
+                continue
+            rootinfo.add_file_scores(pyfile,
+                                     self.check_pylint.count_authors(emails),
+                                     score)
+        buff.append(str(rootinfo))
+        return "\n".join(buff)
+
+    def _format_todos(self):
+        author_to_todolist = {}
+        for _path, todo_list in sorted(self.todos.iteritems()):
+            for todo in todo_list:
+                author_to_todolist.setdefault(todo.get_author(),
+                                              []).append(todo)
+        return self.check_todos.format_todos(author_to_todolist)
+
+    def get_report(self, command, authors=None):
+        """
+        Return the report of a command, once the work tree was analysed.
+        """
+        if not self.ready.wait(QUERY_TIMEOUT):
+            raise RuntimeError("The work tree is still being analysed")
+        with self.lock:
+            if command == STATUS:
+                return ("%d files, %d polls, last poll %.1fs ago changed "
+                        "%d files" % (len(self.stamps), self.polls,
+                                      time.time() - self.last_poll,
+                                      self.last_changes))
+            if command == PYLINT and authors:
+                return self._format_pylint(authors)
+            return self.reports[command]
+
+
+class RequestHandler(SocketServer.StreamRequestHandler):
+    """
+    Answers one request: a JSON line {"command": ..., "authors": ...},
+    with a JSON line {"ok": ..., "output": ...}.
+    """
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            command = request['command']
+            if command == STOP:
+                response = {'ok': True, 'output': 'Stopping'}
+            elif command in (PYLINT, TODOS, STATUS):
+                output = self.server.state.get_report(
+                    command, request.get('authors'))
+                response = {'ok': True, 'output': output}
+            else:
+                response = {'ok': False,
+                            'output': 'Unknown command: %s' % command}
+        except Exception as e:
+            command = None
+            response = {'ok': False, 'output': str(e)}
+        self.wfile.write(json.dumps(response) + "\n")
+        self.wfile.flush()
+        if command == STOP:
+            # answer first: the handler threads die with the server
+            threading.Thread(target=self.server.shutdown).start()
+
+
+class DaemonServer(SocketServer.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, state):
+        SocketServer.ThreadingUnixStreamServer.__init__(
+            self, socket_path, RequestHandler)
+        self.state = state
+
+
+def poll_forever(state, interval, stopped):
+    while not stopped.is_set():
+        try:
+            state.poll()
+        except Exception:
+            sys.stderr.write("Error, failed to poll:\n%s" %
+                             traceback.format_exc())
+        stopped.wait(interval)
+
+
+def serve(socket_path, state, interval=DEFAULT_INTERVAL):
+    """
+    Poll the work tree in the background and answer queries until a
+    client asks to stop.
+    """
+    if os.path.exists(socket_path):
+        try:
+            query(socket_path, STATUS)
+        except socket.error:
+            os.unlink(socket_path)  # left over by a daemon that died
+        else:
+            raise RuntimeError("A daemon is already serving %s" %
+                               socket_path)
+    server = DaemonServer(socket_path, state)
+    stopped = threading.Event()
+    poller = threading.Thread(target=poll_forever,
+                              args=(state, interval, stopped))
+    poller.daemon = True
+    poller.start()
+    try:
+        server.serve_forever()
+    finally:
+        stopped.set()
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def query(socket_path, command, authors=None):
+    """
+    Send a command to the daemon, and return its response.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+        sock.sendall(json.dumps({'command': command,
+                                 'authors': authors}) + "\n")
+        sock.shutdown(socket.SHUT_WR)
+        chunks = []
+        while True:
+            chunk = sock.recv(1 << 16)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        sock.close()
+    return json.loads(''.join(chunks))
+
+
+def run():
+    parser = configure_argument_parser()
+    options = parser.parse_args(sys.argv[1:])
+    socket_path = options.socket or get_default_socket_path()
+
+    if options.command == SERVE:
+        if len(options.skip) > 0:
+            skip_regex = re.compile("|".join(options.skip.split(',')))
+        else:
+            skip_regex = re.compile(r"(^.idea|^.git|^auto)")
+        state = WorkTreeState(skip_regex, options.pylint_rcfile,
+                              cache_from_options(options), options.backend)
+        serve(socket_path, state, options.interval)
+        return
+
+    try:
+        response = query(socket_path, options.command, options.authors)
+    except socket.error:
+        print "No daemon is serving %s, start one with: daemon.py serve" % (
+            os.path.abspath('.'))
+        sys.exit(1)
+    print response['output']
+    if not response['ok']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    run()
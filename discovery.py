@@ -0,0 +1,229 @@
+"""
+Copyright (C) 2012 KevinX Chang.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, Inc., 675 Mass Ave, Cambridge MA 02139,
+USA; either version 2 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+File discovery shared by the checkers.
+
+iter_files() yields the files to check under a directory as FileEntry
+tuples, in a stable order: the files of a directory (sorted), then its
+subdirectories. In a git work tree the files come from 'git ls-files', so
+.gitignore is honored and ignored trees (virtualenvs, node_modules, ...)
+are never walked; elsewhere the tree is walked with os.scandir (or the
+scandir backport) when available. Skipped directories are pruned before
+they are descended into.
+"""
+import collections
+import os
+import re
+import subprocess
+
+from profiling import span, SUBPROCESS
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+# never worth descending into
+VCS_DIRS = frozenset(['.git', '.svn', '.hg'])
+
+PYTHON_FILE_REGEX = re.compile(r'\.py$')
+
+
+class FileEntry(collections.namedtuple('FileEntry', ['path', 'name'])):
+    """
+    A discovered file: its path relative to the current directory (without
+    a leading './') and its base name.
+    """
+    __slots__ = ()
+
+    @property
+    def dirname(self):
+        return os.path.dirname(self.path) or '.'
+
+    @property
+    def size(self):
+        return os.path.getsize(self.path)
+
+
+def _join(dirpath, name):
+    if dirpath == '.':
+        return name
+    return dirpath + '/' + name
+
+
+def _list_dir(dirpath):
+    """
+    Return the sorted (file names, directory names) of a directory.
+    Symbolic links to directories are not followed.
+    """
+    filenames = []
+    dirnames = []
+    if scandir is not None:
+        try:
+            entries = list(scandir(dirpath))
+        except OSError:
+            return filenames, dirnames
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                dirnames.append(entry.name)
+            elif entry.is_file():
+                filenames.append(entry.name)
+    else:
+        try:
+            names = os.listdir(dirpath)
+        except OSError:
+            return filenames, dirnames
+        for name in names:
+            path = os.path.join(dirpath, name)
+            if os.path.isdir(path) and not os.path.islink(path):
+                dirnames.append(name)
+            elif os.path.isfile(path):
+                filenames.append(name)
+    filenames.sort()
+    dirnames.sort()
+    return filenames, dirnames
+
+
+def _walk_files(root, recursive, skip_dir):
+    filenames, dirnames = _list_dir(root)
+    for filename in filenames:
+        yield _join(root, filename), filename
+    if recursive:
+        for dirname in dirnames:
+            if dirname in VCS_DIRS:
+                continue
+            dirpath = _join(root, dirname)
+            if skip_dir(dirpath):
+                continue
+            for path, filename in _walk_files(dirpath, recursive, skip_dir):
+                yield path, filename
+
+
+def _sort_key(path):
+    # the files of a directory sort before its subdirectories
+    parts = path.split('/')
+    return [(1, part) for part in parts[:-1]] + [(0, parts[-1])]
+
+
+def _git_ls_files(root):
+    """
+    Return the files under root that git knows about or that are not
+    ignored, or None if root is not in a git work tree.
+    """
+    def ls_files(args):
+        argv = ['git', 'ls-files', '-z'] + args + ['--', root]
+        with span('git', SUBPROCESS, cmd=' '.join(argv)) as cmd_span:
+            try:
+                process = subprocess.Popen(argv, stdout=subprocess.PIPE,
+                                           stderr=subprocess.PIPE)
+            except OSError:
+                return None
+            output = process.communicate()[0]
+            cmd_span.set(output_bytes=len(output))
+        if process.returncode != 0:
+            return None
+        return [path for path in output.split("\0") if path]
+
+    paths = ls_files(['--cached', '--others', '--exclude-standard'])
+    if paths is None:
+        return None
+    deleted = set(ls_files(['--deleted']) or [])
+    # a path is listed once per merge stage while in conflict
+    paths = sorted(set(path for path in paths if path not in deleted),
+                   key=_sort_key)
+    return paths
+
+
+def _git_files(root, recursive, skip_dir, paths):
+    top = '' if root == '.' else root
+    skipped_dirs = {}
+
+    def is_skipped(dirpath):
+        if dirpath == top:
+            return False
+        if dirpath not in skipped_dirs:
+            skipped_dirs[dirpath] = (
+                is_skipped(os.path.dirname(dirpath)) or
+                os.path.basename(dirpath) in VCS_DIRS or
+                skip_dir(dirpath))
+        return skipped_dirs[dirpath]
+
+    for path in paths:
+        dirpath = os.path.dirname(path)
+        if not recursive and dirpath != top:
+            continue
+        if is_skipped(dirpath):
+            continue
+        yield path, os.path.basename(path)
+
+
+def iter_files(root='.', skip_regex=None, recursive=True, name_regex=None,
+               changed_files=None, use_git=True, paths=None,
+               skip_file_names=False):
+    """
+    Yield a FileEntry for every file under root.
+
+    param {re} skip_regex: [optional] skip the directories and files whose
+        relative path matches.
+    param {bool} recursive: look into subdirectories.
+    param {re} name_regex: [optional] only yield files whose name matches.
+    param {ChangeSet} changed_files: [optional] only yield these files.
+    param {bool} use_git: list the files with 'git ls-files' when root is
+        in a git work tree.
+    param {list} paths: [optional] the files to list (such as the files of
+        a revision), relative to the current directory, rather than the
+        files on disk.
+    param {bool} skip_file_names: match skip_regex against the names of
+        files rather than their relative paths, the way check_todos and
+        check_misc always did; directories still match by relative path.
+    """
+    root = os.path.normpath(root)
+
+    def skip_dir(dirpath):
+        if skip_regex and skip_regex.search(dirpath):
+            return True
+        if changed_files is not None:
+            return not changed_files.contains_dir(dirpath)
+        return False
+
+    if paths is not None:
+        paths = sorted(paths, key=_sort_key)
+        if root != '.':
+            paths = [path for path in paths
+                     if path.startswith(root + '/')]
+    elif use_git:
+        with span('discovery'):
+            paths = _git_ls_files(root)
+    if paths is None:
+        files = _walk_files(root, recursive, skip_dir)
+    else:
+        files = _git_files(root, recursive, skip_dir, paths)
+
+    for path, name in files:
+        if name_regex and not name_regex.search(name):
+            continue
+        if skip_regex and skip_regex.search(
+                name if skip_file_names else path):
+            continue
+        if changed_files is not None and path not in changed_files:
+            continue
+        yield FileEntry(path, name)
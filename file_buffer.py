@@ -0,0 +1,75 @@
+"""
+Copyright (C) 2012 KevinX Chang.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, Inc., 675 Mass Ave, Cambridge MA 02139,
+USA; either version 2 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+Whole-file buffers for the checkers that scan large files.
+
+read_buffer() yields the contents of a file as a string, or as a
+read-only mmap for large files, so that substring and regex searches run
+over the file without copying it into lines.
+"""
+import contextlib
+import mmap
+import os
+
+# files at least this large are memory-mapped rather than read
+MMAP_THRESHOLD = 1 << 20
+
+
+@contextlib.contextmanager
+def read_buffer(file_path):
+    """
+    Yield the contents of file_path as a string or an mmap.
+    """
+    fd = open(file_path, 'rb')
+    try:
+        size = os.fstat(fd.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            buff = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                yield buff
+            finally:
+                buff.close()
+        else:
+            yield fd.read()
+    finally:
+        fd.close()
+
+
+def count_newlines(buff, start, end, chunk_size=1 << 20):
+    """
+    Count the newlines of buff[start:end] without copying all of it.
+    """
+    count = 0
+    while start < end:
+        chunk_end = min(start + chunk_size, end)
+        count += buff[start:chunk_end].count('\n')
+        start = chunk_end
+    return count
+
+
+def get_line(buff, pos):
+    """
+    Return (start, end) of the line of buff that contains pos, without
+    its newline.
+    """
+    start = buff.rfind('\n', 0, pos) + 1
+    end = buff.find('\n', pos)
+    if end == -1:
+        end = len(buff)
+    return start, end
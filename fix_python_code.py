@@ -1,10 +1,21 @@
 #!/usr/bin/python2.7
 
-import glob
+"""
+Usage:
+fix_python_code.py
+fix_python_code.py --single-pass --max-iterations=5
+"""
+import argparse
 import os
 import re
 from subprocess import call
 
+from command_runner import read_command
+from discovery import iter_files, PYTHON_FILE_REGEX
+from linter_backends import PEP8_MESSAGE_REGEX
+from profiling import (add_profile_arguments, profiler_from_options,
+                       report_from_options, span, FILE)
+
 
 REPLACEMENTS = (
     ('\(\s(?P<content>\S.*)\s\)', '(\g<content>)'),
@@ -14,6 +25,27 @@ REPLACEMENTS = (
 )
 
 PEP8_CMD = 'pep8 --ignore E265,E501,W291,W293'
+SKIP_REGEX = re.compile('migrations')
+MAX_ITERATIONS = 10
+
+
+def configure_argument_parser(parser=argparse.ArgumentParser()):
+    """
+    param {argparse.ArgumentParser} parser: a parser that we populate
+        specific options.
+    """
+    parser.add_argument('--single-pass', dest='single_pass',
+                        action='store_true',
+                        help='Fix every violation of a pep8 report at once',
+                        default=False)
+    parser.add_argument('--max-iterations', dest='max_iterations',
+                        action='store',
+                        type=int,
+                        help='Maximum pep8 reports per file in '
+                             '--single-pass mode',
+                        default=MAX_ITERATIONS)
+    add_profile_arguments(parser)
+    return parser
 
 
 def clean_line(line):
@@ -24,131 +56,146 @@ def clean_line(line):
 
 BLANK = '\r\n'
 
-def fix_file(tmp_pyfile, pep8_line):
-    global BLANK
-
-    def open_fd():
-        return open(tmp_pyfile + '.new', 'w'), open(tmp_pyfile)
-
-    def start_fd(wfd, rfd, num_lines):
-        global BLANK
-        for i in range(num_lines):
-            line = rfd.readline()
-            m = re.search(r'([\n\r]+)$', line)
-            if m and i == 0 and m.group(1) != BLANK:
-                BLANK = m.group(1)  # reset
-            wfd.write(line)
-
-    def finish_fd(rfd, wfd):
-        while True:
-            line = rfd.readline()
-            wfd.write(line)
-            if not line:
-                break
-        rfd.close()
-        wfd.close()
-        call(['mv', tmp_pyfile + '.new', tmp_pyfile])
-
-    # ./fabfile.py:6:1: E302 expected 2 blank lines, found 1
-    m = re.search(r':(?P<row>\d+):(?P<col>\d+): E302 expected 2 blank lines'
-                  ', found (?P<actual_lines>\d+)', pep8_line)
+# ./fabfile.py:6:1: E302 expected 2 blank lines, found 1
+E302_REGEX = re.compile(r'expected 2 blank lines, found (?P<actual_lines>\d+)')
+
+
+def get_newline(lines):
+    """
+    Return the line ending used by the first line of a file.
+    """
+    m = lines and re.search(r'([\n\r]+)$', lines[0])
     if m:
-        row, col, actual_lines = map(lambda x: int(x),
-                                     m.group('row', 'col', 'actual_lines'))
-        wfd, rfd = open_fd()
-        start_fd(wfd, rfd, row - 1)
-        for _ in range(2 - actual_lines):
-            wfd.write(BLANK)
-        finish_fd(rfd, wfd)
-        return True
+        return m.group(1)
+    return BLANK
 
+
+def insert_blank_lines(lines, row, col, text, newline):
+    # :6:1: E302 expected 2 blank lines, found 1
+    m = E302_REGEX.match(text)
+    if not m:
+        return False
+    actual_lines = int(m.group('actual_lines'))
+    lines[row - 1:row - 1] = [newline] * (2 - actual_lines)
+    return True
+
+
+def delete_char(lines, row, col, text, newline):
     # :124:18: E201 whitespace after '['
-    # :413:30: E241 multiple spaces
-    # :310:103: E221 multiple spaces before operator
-    # :335:37: E222 multiple spaces after operator
-    # :1665:122: E251 unexpected spaces around keyword / parameter equals
-    # :E703 statement ends with a semicolon
-    m = re.search(r':(?P<row>\d+):(?P<col>\d+): E(201|202|203|241|221|222|251|703)',
-                  pep8_line)
-    if m:
-        row, col = map(lambda x: int(x), m.group('row', 'col'))
-        wfd, rfd = open_fd()
-        start_fd(wfd, rfd, row - 1)
-        spaced_line = rfd.readline()
-        for i, c in enumerate(spaced_line):
-            if i == col - 1:
-                continue
-            wfd.write(c)
-        finish_fd(rfd, wfd)
-        return True
+    line = lines[row - 1]
+    lines[row - 1] = line[:col - 1] + line[col:]
+    return True
+
 
+def remove_backslash(lines, row, col, text, newline):
     # :128:52: E502 the backslash is redundant between brackets
-    m = re.search(r':(?P<row>\d+):(?P<col>\d+): E502', pep8_line)
-    if m:
-        row, col = map(lambda x: int(x), m.group('row', 'col'))
-        wfd, rfd = open_fd()
-        start_fd(wfd, rfd, row - 1)
-        _line = rfd.readline()
-        _line = re.sub(r'\s*\\\s*$', BLANK, _line)
-        wfd.write(_line)
-        finish_fd(rfd, wfd)
-        return True
+    lines[row - 1] = re.sub(r'\s*\\\s*$', newline, lines[row - 1])
+    return True
 
+
+def delete_previous_line(lines, row, col, text, newline):
     # /tmp/./views.py:496:5: E303 too many blank lines (3)
-    m = re.search(r':(?P<row>\d+):(?P<col>\d+): E303 too many blank',
-                  pep8_line)
-    if m:
-        row, col = map(lambda x: int(x), m.group('row', 'col'))
-        wfd, rfd = open_fd()
-        start_fd(wfd, rfd, row - 2)
-        rfd.readline()  # skip
-        finish_fd(rfd, wfd)
-        return True
+    if not text.startswith('too many blank'):
+        return False
+    del lines[row - 2]
+    return True
+
 
+def insert_space_before(lines, row, col, text, newline):
     # :430:78: E226 missing whitespace around arithmetic operator
-    # :208:55: E231 missing whitespace after ','
-    # :474:52: E261 at least two spaces before inline comment
-    m = re.search(r':(?P<row>\d+):(?P<col>\d+): E(225|226|261)',
-                  pep8_line)
-    if m:
-        row, col = map(lambda x: int(x), m.group('row', 'col'))
-        wfd, rfd = open_fd()
-        start_fd(wfd, rfd, row - 1)
-        spaced_line = rfd.readline()
-        for i, c in enumerate(spaced_line):
-            if i == col - 1:
-                wfd.write(' ')
-            wfd.write(c)
-        finish_fd(rfd, wfd)
-        return True
+    line = lines[row - 1]
+    lines[row - 1] = line[:col - 1] + ' ' + line[col - 1:]
+    return True
+
 
+def insert_space_after(lines, row, col, text, newline):
     # :161:30: E231 missing whitespace after ','
-    m = re.search(r':(?P<row>\d+):(?P<col>\d+): E(231)',
-                  pep8_line)
-    if m:
-        row, col = map(lambda x: int(x), m.group('row', 'col'))
-        wfd, rfd = open_fd()
-        start_fd(wfd, rfd, row - 1)
-        spaced_line = rfd.readline()
-        for i, c in enumerate(spaced_line):
-            if i == col:
-                wfd.write(' ')
-            wfd.write(c)
-        finish_fd(rfd, wfd)
-        return True
+    line = lines[row - 1]
+    lines[row - 1] = line[:col] + ' ' + line[col:]
+    return True
 
+
+def fix_inline_comment(lines, row, col, text, newline):
     # :182:35: E262 inline comment should start with '# '
-    m = re.search(r':(?P<row>\d+):(?P<col>\d+): E262', pep8_line)
-    if m:
-        row, col = map(lambda x: int(x), m.group('row', 'col'))
-        wfd, rfd = open_fd()
-        start_fd(wfd, rfd, row - 1)
-        comment_line = rfd.readline()
-        comment_line = re.sub(r'  #+\s*(?P<comment>.*)', '  # \g<comment>',
-                              comment_line)
-        wfd.write(comment_line)
-        finish_fd(rfd, wfd)
-        return True
+    lines[row - 1] = re.sub(r'  #+\s*(?P<comment>.*)', '  # \g<comment>',
+                            lines[row - 1])
+    return True
+
+
+# pep8 code => function(lines, row, col, text, newline) that fixes the
+# violation in lines, and returns whether it did
+FIXERS = {
+    'E302': insert_blank_lines,
+    # E241 multiple spaces, E221/E222 multiple spaces around operator,
+    # E251 unexpected spaces around keyword / parameter equals,
+    # E703 statement ends with a semicolon
+    'E201': delete_char,
+    'E202': delete_char,
+    'E203': delete_char,
+    'E241': delete_char,
+    'E221': delete_char,
+    'E222': delete_char,
+    'E251': delete_char,
+    'E703': delete_char,
+    'E502': remove_backslash,
+    'E303': delete_previous_line,
+    # E261 at least two spaces before inline comment
+    'E225': insert_space_before,
+    'E226': insert_space_before,
+    'E261': insert_space_before,
+    'E231': insert_space_after,
+    'E262': fix_inline_comment,
+}
+
+
+def apply_fix(lines, row, col, code, text, newline):
+    """
+    Fix a single pep8 violation in lines. Return True if it was fixed.
+    """
+    fixer = FIXERS.get(code)
+    if not fixer or row > len(lines) or (code == 'E303' and row < 2):
+        return False
+    return fixer(lines, row, col, text, newline)
+
+
+def parse_pep8_line(pep8_line):
+    """
+    Return (row, col, code, text) of a pep8 output line, or None.
+    """
+    m = PEP8_MESSAGE_REGEX.match(pep8_line.rstrip('\r\n'))
+    if not m:
+        return None
+    row, col, code, text = m.group('row', 'col', 'code', 'text')
+    return int(row), int(col), code, text
+
+
+def read_lines(pyfile):
+    fd = open(pyfile)
+    lines = fd.readlines()
+    fd.close()
+    return lines
+
+
+def write_lines(pyfile, lines):
+    fd = open(pyfile + '.new', 'w')
+    fd.writelines(lines)
+    fd.close()
+    call(['mv', pyfile + '.new', pyfile])
+
+
+def fix_file(tmp_pyfile, pep8_line):
+    """
+    Fix the violation of one pep8 output line in tmp_pyfile. Return True
+    if the file was rewritten.
+    """
+    violation = parse_pep8_line(pep8_line)
+    if not violation:
+        return False
+    lines = read_lines(tmp_pyfile)
+    if not apply_fix(lines, *(violation + (get_newline(lines),))):
+        return False
+    write_lines(tmp_pyfile, lines)
+    return True
 
 
 def pep8_fix(pyfile):
@@ -174,18 +221,66 @@ def pep8_fix(pyfile):
     return fixed_file, tmp_pyfile
 
 
-def traverse(current_path, recursive=True):
-    for pyfile in glob.glob(current_path + '/*.py'):
-        fixed_file, fixed_filename = pep8_fix(pyfile)
-        if fixed_file:
-            call(['cp', fixed_filename, pyfile]) #+ '2'])
+def pep8_fix_all(pyfile, max_iterations=MAX_ITERATIONS):
+    """
+    Same as pep8_fix, but loads the file once and fixes every violation
+    of a pep8 report in memory, bottom-up so that the rows and columns of
+    the remaining violations stay valid. pep8 is re-run (at most
+    max_iterations times) only to pick up what the fixes uncovered.
+    """
+    tmp_pyfile = os.path.join('/tmp/', os.path.basename(pyfile))
+    call(['cp', pyfile, tmp_pyfile], shell=False)
+
+    lines = read_lines(tmp_pyfile)
+    newline = get_newline(lines)
+    fixed_file = False
+    for tries in range(1, max_iterations + 1):
+        violations = []
+        pep8_output = read_command('%s %s' % (PEP8_CMD, tmp_pyfile))
+        for _pep8_line in pep8_output.splitlines(True):
+            print _pep8_line,
+            violation = parse_pep8_line(_pep8_line)
+            if violation:
+                violations.append(violation)
+        fixes = 0
+        for row, col, code, text in sorted(violations, reverse=True):
+            if apply_fix(lines, row, col, code, text, newline):
+                fixes += 1
+        if not fixes:
+            break
+        fixed_file = True
+        write_lines(tmp_pyfile, lines)
+        print "Pass #%d fixed %d of %d violations" % (
+            tries, fixes, len(violations))
+
+    return fixed_file, tmp_pyfile
+
+
+def traverse(current_path, recursive=True, single_pass=False,
+             max_iterations=MAX_ITERATIONS):
+    for entry in iter_files(current_path, SKIP_REGEX, recursive,
+                            PYTHON_FILE_REGEX):
+        pyfile = entry.path
+        with span(pyfile, FILE):
+            if single_pass:
+                fixed_file, fixed_filename = pep8_fix_all(pyfile,
+                                                          max_iterations)
+            else:
+                fixed_file, fixed_filename = pep8_fix(pyfile)
+            if fixed_file:
+                call(['cp', fixed_filename, pyfile]) #+ '2'])
+
+
+def run():
+    import sys
+    parser = configure_argument_parser()
+    options = parser.parse_args(sys.argv[1:])
+
+    profiler_from_options(options)
+    traverse('./', recursive=True, single_pass=options.single_pass,
+             max_iterations=options.max_iterations)
+    report_from_options(options)
 
-    if recursive:
-        for dirname in [dirname for dirname in glob.glob(current_path + '/*')
-                        if os.path.isdir(dirname)]:
-            if 'migrations' in dirname:
-                continue
-            traverse(dirname, recursive)
 
 if __name__ == '__main__':
-    traverse('./', recursive=True)
+    run()
@@ -0,0 +1,569 @@
+#!/usr/bin/python2.7
+
+"""
+Copyright (C) 2012 KevinX Chang.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, Inc., 675 Mass Ave, Cambridge MA 02139,
+USA; either version 2 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+
+Pylint score and TODO trends over the history of a git repository.
+
+'history.py backfill' walks a range of commits, oldest first and along
+first parents, and stores in a SQLite database what check_pylint and
+check_todos would have reported at each of them. A commit is stored as
+the files it changed since the commit before it, and results are stored
+per blob: a blob is linted once, whatever the commits and the paths it
+appears at, and a file is blamed and scanned for TODOs once per (path,
+blob). A backfill thus costs about as much as the number of file changes
+in the range, rather than the number of commits times the number of
+files. Commits already in the database are skipped, so a backfill can be
+interrupted and resumed, or extended to newer commits later.
+
+Files are linted in a shadow work tree that 'git read-tree' moves from
+commit to commit (so imports resolve as they did at the commit); the work
+tree and the index are left alone.
+
+'history.py query' prints the trends from the database alone, without
+running git: the score and the lines of code of every author (or path) at
+every commit, or their number of TODOs.
+
+Usage:
+history.py backfill --since='2 years ago' --rcfile=pylint.rc
+history.py backfill --range=v1.0..master
+history.py query
+history.py query --authors kevinx --format=jsonl
+history.py query --tool=todos --by=path --path-depth=2
+"""
+import argparse
+from datetime import datetime
+import os
+import pipes
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+from command_runner import read_command
+from discovery import PYTHON_FILE_REGEX
+from linter_backends import (add_backend_arguments, get_pylint_backend,
+                             DEFAULT_BACKEND)
+from profiling import (add_profile_arguments, profiler_from_options,
+                       report_from_options, span)
+from records import add_format_arguments, writer_from_options
+from result_cache import hash_file
+
+BACKFILL = 'backfill'
+QUERY = 'query'
+COMMANDS = (BACKFILL, QUERY)
+
+PYLINT = 'pylint'
+TODOS = 'todos'
+TOOLS = (PYLINT, TODOS)
+
+AUTHOR = 'author'
+PATH = 'path'
+GROUPS = (AUTHOR, PATH)
+
+EVERYONE = '<everyone>'
+DEFAULT_DB = '.pynalysis-history.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS commits (
+    seq INTEGER PRIMARY KEY,
+    sha TEXT UNIQUE NOT NULL,
+    timestamp INTEGER NOT NULL);
+-- the files a commit added or changed, or removed (with a NULL blob)
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    blob_sha TEXT,
+    PRIMARY KEY (seq, path));
+CREATE TABLE IF NOT EXISTS scores (
+    blob_sha TEXT PRIMARY KEY,
+    score REAL);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT NOT NULL,
+    blob_sha TEXT NOT NULL,
+    PRIMARY KEY (path, blob_sha));
+-- the lines of code and the TODOs of each author of a file
+CREATE TABLE IF NOT EXISTS authors (
+    path TEXT NOT NULL,
+    blob_sha TEXT NOT NULL,
+    author TEXT NOT NULL,
+    lines INTEGER NOT NULL,
+    todos INTEGER NOT NULL,
+    PRIMARY KEY (path, blob_sha, author));
+"""
+
+
+def configure_argument_parser(parser=argparse.ArgumentParser()):
+    """
+    param {argparse.ArgumentParser} parser: a parser that we populate
+        specific options.
+    """
+    parser.add_argument('command', choices=COMMANDS,
+                        help='Store the results of a range of commits '
+                             '(backfill), or print their trends (query)')
+    parser.add_argument('--db', dest='db',
+                        action='store',
+                        help='SQLite database of the results',
+                        default=DEFAULT_DB)
+    parser.add_argument('--range', dest='revision_range',
+                        action='store',
+                        help='[backfill] Range of commits, as given to git '
+                             'log',
+                        default='HEAD')
+    parser.add_argument('--since', dest='since',
+                        action='store',
+                        help='[backfill] Only commits more recent than '
+                             'this date, such as "2 years ago"',
+                        default=None)
+    parser.add_argument('--skip', dest='skip',
+                        action='store',
+                        help='[backfill] Directories to skip, separated by '
+                             'commas',
+                        default=[])
+    parser.add_argument('--rcfile', dest='pylint_rcfile',
+                        action='store',
+                        type=str,
+                        help='[backfill] Pylint rcfile', default=None)
+    add_backend_arguments(parser)
+    parser.add_argument('--tool', dest='tool',
+                        action='store',
+                        choices=TOOLS,
+                        help='[query] Trend of the Pylint scores, or of the '
+                             'number of TODOs',
+                        default=PYLINT)
+    parser.add_argument('--by', dest='by',
+                        action='store',
+                        choices=GROUPS,
+                        help='[query] One trend per author, or per path',
+                        default=AUTHOR)
+    parser.add_argument('--path-depth', dest='path_depth',
+                        action='store',
+                        type=int,
+                        help='[query] Directory levels of the paths, 0 for '
+                             'all of them',
+                        default=1)
+    parser.add_argument('--authors', dest='authors',
+                        nargs='*',
+                        help='[query] Only count these authors')
+    add_format_arguments(parser)
+    add_profile_arguments(parser)
+    return parser
+
+
+def get_rollup_path(path, path_depth):
+    """
+    Return the directory of path that its results roll up to, path_depth
+    levels deep (0 for all of them); a top-level file is its own.
+    """
+    parts = path.split('/')
+    dirs = parts[:-1] or parts
+    if path_depth:
+        dirs = dirs[:path_depth]
+    return '/'.join(dirs)
+
+
+class HistoryStore(object):
+    """
+    The SQLite database of the results of a range of commits.
+    """
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(db_path)
+        self.conn.text_factory = str
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def check_setting(self, name, value):
+        """
+        Store a setting the results depend on, or raise RuntimeError if
+        the database was built with another value.
+        """
+        row = self.conn.execute('SELECT value FROM settings WHERE name = ?',
+                                (name,)).fetchone()
+        if row is None:
+            self.conn.execute('INSERT INTO settings VALUES (?, ?)',
+                              (name, value))
+        elif row[0] != value:
+            raise RuntimeError("The database was built with another %s "
+                               "setting, use another --db" % name)
+
+    def get_last_commit(self):
+        """
+        Return the (seq, sha, timestamp) of the last commit stored, or
+        None.
+        """
+        return self.conn.execute('SELECT seq, sha, timestamp FROM commits '
+                                 'ORDER BY seq DESC LIMIT 1').fetchone()
+
+    def has_commit(self, sha):
+        return self.conn.execute('SELECT 1 FROM commits WHERE sha = ?',
+                                 (sha,)).fetchone() is not None
+
+    def iter_commits(self):
+        """
+        Yield the (seq, sha, timestamp) of every commit, in order.
+        """
+        return self.conn.execute('SELECT seq, sha, timestamp FROM commits '
+                                 'ORDER BY seq').fetchall()
+
+    def get_changes(self, seq):
+        """
+        Return the [path, blob_sha] a commit changed; a removed file has
+        no blob.
+        """
+        return self.conn.execute('SELECT path, blob_sha FROM changes '
+                                 'WHERE seq = ? ORDER BY path',
+                                 (seq,)).fetchall()
+
+    def get_tree(self):
+        """
+        Return the path => blob_sha of the files of the last commit.
+        """
+        tree = {}
+        for path, blob_sha in self.conn.execute(
+                'SELECT path, blob_sha FROM changes ORDER BY seq'):
+            if blob_sha:
+                tree[path] = blob_sha
+            else:
+                tree.pop(path, None)
+        return tree
+
+    def add_commit(self, sha, timestamp, changes):
+        """
+        Store a commit and the files it changed (path => blob_sha, or None
+        if removed), along with the results added since the last commit.
+        """
+        seq = self.conn.execute('INSERT INTO commits (sha, timestamp) '
+                                'VALUES (?, ?)', (sha, timestamp)).lastrowid
+        self.conn.executemany('INSERT INTO changes VALUES (?, ?, ?)',
+                              [(seq, path, blob_sha) for path, blob_sha
+                               in changes.iteritems()])
+        self.conn.commit()
+
+    def has_score(self, blob_sha):
+        return self.conn.execute('SELECT 1 FROM scores WHERE blob_sha = ?',
+                                 (blob_sha,)).fetchone() is not None
+
+    def get_score(self, blob_sha):
+        """
+        Return the Pylint score of a blob, or None.
+        """
+        row = self.conn.execute('SELECT score FROM scores WHERE blob_sha = ?',
+                                (blob_sha,)).fetchone()
+        return row and row[0]
+
+    def add_score(self, blob_sha, score):
+        self.conn.execute('INSERT INTO scores VALUES (?, ?)',
+                          (blob_sha, score))
+
+    def has_file(self, path, blob_sha):
+        return self.conn.execute('SELECT 1 FROM files WHERE path = ? AND '
+                                 'blob_sha = ?',
+                                 (path, blob_sha)).fetchone() is not None
+
+    def get_authors(self, path, blob_sha):
+        """
+        Return the [author, lines, todos] of a file.
+        """
+        return self.conn.execute('SELECT author, lines, todos FROM authors '
+                                 'WHERE path = ? AND blob_sha = ?',
+                                 (path, blob_sha)).fetchall()
+
+    def add_file(self, path, blob_sha, author_counts):
+        """
+        param {dict} author_counts: author => [lines, todos] of the file.
+        """
+        self.conn.execute('INSERT INTO files VALUES (?, ?)',
+                          (path, blob_sha))
+        self.conn.executemany('INSERT INTO authors VALUES (?, ?, ?, ?, ?)',
+                              [(path, blob_sha, author, lines, todos)
+                               for author, (lines, todos)
+                               in author_counts.iteritems()])
+
+
+def list_commits(revision_range='HEAD', since=None):
+    """
+    Return the (sha, timestamp) of the commits of a range, oldest first.
+    """
+    cmd = 'git log --first-parent --reverse --format="%H %ct"'
+    if since:
+        cmd += ' --since=%s' % pipes.quote(since)
+    cmd += ' %s -- 2>/dev/null' % pipes.quote(revision_range)
+    commits = []
+    for line in read_command(cmd).splitlines():
+        sha, timestamp = line.split(' ')
+        commits.append((sha, int(timestamp)))
+    return commits
+
+
+class Backfill(object):
+    """
+    Stores the results of commits, one after the other, in a HistoryStore.
+    """
+    def __init__(self, store, skip_regex, pylint_rcfile=None,
+                 backend=DEFAULT_BACKEND):
+        # the checkers are only imported by the commands that need them
+        import check_todos
+        import vcs
+        if vcs.get_vcs() != 'git':
+            raise RuntimeError("Please run this in a git directory")
+        self.check_todos = check_todos
+        self.vcs = vcs
+        self.store = store
+        self.skip_regex = skip_regex
+        self.pylint_backend = get_pylint_backend(backend, pylint_rcfile)
+        store.check_setting('pylint', ' '.join([
+            self.pylint_backend.name, self.pylint_backend.version,
+            pylint_rcfile and hash_file(pylint_rcfile) or '']))
+        store.check_setting('skip', skip_regex.pattern)
+        self.prefix = read_command('git rev-parse --show-prefix').strip()
+        self.tree = store.get_tree()
+        self.shadow_dir = None
+
+    def __enter__(self):
+        self.shadow_dir = tempfile.mkdtemp(prefix='pynalysis-history-')
+        os.mkdir(os.path.join(self.shadow_dir, 'tree'))
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        shutil.rmtree(self.shadow_dir, ignore_errors=True)
+        return False
+
+    def _is_checked(self, path):
+        if self.skip_regex.search(path):
+            return False
+        name = path.rsplit('/', 1)[-1]
+        return bool(PYTHON_FILE_REGEX.search(name) or
+                    self.check_todos.TODO_FILE_REGEX.search(name))
+
+    def _list_tree(self, sha):
+        tree = {}
+        ls_tree_output = read_command('git ls-tree -r -z %s' % sha)
+        for entry in ls_tree_output.split('\0'):
+            if not entry:
+                continue
+            info, path = entry.split('\t', 1)
+            _mode, kind, blob_sha = info.split(' ')
+            if kind == 'blob' and self._is_checked(path):
+                tree[path] = blob_sha
+        return tree
+
+    def _shadow_path(self, path):
+        return os.path.join(self.shadow_dir, 'tree', self.prefix, path)
+
+    def _checkout(self, sha):
+        with span('read-tree'):
+            read_command('GIT_INDEX_FILE=%s git --work-tree=%s read-tree -u '
+                         '--reset %s' % (
+                             pipes.quote(os.path.join(self.shadow_dir,
+                                                      'index')),
+                             pipes.quote(os.path.join(self.shadow_dir,
+                                                      'tree')),
+                             sha))
+
+    def _analyse(self, sha, path, blob_sha):
+        """
+        Store the results of a file that a commit added or changed, unless
+        they already are.
+        """
+        shadow_path = self._shadow_path(path)
+        is_python = PYTHON_FILE_REGEX.search(path)
+        if is_python and not self.store.has_score(blob_sha):
+            with span('pylint'):
+                score = self.pylint_backend.check(shadow_path)
+            self.store.add_score(blob_sha, score)
+        if self.store.has_file(path, blob_sha):
+            return
+
+        line_to_todo = self.check_todos.scan_todos(shadow_path)
+        blame_lines = []
+        if is_python or line_to_todo:
+            with span('blame'):
+                blame_lines = self.vcs.run_blame(path, rev=sha)
+        author_counts = {}
+        for blame_line in blame_lines:
+            if blame_line and blame_line[2]:
+                author = self.vcs.get_author_alias(blame_line[0])
+                author_counts.setdefault(author, [0, 0])[0] += 1
+        self.check_todos.backfill_todos(line_to_todo,
+                                        dict(enumerate(blame_lines)))
+        for todo in line_to_todo.itervalues():
+            author_counts.setdefault(todo.get_author(), [0, 0])[1] += 1
+        self.store.add_file(path, blob_sha, author_counts)
+
+    def add_commit(self, sha, timestamp):
+        """
+        Store the results of a commit, whose parent is the last commit
+        stored.
+        """
+        tree = self._list_tree(sha)
+        changes = dict((path, blob_sha) for path, blob_sha in tree.iteritems()
+                       if self.tree.get(path) != blob_sha)
+        changes.update((path, None) for path in self.tree
+                       if path not in tree)
+        self._checkout(sha)
+        for path, blob_sha in sorted(changes.iteritems()):
+            if blob_sha:
+                self._analyse(sha, path, blob_sha)
+        self.store.add_commit(sha, timestamp, changes)
+        self.tree = tree
+        return changes
+
+
+def backfill(store, commits, skip_regex, pylint_rcfile=None,
+             backend=DEFAULT_BACKEND):
+    """
+    Store the results of the commits (see list_commits) that are not in
+    the store yet. Commits older than the last one stored are skipped:
+    the history only grows forward.
+    """
+    backfiller = Backfill(store, skip_regex, pylint_rcfile, backend)
+    last_commit = store.get_last_commit()
+    last_timestamp = last_commit and last_commit[2] or 0
+    new_commits = [(sha, timestamp) for sha, timestamp in commits
+                   if not store.has_commit(sha)]
+    skipped = [sha for sha, timestamp in new_commits
+               if timestamp < last_timestamp]
+    if skipped:
+        sys.stderr.write("Skipping %d commits older than the last one "
+                         "stored, use another --db for them\n" % len(skipped))
+        new_commits = [(sha, timestamp) for sha, timestamp in new_commits
+                       if timestamp >= last_timestamp]
+    with backfiller:
+        for count, (sha, timestamp) in enumerate(new_commits):
+            changes = backfiller.add_commit(sha, timestamp)
+            sys.stderr.write("[%d/%d] %s: %d files changed\n" % (
+                count + 1, len(new_commits), sha[:8], len(changes)))
+    return len(new_commits)
+
+
+class Trends(object):
+    """
+    Running totals of a query, moved from commit to commit by the files
+    each commit changed.
+    """
+    def __init__(self, store, tool=PYLINT, by=AUTHOR, path_depth=1,
+                 authors=None):
+        self.store = store
+        self.tool = tool
+        self.by = by
+        self.path_depth = path_depth
+        self.authors = authors
+        self.totals = {}  # author or path => [sum_score, lines, todos]
+
+    def _get_keys(self, path, author):
+        if self.by == PATH:
+            return [get_rollup_path(path, self.path_depth)]
+        return [author, EVERYONE]
+
+    def _add_file(self, path, blob_sha, sign):
+        score = self.store.get_score(blob_sha)
+        if self.tool == PYLINT and not score:
+            return  # not a Python file, or no score (as in check_pylint)
+        for author, lines, todos in self.store.get_authors(path, blob_sha):
+            if self.authors and author not in self.authors:
+                continue
+            for key in self._get_keys(path, author):
+                total = self.totals.setdefault(key, [0.0, 0, 0])
+                if score:
+                    total[0] += sign * score * lines
+                    total[1] += sign * lines
+                total[2] += sign * todos
+
+    def iter_commits(self):
+        """
+        Yield the sha, timestamp and totals of every commit.
+        """
+        tree = {}
+        for seq, sha, timestamp in self.store.iter_commits():
+            for path, blob_sha in self.store.get_changes(seq):
+                if path in tree:
+                    self._add_file(path, tree.pop(path), -1)
+                if blob_sha:
+                    tree[path] = blob_sha
+                    self._add_file(path, blob_sha, 1)
+            yield sha, timestamp, self.totals
+
+
+def query(store, tool=PYLINT, by=AUTHOR, path_depth=1, authors=None,
+          writer=None):
+    """
+    Print (or write as records) the trend of every author or path.
+    """
+    trends = Trends(store, tool, by, path_depth, authors)
+    for sha, timestamp, totals in trends.iter_commits():
+        date = datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d")
+        for key, (sum_score, lines, todos) in sorted(
+                totals.iteritems(), key=lambda item: item[0].lower()):
+            fields = {'commit': sha, 'timestamp': timestamp}
+            fields['author' if by == AUTHOR else 'path'] = key
+            if tool == PYLINT:
+                if lines <= 0:
+                    continue
+                score = sum_score / lines
+                if writer:
+                    writer.write(tool, fields.pop('path', None),
+                                 score=round(score, 2), lines=lines,
+                                 **fields)
+                else:
+                    print "%s %s %s scores %.2f with %d lines" % (
+                        date, sha[:8], key, score, lines)
+            elif todos > 0:
+                if writer:
+                    writer.write(tool, fields.pop('path', None), count=todos,
+                                 **fields)
+                else:
+                    print "%s %s %s has %d TODOs" % (date, sha[:8], key,
+                                                     todos)
+
+
+def run():
+    parser = configure_argument_parser()
+    options = parser.parse_args(sys.argv[1:])
+    profiler_from_options(options)
+
+    store = HistoryStore(options.db)
+    try:
+        if options.command == BACKFILL:
+            if len(options.skip) > 0:
+                skip_regex = re.compile("|".join(options.skip.split(',')))
+            else:
+                skip_regex = re.compile(r"(^.idea|^.git|^auto)")
+            commits = list_commits(options.revision_range, options.since)
+            backfill(store, commits, skip_regex, options.pylint_rcfile,
+                     options.backend)
+        else:
+            query(store, options.tool, options.by, options.path_depth,
+                  options.authors, writer_from_options(options))
+    except RuntimeError as e:
+        print "Error, %s" % e
+        sys.exit(1)
+    finally:
+        store.close()
+    report_from_options(options)
+
+
+if __name__ == '__main__':
+    run()
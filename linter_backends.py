@@ -0,0 +1,384 @@
+"""
+Copyright (C) 2012 KevinX Chang.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, Inc., 675 Mass Ave, Cambridge MA 02139,
+USA; either version 2 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+Linter backends used by the checkers.
+
+The 'subprocess' backend runs the pep8 and pylint commands once per file
+and scrapes their text output. The 'inprocess' backend drives pycodestyle
+(or pep8) and pylint through their Python APIs instead, keeping one
+configured checker per process, so interpreter startup and rcfile parsing
+are paid once per process rather than once per file. If the linter can't
+be imported, the subprocess backend is used. Both backends run the same
+pep8 checker (see get_pep8_tool), so they report the same messages.
+"""
+import json
+import os
+import re
+import site
+from contextlib import closing
+from distutils import sysconfig
+from distutils.spawn import find_executable
+
+from command_runner import iter_command_lines
+from result_cache import get_tool_version
+
+INPROCESS = 'inprocess'
+SUBPROCESS = 'subprocess'
+BACKENDS = (INPROCESS, SUBPROCESS)
+DEFAULT_BACKEND = INPROCESS
+
+PYLINT_SCORE_REGEX = re.compile(r'Your code has been rated at '
+                                '(\-?\d+(\.\d+)?)')
+# pkg/a.py:4:10: E231 missing whitespace after ','
+PEP8_MESSAGE_REGEX = re.compile(r'^.+?:(?P<row>\d+):(?P<col>\d+): '
+                                r'(?P<code>\S+) (?P<text>.*)$')
+
+# pep8 was renamed to pycodestyle; the first one installed is used
+PEP8_TOOLS = ('pycodestyle', 'pep8')
+
+_BACKENDS = {}
+
+# where pylint finds pylint_reporters
+REPORTERS_DIR = os.path.dirname(os.path.abspath(__file__))
+# messages that pylint reports on a run as a whole, rather than on the
+# module they are about, and that a run of a single file never has
+CROSS_MODULE_MESSAGES = ('duplicate-code', 'cyclic-import')
+# where the standard library and installed packages live; astroid's
+# modules of these are kept between checks
+LIBRARY_DIRS = tuple(set(
+    os.path.join(os.path.realpath(path), '')
+    for path in [sysconfig.get_python_lib(standard_lib=True),
+                 sysconfig.get_python_lib(),
+                 sysconfig.get_python_lib(plat_specific=True),
+                 getattr(site, 'USER_SITE', None)] if path))
+
+
+def add_backend_arguments(parser):
+    """
+    param {argparse.ArgumentParser} parser: a parser that we populate
+        with the linter backend options.
+    """
+    parser.add_argument('--backend', dest='backend',
+                        action='store',
+                        choices=BACKENDS,
+                        help='Run the linters in this process (inprocess) '
+                             'or as one command per file (subprocess)',
+                        default=DEFAULT_BACKEND)
+    return parser
+
+
+def normalize_score(score):
+    """
+    Pylint scores can be negative; clamp them the way the reports expect.
+    """
+    if score is not None and score < 0:
+        return -0.01
+    return score
+
+
+def get_pylint_batches(pyfiles, batch_size):
+    """
+    Split files into batches of at most batch_size files, in order, that
+    one pylint run can check. A run puts the import root of every file it
+    checks on sys.path, so an import in one file could resolve to a
+    module next to another file of the run; the files of a batch are all
+    in the same directory, which also keeps their module names apart.
+    """
+    batches = []
+    for pyfile in pyfiles:
+        if (not batches or len(batches[-1]) >= batch_size or
+                os.path.dirname(pyfile) != os.path.dirname(batches[-1][0])):
+            batches.append([])
+        batches[-1].append(pyfile)
+    return batches
+
+
+class SubprocessPep8(object):
+    """
+    Runs the pycodestyle (or pep8) command on each file.
+    """
+    def __init__(self, tool):
+        self.name = tool
+
+    @property
+    def version(self):
+        return get_tool_version(self.name)
+
+    def check(self, pyfile, lines=None):
+        """
+        Return the messages of a file as a list of [row, col, code, text].
+        The command reads the file itself, so lines is ignored.
+        """
+        messages = []
+        for line in iter_command_lines([self.name, '--format=default',
+                                        pyfile]):
+            matched = PEP8_MESSAGE_REGEX.match(line)
+            if matched:
+                row, col, code, text = matched.group(
+                    'row', 'col', 'code', 'text')
+                messages.append([int(row), int(col), code, text])
+        return messages
+
+
+class InProcessPep8(object):
+    """
+    Checks files with a long-lived pycodestyle (or pep8) StyleGuide.
+    """
+    def __init__(self, module):
+        self.name = module.__name__
+        self.version = module.__version__
+
+        class CollectingReport(module.BaseReport):
+            """
+            Keeps the messages of the last checked file.
+            """
+            def init_file(self, filename, lines, expected, line_offset):
+                self.file_messages = []
+                return super(CollectingReport, self).init_file(
+                    filename, lines, expected, line_offset)
+
+            def error(self, line_number, offset, text, check):
+                code = super(CollectingReport, self).error(
+                    line_number, offset, text, check)
+                if code:
+                    self.file_messages.append(
+                        [line_number, offset + 1, code, text[5:]])
+                return code
+
+        # paths makes it read the project configuration, like the command
+        self.style = module.StyleGuide(paths=['.'], reporter=CollectingReport)
+
+    def check(self, pyfile, lines=None):
+        """
+        Return the messages of a file as a list of [row, col, code, text].
+        """
+        self.style.input_file(pyfile, lines=lines)
+        return sorted(self.style.options.report.file_messages)
+
+
+class SubprocessPylint(object):
+    """
+    Runs the pylint command on each file. Files can be checked from any
+    number of threads.
+    """
+    name = 'pylint'
+    thread_safe = True
+
+    def __init__(self, rcfile):
+        self.rcfile = rcfile
+
+    @property
+    def version(self):
+        return get_tool_version(self.name)
+
+    def check(self, pyfile, timeout=None):
+        """
+        Return the Pylint score of a file, or None.
+
+        param {float} timeout: [optional] see command_runner.read_command.
+        """
+        score = None
+        # the score is the last thing pylint works out; the reports that
+        # may follow it are not read
+        with closing(iter_command_lines(self._get_args([pyfile]),
+                                        timeout)) as pylint_lines:
+            for line in pylint_lines:
+                matched = PYLINT_SCORE_REGEX.match(line)
+                if matched:
+                    score = float(matched.group(1))
+                    break
+        return normalize_score(score)
+
+    def check_batch(self, pyfiles, timeout=None):
+        """
+        Return the Pylint score of each file of a batch (see
+        get_pylint_batches), checked by a single pylint run per directory.
+
+        param {float} timeout: [optional] see command_runner.read_command.
+        """
+        scores = []
+        for batch in get_pylint_batches(pyfiles, len(pyfiles)):
+            scores.extend(self._check_batch(batch, timeout))
+        return scores
+
+    def _get_args(self, pyfiles, options=()):
+        args = ['pylint'] + list(options) + list(pyfiles)
+        if self.rcfile:
+            args.insert(1, '--rcfile=%s' % self.rcfile)
+        return args
+
+    def _check_batch(self, pyfiles, timeout):
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [
+            REPORTERS_DIR, env.get('PYTHONPATH')]))
+        args = self._get_args(pyfiles, [
+            '--disable=%s' % ','.join(CROSS_MODULE_MESSAGES),
+            '--output-format=pylint_reporters.JsonModuleScoreReporter'])
+        scores = {}
+        for line in iter_command_lines(args, timeout, env=env):
+            if line.startswith('{'):
+                module_score = json.loads(line)
+                scores[os.path.abspath(module_score['path'])] = (
+                    module_score['score'])
+        return [normalize_score(scores.get(os.path.abspath(pyfile)))
+                for pyfile in pyfiles]
+
+
+class InProcessPylint(object):
+    """
+    Checks files with a long-lived PyLinter, configured from the rcfile
+    on the first check. Only one thread may check files at a time.
+    """
+    name = 'pylint-api'
+    thread_safe = False
+
+    def __init__(self, rcfile):
+        from pylint import lint
+        from pylint.__pkginfo__ import version
+        from pylint_reporters import ModuleScoreReporter
+
+        self.lint = lint
+        self.reporter_class = ModuleScoreReporter
+        self.version = version
+        self.rcfile = rcfile
+        self.linter = None
+
+    def _get_score(self):
+        stats = self.linter.stats
+        if not stats.get('statement'):
+            return None
+        try:
+            score = eval(self.linter.config.evaluation, {}, stats)
+        except Exception:
+            return None
+        # same precision as the 'Your code has been rated at' line
+        return normalize_score(round(score, 2))
+
+    def check(self, pyfile, timeout=None):
+        """
+        Return the Pylint score of a file, or None. A check in this
+        process can't be interrupted, so timeout is ignored.
+        """
+        try:
+            self._check([pyfile])
+            return self._get_score()
+        finally:
+            self._forget_project_modules()
+
+    def check_batch(self, pyfiles, timeout=None):
+        """
+        Return the Pylint score of each file of a batch (see
+        get_pylint_batches), checked together per directory. timeout is
+        ignored.
+        """
+        scores = []
+        for batch in get_pylint_batches(pyfiles, len(pyfiles)):
+            scores.extend(self._check_batch(batch))
+        return scores
+
+    def _check_batch(self, pyfiles):
+        try:
+            self._check(pyfiles)
+            scores = dict((os.path.abspath(path), score) for path, score in
+                          self.linter.reporter.get_scores().iteritems())
+        finally:
+            self._forget_project_modules()
+        return [normalize_score(scores.get(os.path.abspath(pyfile)))
+                for pyfile in pyfiles]
+
+    def _check(self, pyfiles):
+        if self.linter is None:
+            args = ['--reports=n', '--persistent=n',
+                    '--disable=%s' % ','.join(CROSS_MODULE_MESSAGES)]
+            if self.rcfile:
+                args.insert(0, '--rcfile=%s' % self.rcfile)
+            self.linter = self.lint.Run(args + list(pyfiles),
+                                        reporter=self.reporter_class(),
+                                        exit=False).linter
+        else:
+            self.linter.reporter.reset()
+            with self.lint.fix_import_path(pyfiles):
+                self.linter.check(pyfiles)
+
+    def _forget_project_modules(self):
+        """
+        Drop the parsed modules of everything but the standard library and
+        installed packages. astroid caches modules by name, so a module of
+        one directory would otherwise stand in for a module of the same
+        name in another directory, and scores would depend on the order
+        files are checked in. Where module names were found goes too, as
+        it is cached by name alone. As this runs after every check, files
+        changed between checks are always read again.
+        """
+        from astroid import MANAGER
+        MANAGER._mod_file_cache.clear()
+        for modname, module in MANAGER.astroid_cache.items():
+            module_file = getattr(module, 'file', None)
+            if module_file and not os.path.realpath(module_file).startswith(
+                    LIBRARY_DIRS):
+                del MANAGER.astroid_cache[modname]
+
+
+def get_pep8_tool():
+    """
+    Return the pep8 checker that both backends run: the first of
+    PEP8_TOOLS that can be imported, else the first that is a command.
+    Its name and version are part of the keys of cached results.
+    """
+    for tool in PEP8_TOOLS:
+        try:
+            __import__(tool)
+            return tool
+        except ImportError:
+            pass
+    for tool in PEP8_TOOLS:
+        if find_executable(tool):
+            return tool
+    return PEP8_TOOLS[-1]
+
+
+def get_pep8_backend(backend=DEFAULT_BACKEND):
+    """
+    Return the pep8 backend of this process.
+    """
+    key = ('pep8', backend)
+    if key not in _BACKENDS:
+        tool = get_pep8_tool()
+        _BACKENDS[key] = SubprocessPep8(tool)
+        if backend == INPROCESS:
+            try:
+                _BACKENDS[key] = InProcessPep8(__import__(tool))
+            except ImportError:
+                pass
+    return _BACKENDS[key]
+
+
+def get_pylint_backend(backend=DEFAULT_BACKEND, rcfile=None):
+    """
+    Return the pylint backend of this process for the given rcfile.
+    """
+    key = ('pylint', backend, rcfile)
+    if key not in _BACKENDS:
+        _BACKENDS[key] = SubprocessPylint(rcfile)
+        if backend == INPROCESS:
+            try:
+                _BACKENDS[key] = InProcessPylint(rcfile)
+            except ImportError:
+                pass
+    return _BACKENDS[key]
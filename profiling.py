@@ -0,0 +1,255 @@
+"""
+Copyright (C) 2012 KevinX Chang.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, Inc., 675 Mass Ave, Cambridge MA 02139,
+USA; either version 2 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+
+Timed spans for --profile and --trace.
+
+Code that is worth timing wraps itself in a span:
+
+    with span('blame'):
+        ...
+
+Spans are recorded only once profiling was enabled; otherwise span()
+returns a shared do-nothing context manager, which costs a function call.
+Each span has a category: PHASE for a step of a checker, FILE for all the
+work on one file (named after the file) and SUBPROCESS for a command
+(named after the program, with the command line and the size of its
+output).
+
+--trace FILE saves the spans in the Chrome trace-event format (open it
+with chrome://tracing or https://ui.perfetto.dev). --profile prints the
+time per phase and the slowest files to stderr. Worker processes send
+their spans back with collect_spans().
+"""
+import json
+import os
+import sys
+import threading
+import time
+
+PHASE = 'phase'
+FILE = 'file'
+SUBPROCESS = 'subprocess'
+
+DEFAULT_TOP_FILES = 10
+
+_TRACER = None
+
+
+def add_profile_arguments(parser):
+    """
+    param {argparse.ArgumentParser} parser: a parser that we populate
+        with the profiling options.
+    """
+    parser.add_argument('--profile', dest='profile',
+                        action='store_true',
+                        help='Print the time per phase and the slowest '
+                             'files to stderr',
+                        default=False)
+    parser.add_argument('--profile-top', dest='profile_top',
+                        action='store',
+                        type=int,
+                        help='Number of slowest files --profile prints',
+                        default=DEFAULT_TOP_FILES)
+    parser.add_argument('--trace', dest='trace',
+                        action='store',
+                        help='[optional] Save the timed spans to this file, '
+                             'as Chrome trace events',
+                        default=None)
+    return parser
+
+
+def profiler_from_options(options):
+    """
+    Enable profiling if add_profile_arguments asked for it. Returns the
+    Tracer, or None.
+    """
+    if options.profile or options.trace:
+        return enable()
+    return None
+
+
+def report_from_options(options, stream=None):
+    """
+    Save and print what add_profile_arguments asked for.
+    """
+    if _TRACER is None:
+        return
+    if options.trace:
+        _TRACER.save_trace(options.trace)
+    if options.profile:
+        _TRACER.print_summary(options.profile_top, stream or sys.stderr)
+
+
+def enable():
+    """
+    Start recording spans, and return the Tracer they are recorded in.
+    """
+    global _TRACER
+    if _TRACER is None:
+        _TRACER = Tracer()
+    return _TRACER
+
+
+def disable():
+    global _TRACER
+    _TRACER = None
+
+
+def is_enabled():
+    return _TRACER is not None
+
+
+class _NullSpan(object):
+    """
+    What span() returns when profiling is disabled.
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span(object):
+    """
+    A timed span, recorded in its Tracer when it ends.
+    """
+    __slots__ = ('tracer', 'name', 'cat', 'args', 'start')
+
+    def __init__(self, tracer, name, cat, args):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.tracer.add_span(self.name, self.cat, self.start, time.time(),
+                             self.args)
+        return False
+
+    def set(self, **args):
+        """
+        Add arguments to the span, such as the size of an output.
+        """
+        self.args.update(args)
+
+
+def span(name, cat=PHASE, **args):
+    """
+    Return a context manager that times what it wraps as a span.
+    """
+    if _TRACER is None:
+        return _NULL_SPAN
+    return Span(_TRACER, name, cat, args)
+
+
+def collect_spans(func, *args, **kwargs):
+    """
+    Call func in a worker process; returns (result, spans), where spans
+    are the ones func recorded, to be passed to add_spans() in the parent.
+    spans is None when profiling is disabled.
+    """
+    if _TRACER is None:
+        return func(*args, **kwargs), None
+    start = len(_TRACER.events)
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        events = _TRACER.events[start:]
+        del _TRACER.events[start:]
+    return result, events
+
+
+def add_spans(events):
+    """
+    Merge the spans returned by collect_spans().
+    """
+    if _TRACER is not None and events:
+        _TRACER.events.extend(events)
+
+
+class Tracer(object):
+    """
+    The spans of a run, as Chrome 'complete' trace events.
+    """
+    def __init__(self):
+        self.events = []
+
+    def add_span(self, name, cat, start, end, args):
+        event = {'name': name, 'cat': cat, 'ph': 'X',
+                 'ts': int(start * 1000000),
+                 'dur': int((end - start) * 1000000),
+                 'pid': os.getpid(),
+                 'tid': threading.current_thread().ident}
+        if args:
+            event['args'] = args
+        self.events.append(event)
+
+    def save_trace(self, trace_file):
+        fd = open(trace_file, 'w')
+        try:
+            json.dump({'traceEvents': self.events,
+                       'displayTimeUnit': 'ms'}, fd)
+        finally:
+            fd.close()
+
+    def get_totals(self):
+        """
+        Return (cat, name) => [seconds, count] over all of the spans but
+        the FILE ones.
+        """
+        totals = {}
+        for event in self.events:
+            if event['cat'] == FILE:
+                continue
+            total = totals.setdefault((event['cat'], event['name']), [0, 0])
+            total[0] += event['dur'] / 1000000.0
+            total[1] += 1
+        return totals
+
+    def get_slowest_files(self, top=DEFAULT_TOP_FILES):
+        """
+        Return the top slowest FILE spans as (seconds, name) tuples.
+        """
+        files = [(event['dur'] / 1000000.0, event['name'])
+                 for event in self.events if event['cat'] == FILE]
+        return sorted(files, reverse=True)[:top]
+
+    def print_summary(self, top=DEFAULT_TOP_FILES, stream=sys.stderr):
+        stream.write("Time per phase:\n")
+        for (cat, name), (seconds, count) in sorted(
+                self.get_totals().iteritems(),
+                key=lambda item: item[1][0], reverse=True):
+            stream.write("  %9.3fs %6d x %s %s\n" % (seconds, count, cat,
+                                                     name))
+        stream.write("Slowest files:\n")
+        for seconds, name in self.get_slowest_files(top):
+            stream.write("  %9.3fs %s\n" % (seconds, name))
@@ -0,0 +1,110 @@
+"""
+Copyright (C) 2012 KevinX Chang.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, Inc., 675 Mass Ave, Cambridge MA 02139,
+USA; either version 2 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+
+
+Pylint reporters that score every module of a run on its own.
+
+Pylint rates all the files of a run together. These reporters work out
+the score of each module instead, from the messages pylint counted for
+it and the statements of its syntax tree, so that one pylint run can
+check a batch of files (see linter_backends.get_pylint_batches). The
+in-process backend reads the scores off ModuleScoreReporter; the
+subprocess backend runs
+
+    pylint --output-format=pylint_reporters.JsonModuleScoreReporter ...
+
+which prints a JSON line {"path": ..., "score": ...} per module.
+
+This module imports pylint, so only pylint runs and the in-process
+backend import it.
+"""
+import json
+
+from astroid import MANAGER
+from pylint.reporters import CollectingReporter
+
+
+def count_statements(node):
+    """
+    Count the statements of a syntax tree, the way pylint's walker does.
+    """
+    count = 0
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node.is_statement:
+            count += 1
+        stack.extend(node.get_children())
+    return count
+
+
+class ModuleScoreReporter(CollectingReporter):
+    """
+    Collects messages, displays nothing, and works out the score of every
+    module checked since the last reset().
+    """
+    def __init__(self):
+        CollectingReporter.__init__(self)
+        self.module_paths = []  # [modname, path] in checking order
+
+    def reset(self):
+        self.messages = []
+        self.module_paths = []
+
+    def on_set_current_module(self, module, filepath):
+        if filepath is not None:
+            self.module_paths.append((module, filepath))
+
+    def _display(self, layout):
+        pass
+
+    def get_scores(self):
+        """
+        Return the path => score of the modules checked, rounded as in the
+        'Your code has been rated at' line; None if it has no statements.
+        """
+        stats = self.linter.stats
+        scores = {}
+        for modname, path in self.module_paths:
+            module_stats = dict(stats['by_module'].get(modname, {}))
+            try:
+                module = MANAGER.ast_from_file(path, modname, source=True)
+            except Exception:
+                module = None
+            module_stats['statement'] = module and count_statements(module)
+            if not module_stats['statement']:
+                scores[path] = None
+                continue
+            try:
+                score = eval(self.linter.config.evaluation, {}, module_stats)
+            except Exception:
+                scores[path] = None
+                continue
+            scores[path] = round(score, 2)
+        return scores
+
+
+class JsonModuleScoreReporter(ModuleScoreReporter):
+    """
+    Prints the score of every module as a JSON line, once pylint is done.
+    """
+    def on_close(self, stats, previous_stats):
+        for path, score in sorted(self.get_scores().iteritems()):
+            self.writeln(json.dumps({'path': path, 'score': score}))
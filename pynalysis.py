@@ -0,0 +1,80 @@
+#!/usr/bin/python2.7
+
+"""
+Copyright (C) 2012 KevinX Chang.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, Inc., 675 Mass Ave, Cambridge MA 02139,
+USA; either version 2 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+Single entry point of the checkers and tools: 'pynalysis.py COMMAND'
+runs COMMAND with the options that follow it, as its own script would.
+
+Only the module of the command is imported, and none of them detects the
+VCS until it needs it, so 'pynalysis.py COMMAND --help' (and a mistyped
+option) answers without querying the repository.
+
+Usage:
+pynalysis.py pylint --recursive --skip=^auto
+pynalysis.py todos --authors=kevinx
+pynalysis.py pep8 --help
+"""
+import argparse
+import os
+import sys
+
+# command => (module, help)
+COMMANDS = (
+    ('pylint', ('check_pylint', 'Pylint scores by file, path and author')),
+    ('pep8', ('check_pep8', 'PEP8 violations by file and author')),
+    ('todos', ('check_todos', 'TODOs and FIXMEs by author')),
+    ('misc', ('check_misc', 'Basic styling checks')),
+    ('fix', ('fix_python_code', 'Fix the PEP8 violations that can be')),
+    ('daemon', ('daemon', 'Keep the pylint and todos reports warm')),
+    ('history', ('history', 'Score and TODO trends over the history')),
+    ('shards', ('shards', 'Merge the partial reports of shards')),
+    ('benchmark', ('benchmark', 'Benchmark the checkers')),
+)
+
+
+def configure_argument_parser(parser=argparse.ArgumentParser()):
+    """
+    param {argparse.ArgumentParser} parser: a parser that we populate
+        specific options.
+    """
+    parser.add_argument('command', choices=[name for name, _ in COMMANDS],
+                        help='; '.join('%s: %s' % (name, command_help)
+                                       for name, (_, command_help)
+                                       in COMMANDS))
+    parser.add_argument('args', nargs=argparse.REMAINDER,
+                        help='Options of the command, see: '
+                             'pynalysis.py COMMAND --help')
+    return parser
+
+
+def run():
+    parser = configure_argument_parser()
+    options = parser.parse_args(sys.argv[1:])
+    module_name = dict(COMMANDS)[options.command][0]
+
+    # before the import, since the parsers of the commands are built then
+    sys.argv = ['%s %s' % (os.path.basename(sys.argv[0]),
+                           options.command)] + options.args
+    module = __import__(module_name)
+    module.run()
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,107 @@
+"""
+Copyright (C) 2012 KevinX Chang.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, Inc., 675 Mass Ave, Cambridge MA 02139,
+USA; either version 2 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+
+Structured output shared by the checkers.
+
+With '--format jsonl' a checker writes one JSON object per line for every
+finding or score, as soon as it has it, instead of its text report. Every
+record has the same fields, so the output of all the checkers can be
+loaded the same way:
+
+  tool       the checker: 'pylint', 'pep8', 'misc' or 'todos'
+  path       the file, relative to where the checker ran
+  line       1-based line number of the finding, or null
+  column     1-based column of the finding, or null
+  author     author the finding or the score is attributed to, or null
+  code       kind of finding (such as the pep8 code), or null for scores
+  message    human-readable description, or null
+  score      Pylint score of the file, or null
+  lines      number of lines the score stands for, or null
+  count      number of findings the record stands for (history.py), or
+             null
+  commit     the commit the record describes (history.py), or null
+  timestamp  epoch seconds of the commit that last changed the line, if
+             it was blamed (or of the commit above), or null
+"""
+import json
+import os
+import sys
+
+TEXT = 'text'
+JSONL = 'jsonl'
+FORMATS = (TEXT, JSONL)
+
+FIELDS = ('tool', 'path', 'line', 'column', 'author', 'code', 'message',
+          'score', 'lines', 'count', 'commit', 'timestamp')
+
+
+def add_format_arguments(parser):
+    """
+    param {argparse.ArgumentParser} parser: a parser that we populate
+        with the output format options.
+    """
+    parser.add_argument('--format', dest='format',
+                        action='store',
+                        choices=FORMATS,
+                        help='Print a text report, or one JSON record per '
+                             'finding (jsonl)',
+                        default=TEXT)
+    return parser
+
+
+def writer_from_options(options):
+    """
+    Return the RecordWriter configured by add_format_arguments, or None
+    for the text report.
+    """
+    if options.format == JSONL:
+        return RecordWriter()
+    return None
+
+
+def make_record(tool, path, **fields):
+    """
+    Return a record with every field of FIELDS; the ones not given are
+    None.
+    """
+    unknown = set(fields).difference(FIELDS)
+    if unknown:
+        raise ValueError("Unknown record fields: %s" %
+                         ', '.join(sorted(unknown)))
+    record = dict.fromkeys(FIELDS)
+    record.update(fields)
+    record['tool'] = tool
+    record['path'] = path and os.path.normpath(path)
+    return record
+
+
+class RecordWriter(object):
+    """
+    Writes records as JSON lines. Every record is flushed right away, so
+    that a consumer reading from a pipe sees it as soon as it's found.
+    """
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def write(self, tool, path, **fields):
+        self.stream.write(json.dumps(make_record(tool, path, **fields),
+                                     sort_keys=True))
+        self.stream.write("\n")
+        self.stream.flush()
@@ -0,0 +1,213 @@
+"""
+Copyright (C) 2012 KevinX Chang.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, Inc., 675 Mass Ave, Cambridge MA 02139,
+USA; either version 2 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+Content-addressed, on-disk cache of linter results.
+
+An entry is keyed by the tool name, the tool version, the contents of its
+configuration files and the contents of the file being checked, so an
+entry never goes stale: a changed file simply gets a new key. Entries are
+written atomically (write to a temporary file, then rename), which makes
+the cache safe to share between concurrent runs. prune() evicts the least
+recently used entries once the cache grows over its size limit.
+"""
+import errno
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+
+from command_runner import read_command
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache',
+                                 'pynalysis')
+DEFAULT_CACHE_SIZE = 256  # MB
+
+_TOOL_VERSIONS = {}
+
+
+def add_cache_arguments(parser):
+    """
+    param {argparse.ArgumentParser} parser: a parser that we populate
+        with the result cache options.
+    """
+    parser.add_argument('--no-cache', dest='use_cache',
+                        action='store_false',
+                        help='Do not read or write the result cache',
+                        default=True)
+    parser.add_argument('--cache-dir', dest='cache_dir',
+                        action='store',
+                        help='Directory of the result cache',
+                        default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--cache-size', dest='cache_size',
+                        action='store',
+                        type=int,
+                        help='Size limit of the result cache, in MB',
+                        default=DEFAULT_CACHE_SIZE)
+    return parser
+
+
+def cache_from_options(options):
+    """
+    Return the ResultCache configured by add_cache_arguments, or None.
+    """
+    if not options.use_cache:
+        return None
+    return ResultCache(options.cache_dir, options.cache_size)
+
+
+def get_tool_version(tool):
+    """
+    Return the '--version' output of a tool, memoized per process.
+    """
+    if tool not in _TOOL_VERSIONS:
+        _TOOL_VERSIONS[tool] = read_command(
+            '%s --version 2>/dev/null' % tool).strip()
+    return _TOOL_VERSIONS[tool]
+
+
+def hash_file(file_path):
+    """
+    Return the SHA-1 of a file's contents, or '' if it can't be read.
+    """
+    digest = hashlib.sha1()
+    try:
+        fd = open(file_path, 'rb')
+    except IOError:
+        return ''
+    while True:
+        chunk = fd.read(1 << 16)
+        if not chunk:
+            break
+        digest.update(chunk)
+    fd.close()
+    return digest.hexdigest()
+
+
+class ResultCache(object):
+    """
+    Mapping of keys to JSON-serializable dicts, stored one file per entry.
+    """
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR,
+                 cache_size=DEFAULT_CACHE_SIZE):
+        self.cache_dir = cache_dir
+        self.max_bytes = cache_size * 1024 * 1024
+
+    def make_key(self, tool, file_path, config_files=(), extra=(),
+                 version=None, contents=None):
+        """
+        Build the key for the result of running tool on file_path.
+
+        param {str} version: [optional] version of the tool, defaults to
+            the output of 'tool --version'.
+        param {list} config_files: files (such as the rcfile) whose
+            contents affect the result.
+        param {list} extra: other strings that affect the result.
+        param {str} contents: [optional] the contents of file_path, if the
+            caller already read them.
+        """
+        if contents is None:
+            file_hash = hash_file(file_path)
+        else:
+            file_hash = hashlib.sha1(contents).hexdigest()
+        parts = [tool, version or get_tool_version(tool), file_hash]
+        for config_file in config_files:
+            parts.append(config_file and hash_file(config_file) or '')
+        parts.extend(extra)
+        return hashlib.sha1("\0".join(parts)).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + '.json')
+
+    def get(self, key):
+        """
+        Return the dict stored under key, or None on a cache miss.
+        """
+        entry_path = self._entry_path(key)
+        try:
+            fd = open(entry_path)
+            try:
+                value = json.load(fd)
+            finally:
+                fd.close()
+            os.utime(entry_path, None)  # mark as recently used
+        except (IOError, OSError, ValueError):
+            return None
+        return value
+
+    def put(self, key, value):
+        """
+        Store a dict under key. Concurrent writers of the same key are
+        harmless, since they store the same value.
+        """
+        entry_path = self._entry_path(key)
+        entry_dir = os.path.dirname(entry_path)
+        try:
+            os.makedirs(entry_dir)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        fd, tmp_path = tempfile.mkstemp(dir=entry_dir, suffix='.tmp')
+        try:
+            try:
+                os.write(fd, json.dumps(value))
+            finally:
+                os.close(fd)
+            os.rename(tmp_path, entry_path)
+        except (IOError, OSError):
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def prune(self):
+        """
+        Evict the least recently used entries until the cache fits in its
+        size limit. Only one process prunes at a time; the others skip it.
+        """
+        if not os.path.isdir(self.cache_dir):
+            return
+        lock_fd = open(os.path.join(self.cache_dir, '.lock'), 'w')
+        try:
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except IOError:
+                return
+            entries = []
+            total_bytes = 0
+            for root, _dirs, files in os.walk(self.cache_dir):
+                for filename in files:
+                    if not filename.endswith('.json'):
+                        continue
+                    entry_path = os.path.join(root, filename)
+                    try:
+                        stat = os.stat(entry_path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, entry_path, stat.st_size))
+                    total_bytes += stat.st_size
+            entries.sort()
+            for _mtime, entry_path, size in entries:
+                if total_bytes <= self.max_bytes:
+                    break
+                try:
+                    os.unlink(entry_path)
+                except OSError:
+                    pass
+                total_bytes -= size
+        finally:
+            lock_fd.close()
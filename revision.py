@@ -0,0 +1,156 @@
+"""
+Copyright (C) 2012 KevinX Chang.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, Inc., 675 Mass Ave, Cambridge MA 02139,
+USA; either version 2 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+
+
+Reads the files of any git revision straight from the object store.
+
+--rev REV makes a checker analyse the files of REV rather than the work
+tree, without checking REV out: the files are listed once with
+'git ls-tree', and their contents are read through the long-lived
+'git cat-file --batch' processes of vcs.read_blob, rather than a git
+process per file.
+
+Pylint has to import the files it checks, so checkout() writes the Python
+files of the revision to a temporary directory (read the same way); the
+other checkers read the contents directly.
+"""
+import os
+import shutil
+import tempfile
+
+from command_runner import read_command
+from profiling import span
+from vcs import close_cat_files, read_blob
+
+REGULAR_FILE_MODES = ('100644', '100755')
+
+
+def add_revision_arguments(parser):
+    """
+    param {argparse.ArgumentParser} parser: a parser that we populate
+        with the option that selects a revision to analyse.
+    """
+    parser.add_argument('--rev', dest='rev',
+                        action='store',
+                        metavar='REV',
+                        help='[optional] Analyse the files of this git '
+                             'revision rather than the work tree',
+                        default=None)
+    return parser
+
+
+def revision_from_options(options):
+    """
+    Return the Revision selected by add_revision_arguments, or None to
+    analyse the work tree.
+    """
+    if not options.rev:
+        return None
+    return Revision(options.rev)
+
+
+class Revision(object):
+    """
+    The files of a git revision. Paths are relative to the current
+    directory, like those of the work tree; only the files under it are
+    listed.
+    """
+    def __init__(self, rev):
+        self.rev = rev
+        self.sha = read_command('git rev-parse --verify --quiet %s^{commit} '
+                                '2>/dev/null' % rev).strip()
+        if not self.sha:
+            raise RuntimeError("Unknown git revision: %s" % rev)
+        self.blobs = None  # path => (blob sha, size)
+        self.root = None
+
+    def get_paths(self):
+        """
+        Return the paths of the files of the revision.
+        """
+        if self.blobs is None:
+            self.blobs = self._read_blobs()
+        return self.blobs.keys()
+
+    def _read_blobs(self):
+        blobs = {}
+        # <mode> SP <type> SP <sha> SP+ <size> TAB <path> NUL
+        with span('ls-tree'):
+            ls_tree_output = read_command('git ls-tree -r -l -z %s '
+                                          '2>/dev/null' % self.sha)
+        for entry in ls_tree_output.split("\0"):
+            info, _, path = entry.partition("\t")
+            info = info.split()
+            if len(info) == 4 and info[0] in REGULAR_FILE_MODES:
+                blobs[path] = (info[2], int(info[3]))
+        return blobs
+
+    def get_size(self, path):
+        """
+        Return the size of a file of the revision.
+        """
+        self.get_paths()
+        return self.blobs[path][1]
+
+    def read(self, path):
+        """
+        Return the contents of a file of the revision.
+        """
+        self.get_paths()
+        return read_blob(self.blobs[path][0])
+
+    def checkout(self, name_regex):
+        """
+        Write the files of the revision whose name matches name_regex to
+        a temporary directory, and return it. The directory mirrors the
+        current directory; close() removes it.
+        """
+        if self.root is None:
+            self.root = tempfile.mkdtemp(prefix='pynalysis-')
+        for path in sorted(self.get_paths()):
+            if not name_regex.search(os.path.basename(path)):
+                continue
+            file_path = self.get_path(path)
+            if os.path.exists(file_path):
+                continue
+            file_dir = os.path.dirname(file_path)
+            if not os.path.isdir(file_dir):
+                os.makedirs(file_dir)
+            fd = open(file_path, 'wb')
+            try:
+                fd.write(self.read(path))
+            finally:
+                fd.close()
+        return self.root
+
+    def get_path(self, path):
+        """
+        Return where checkout() wrote a file of the revision.
+        """
+        return os.path.join(self.root, path)
+
+    def close(self):
+        """
+        Stop the cat-file processes and remove the checked out files.
+        """
+        close_cat_files()
+        if self.root is not None:
+            shutil.rmtree(self.root, ignore_errors=True)
+            self.root = None
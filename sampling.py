@@ -0,0 +1,283 @@
+"""
+Copyright (C) 2012 KevinX Chang.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, Inc., 675 Mass Ave, Cambridge MA 02139,
+USA; either version 2 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+
+
+Approximate pylint scores from a sample of the files of a huge tree.
+
+With '--sample FRACTION' check_pylint lints only that fraction of the
+files, picked per stratum: the files are grouped by their top-level path
+and by their size class (sizes in powers of SIZE_CLASS_BASE), and every
+stratum gets its share of the sample, at least one file. The sample is
+random, but seeded, so that the same tree gives the same sample.
+
+The files are linted in an interleaved order, so that every stratum has
+about the same fraction of its sample done at any time. '--time-budget
+SECONDS' stops the run once it runs out (without it, the whole sample is
+linted), and the estimates are built from the files done by then.
+
+The scores of the paths and of the authors are estimated with the
+stratified ratio estimator (lines of code weigh the same in a mean, as in
+the exact report), with a confidence interval from its linearized
+variance. Strata that the time budget did not reach are left out of the
+estimates; the report says how many.
+
+Usage:
+check_pylint.py --recursive --sample=0.05
+check_pylint.py --recursive --sample=0.2 --time-budget=60
+check_pylint.py --recursive --time-budget=300 --confidence=0.99
+"""
+import argparse
+import math
+import os
+import random
+import time
+
+SIZE_CLASS_BASE = 4
+# confidence level => z-score of the normal distribution
+Z_SCORES = {0.8: 1.2816, 0.9: 1.6449, 0.95: 1.9600, 0.99: 2.5758}
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_SEED = 0
+
+
+def parse_fraction(value):
+    """
+    Parse a fraction of the files, with 0 < fraction <= 1.
+    """
+    try:
+        fraction = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("Expected a number: %s" % value)
+    if not 0 < fraction <= 1:
+        raise argparse.ArgumentTypeError("Expected 0 < FRACTION <= 1: %s" %
+                                         value)
+    return fraction
+
+
+def add_sample_arguments(parser):
+    """
+    param {argparse.ArgumentParser} parser: a parser that we populate
+        with the sampling options.
+    """
+    parser.add_argument('--sample', dest='sample',
+                        action='store',
+                        metavar='FRACTION',
+                        type=parse_fraction,
+                        help='[optional] Only lint this fraction of the '
+                             'files, and estimate the scores from them',
+                        default=None)
+    parser.add_argument('--time-budget', dest='time_budget',
+                        action='store',
+                        metavar='SECONDS',
+                        type=float,
+                        help='[optional] Stop linting after this many '
+                             'seconds, and estimate the scores from the '
+                             'files linted so far',
+                        default=None)
+    parser.add_argument('--confidence', dest='confidence',
+                        action='store',
+                        type=float,
+                        choices=sorted(Z_SCORES),
+                        help='Confidence level of the intervals of the '
+                             'estimates',
+                        default=DEFAULT_CONFIDENCE)
+    parser.add_argument('--sample-seed', dest='sample_seed',
+                        action='store',
+                        type=int,
+                        help='Seed of the sample',
+                        default=DEFAULT_SEED)
+    return parser
+
+
+def sampler_from_options(options):
+    """
+    Return the Sampler configured by add_sample_arguments, or None if
+    every file should be linted.
+    """
+    if options.sample is None and options.time_budget is None:
+        return None
+    return Sampler(options.sample or 1.0, options.time_budget,
+                   options.confidence, options.sample_seed)
+
+
+def get_size_class(size):
+    """
+    Return the size class of a file of size bytes.
+    """
+    return int(math.log(max(size, 1), SIZE_CLASS_BASE))
+
+
+def _get_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+class RatioEstimate(object):
+    """
+    The sums that the estimate of a mean score takes, per stratum, for
+    one author or path: a sampled file adds x, its lines of the author or
+    path, and y, x times its score.
+    """
+    __slots__ = ('sums',)
+
+    def __init__(self):
+        self.sums = {}  # stratum => [x, y, x * x, y * y, x * y]
+
+    def add(self, stratum, line_count, score):
+        y = score * line_count
+        if stratum not in self.sums:
+            self.sums[stratum] = [0, 0, 0, 0, 0]
+        sums = self.sums[stratum]
+        sums[0] += line_count
+        sums[1] += y
+        sums[2] += line_count * line_count
+        sums[3] += y * y
+        sums[4] += line_count * y
+
+
+class Sampler(object):
+    """
+    Picks the sample, keeps the time budget, and turns a RatioEstimate
+    into (lines, score, half width of the confidence interval).
+    """
+    def __init__(self, fraction=1.0, time_budget=None,
+                 confidence=DEFAULT_CONFIDENCE, seed=DEFAULT_SEED):
+        self.fraction = fraction
+        self.confidence = confidence
+        self.seed = seed
+        # the budget covers the whole run, discovery included
+        self.deadline = time_budget and time.time() + time_budget
+        self.strata = {}  # path => stratum
+        self.population = {}  # stratum => number of files
+        self.planned = 0  # files in the sample
+        self.done = {}  # stratum => number of sampled files done
+        self.stopped = False
+
+    def get_stratum(self, path, size):
+        """
+        Return the stratum of a file: its top-level path and size class.
+        """
+        top_level = path.split('/', 1)[0] if '/' in path else '.'
+        return '%s:%d' % (top_level, get_size_class(size))
+
+    def select(self, paths, get_size=_get_size):
+        """
+        Return the sampled paths, in the order to lint them.
+
+        param {function} get_size: returns the size of a file.
+        """
+        by_stratum = {}
+        for path in paths:
+            stratum = self.get_stratum(path, get_size(path))
+            self.strata[path] = stratum
+            by_stratum.setdefault(stratum, []).append(path)
+        rand = random.Random(self.seed)
+        order = []
+        for stratum, stratum_paths in sorted(by_stratum.iteritems()):
+            self.population[stratum] = len(stratum_paths)
+            self.done[stratum] = 0
+            rand.shuffle(stratum_paths)
+            count = max(1, int(round(self.fraction * len(stratum_paths))))
+            for index, path in enumerate(stratum_paths[:count]):
+                # the files of every stratum are spread over the order
+                order.append(((index + rand.random()) / count, path))
+        order.sort()
+        self.planned = len(order)
+        return [path for _rank, path in order]
+
+    def expired(self):
+        """
+        Return whether the time budget ran out, and if so remember that
+        the run stopped early.
+        """
+        if self.deadline and time.time() >= self.deadline:
+            self.stopped = True
+        return self.stopped
+
+    def record(self, path):
+        """
+        Count a sampled file as done, whether or not it got a score.
+        """
+        self.done[self.strata[path]] += 1
+
+    def estimate(self, ratio_estimate):
+        """
+        Return (lines, score, half width) of the estimate of the mean
+        score and of the lines of code of an author or path. score is
+        None if the sample has no lines of it, and the half width is None
+        if there are too few files to tell. Strata with a single sampled
+        file take the residual variance pooled over the others.
+        """
+        x_total = y_total = 0.0
+        for stratum, sums in ratio_estimate.sums.iteritems():
+            weight = float(self.population[stratum]) / self.done[stratum]
+            x_total += weight * sums[0]
+            y_total += weight * sums[1]
+        if not x_total:
+            return 0, None, None
+        ratio = y_total / x_total
+
+        variances = {}  # stratum => variance of the residuals
+        pooled = [0.0, 0]
+        for stratum, count in self.done.iteritems():
+            if count < 2:
+                continue
+            x, y, xx, yy, xy = ratio_estimate.sums.get(stratum,
+                                                       [0, 0, 0, 0, 0])
+            residuals = y - ratio * x
+            squares = yy - 2 * ratio * xy + ratio * ratio * xx
+            variances[stratum] = max(
+                0.0, (squares - residuals * residuals / count) / (count - 1))
+            pooled[0] += variances[stratum] * (count - 1)
+            pooled[1] += count - 1
+        variance = 0.0
+        for stratum, count in self.done.iteritems():
+            population = self.population[stratum]
+            if not count or count == population:
+                continue  # not reached, or linted in full
+            if stratum in variances:
+                stratum_variance = variances[stratum]
+            elif pooled[1]:
+                stratum_variance = pooled[0] / pooled[1]
+            else:
+                return x_total, ratio, None
+            variance += (population * population *
+                         (1 - float(count) / population) *
+                         stratum_variance / count)
+        half_width = (Z_SCORES[self.confidence] *
+                      math.sqrt(variance) / x_total)
+        return x_total, ratio, half_width
+
+    def __str__(self):
+        done = sum(self.done.itervalues())
+        population = sum(self.population.itervalues())
+        buff = ["Sampled {done} of {population} files in {strata} strata; "
+                "scores are estimates with {confidence:.0%} confidence "
+                "intervals".format(done=done, population=population,
+                                   strata=len(self.population),
+                                   confidence=self.confidence)]
+        if self.stopped:
+            missed = len([stratum for stratum, count in self.done.iteritems()
+                          if not count])
+            buff.append("Stopped by the time budget after {done} of "
+                        "{planned} files; {missed} strata not reached".format(
+                            done=done, planned=self.planned, missed=missed))
+        return "\n".join(buff)
@@ -0,0 +1,232 @@
+"""
+Copyright (C) 2012 KevinX Chang.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, Inc., 675 Mass Ave, Cambridge MA 02139,
+USA; either version 2 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+
+Thread-based scheduler that overlaps the steps of checking a file.
+
+Checking a file runs a few independent tasks, such as linting it (mostly
+CPU) and blaming it (mostly waiting on git). Scheduler.imap() runs every
+kind of task in a pool of worker threads of its own, with a bound per
+kind, so that the blame of a file runs while another file is linted.
+The commands that the tasks run are separate processes, so the threads
+only wait on them; asyncio would do the same, but is not available on
+Python 2.
+
+Each task can be given a timeout (the command is killed once it runs
+out) and retried. At most max_pending files are in flight at a time, and
+the files are only read from their iterator when there's room, so memory
+stays flat however many files there are. The results come out in the
+order of the files.
+"""
+import collections
+import Queue
+import sys
+import threading
+
+DEFAULT_JOBS = {'lint': 1, 'blame': 4}
+DEFAULT_MAX_PENDING = 64
+
+
+def add_scheduler_arguments(parser):
+    """
+    param {argparse.ArgumentParser} parser: a parser that we populate
+        with the scheduler options.
+    """
+    parser.add_argument('--overlap', dest='overlap',
+                        action='store_true',
+                        help='Lint and blame files concurrently, in threads',
+                        default=False)
+    parser.add_argument('--lint-jobs', dest='lint_jobs',
+                        action='store',
+                        type=int,
+                        help='With --overlap, number of files linted at '
+                             'once',
+                        default=DEFAULT_JOBS['lint'])
+    parser.add_argument('--blame-jobs', dest='blame_jobs',
+                        action='store',
+                        type=int,
+                        help='With --overlap, number of files blamed at '
+                             'once',
+                        default=DEFAULT_JOBS['blame'])
+    parser.add_argument('--timeout', dest='timeout',
+                        action='store',
+                        type=float,
+                        help='[optional] With --overlap, seconds a command '
+                             'may run before it is killed',
+                        default=None)
+    parser.add_argument('--retries', dest='retries',
+                        action='store',
+                        type=int,
+                        help='With --overlap, times a failed task is '
+                             'retried',
+                        default=0)
+    parser.add_argument('--max-pending', dest='max_pending',
+                        action='store',
+                        type=int,
+                        help='With --overlap, number of files in flight',
+                        default=DEFAULT_MAX_PENDING)
+    return parser
+
+
+def scheduler_from_options(options):
+    """
+    Return the Scheduler configured by add_scheduler_arguments, or None.
+    """
+    if not options.overlap:
+        return None
+    return Scheduler({'lint': options.lint_jobs,
+                      'blame': options.blame_jobs},
+                     timeout=options.timeout,
+                     retries=options.retries,
+                     max_pending=options.max_pending)
+
+
+class Task(object):
+    """
+    A call of func(item, timeout=...), and its outcome.
+    """
+    __slots__ = ('kind', 'func', 'item', 'result', 'error', 'done')
+
+    def __init__(self, kind, func, item):
+        self.kind = kind
+        self.func = func
+        self.item = item
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class TaskPool(object):
+    """
+    Worker threads that run the tasks of one kind, jobs at a time.
+    """
+    def __init__(self, kind, jobs, timeout=None, retries=0):
+        self.kind = kind
+        self.timeout = timeout
+        self.retries = retries
+        self.queue = Queue.Queue()
+        self.threads = []
+        for _ in range(max(jobs, 1)):
+            thread = threading.Thread(target=self._work)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def _work(self):
+        while True:
+            task = self.queue.get()
+            if task is None:
+                return
+            for _attempt in range(self.retries + 1):
+                try:
+                    task.result = task.func(task.item, timeout=self.timeout)
+                    task.error = None
+                    break
+                except Exception as e:
+                    task.error = e
+            task.done.set()
+
+    def submit(self, func, item):
+        task = Task(self.kind, func, item)
+        self.queue.put(task)
+        return task
+
+    def cancel(self):
+        """
+        Drop the tasks that did not start yet.
+        """
+        while True:
+            try:
+                task = self.queue.get_nowait()
+            except Queue.Empty:
+                return
+            if task is not None:
+                task.done.set()
+
+    def close(self):
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+
+
+class Scheduler(object):
+    """
+    Runs tasks of several kinds concurrently, with a bound per kind.
+    """
+    def __init__(self, jobs=None, timeout=None, retries=0,
+                 max_pending=DEFAULT_MAX_PENDING):
+        """
+        param {dict} jobs: kind of task => number of tasks of that kind
+            that run at once; other kinds run one at a time.
+        param {float} timeout: [optional] passed to every task, which
+            should stop (and raise) once it runs out.
+        param {int} retries: times a task that raised is run again.
+        param {int} max_pending: number of items in flight.
+        """
+        self.jobs = dict(jobs or DEFAULT_JOBS)
+        self.timeout = timeout
+        self.retries = retries
+        self.max_pending = max(max_pending, 1)
+
+    def limit(self, kind, jobs):
+        """
+        Run at most jobs tasks of a kind at once.
+        """
+        self.jobs[kind] = min(self.jobs.get(kind, 1), jobs)
+
+    def imap(self, items, tasks):
+        """
+        For every item, run func(item, timeout=...) of each (kind, func)
+        of tasks, and yield (item, results) in the order of items. The
+        result of a task that failed every time is None; its error is
+        printed. The tasks of the items still pending when the caller
+        stops early are dropped.
+        """
+        pools = dict((kind, TaskPool(kind, self.jobs.get(kind, 1),
+                                     self.timeout, self.retries))
+                     for kind, _func in tasks)
+        pending = collections.deque()
+        items = iter(items)
+        try:
+            while True:
+                # read items while there's room, so that memory stays flat
+                for item in items:
+                    pending.append((item, [pools[kind].submit(func, item)
+                                           for kind, func in tasks]))
+                    if len(pending) >= self.max_pending:
+                        break
+                if not pending:
+                    break
+                item, item_tasks = pending.popleft()
+                results = []
+                for task in item_tasks:
+                    # with a timeout, so that ^C is not held up
+                    while not task.done.wait(1):
+                        pass
+                    if task.error is not None:
+                        print >> sys.stderr, "Error, %s of %s failed: %s" % (
+                            task.kind, item, task.error)
+                    results.append(task.result)
+                yield item, results
+        finally:
+            for pool in pools.itervalues():
+                if pending:
+                    pool.cancel()  # the caller stopped early
+                pool.close()
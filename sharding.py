@@ -0,0 +1,233 @@
+"""
+Copyright (C) 2012 KevinX Chang.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, Inc., 675 Mass Ave, Cambridge MA 02139,
+USA; either version 2 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+
+Shards of the files a checker discovers, and their partial reports.
+
+See shards.py, which merges the partial reports. This module is imported
+by the checkers, so it imports none of them.
+"""
+import argparse
+import json
+import os
+import sys
+
+PARTIAL_VERSION = 1
+
+
+def parse_shard(value):
+    """
+    Parse 'i/N' into an (i, N) tuple, with 1 <= i <= N.
+    """
+    try:
+        index, count = [int(part) for part in value.split('/')]
+    except ValueError:
+        raise argparse.ArgumentTypeError("Expected i/N, such as 1/4: %s" %
+                                         value)
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError("Expected 1 <= i <= N: %s" % value)
+    return index, count
+
+
+def add_shard_arguments(parser):
+    """
+    param {argparse.ArgumentParser} parser: a parser that we populate
+        with the sharding options.
+    """
+    parser.add_argument('--shard', dest='shard',
+                        action='store',
+                        type=parse_shard,
+                        help='[optional] Only check the i-th of N shards of '
+                             'the files, as i/N',
+                        default=None)
+    parser.add_argument('--partial', dest='partial',
+                        action='store',
+                        help='File to write the partial report of the shard '
+                             'to, for "shards.py merge" (default: stdout)',
+                        default=None)
+    parser.add_argument('--shard-weights', dest='shard_weights',
+                        action='store',
+                        help='[optional] --trace file of an earlier run, to '
+                             'balance the shards by time rather than size',
+                        default=None)
+    return parser
+
+
+def shard_from_options(options):
+    """
+    Return the Shard configured by add_shard_arguments, or None.
+    """
+    if not options.shard:
+        return None
+    weights = None
+    if options.shard_weights:
+        weights = load_trace_weights(options.shard_weights)
+    index, count = options.shard
+    return Shard(index, count, weights)
+
+
+def load_trace_weights(trace_file):
+    """
+    Return the path => seconds spent on each file, from a --trace file.
+    """
+    from profiling import FILE
+    fd = open(trace_file)
+    try:
+        events = json.load(fd)['traceEvents']
+    finally:
+        fd.close()
+    weights = {}
+    for event in events:
+        if event.get('cat') == FILE:
+            weights[event['name']] = (weights.get(event['name'], 0) +
+                                      event['dur'] / 1000000.0)
+    return weights
+
+
+def _get_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+class Shard(object):
+    """
+    The i-th of N shards of a list of files.
+    """
+    def __init__(self, index, count, weights=None):
+        """
+        param {int} index: 1-based index of the shard.
+        param {dict} weights: [optional] path => seconds of an earlier run;
+            without them, files are weighed by size.
+        """
+        self.index = index
+        self.count = count
+        self.weights = weights
+        self.positions = {}  # path => position among all the files
+
+    def __str__(self):
+        return '%d/%d' % (self.index, self.count)
+
+    def _get_weights(self, paths, get_size):
+        sizes = [get_size(path) for path in paths]
+        if not self.weights:
+            return sizes
+        # files the earlier run did not time weigh as much as their size
+        # took on average
+        timed = [(self.weights[path], size) for path, size
+                 in zip(paths, sizes) if path in self.weights]
+        seconds_per_byte = (sum(seconds for seconds, _size in timed) /
+                            max(sum(size for _seconds, size in timed), 1))
+        return [self.weights.get(path, size * seconds_per_byte)
+                for path, size in zip(paths, sizes)]
+
+    def select(self, paths, get_size=_get_size):
+        """
+        Return the paths of this shard, in their original order. Paths
+        are handed out heaviest first, each to the shard that has the
+        least weight so far (ties broken by position and shard index), so
+        that every machine computes the same shards.
+
+        param {function} get_size: returns the size of a file, such as
+            Revision.get_size for the files of a revision.
+        """
+        paths = list(paths)
+        weights = self._get_weights(paths, get_size)
+        loads = [0] * self.count
+        selected = set()
+        for position in sorted(range(len(paths)),
+                               key=lambda position: (-weights[position],
+                                                     position)):
+            shard = loads.index(min(loads))
+            loads[shard] += weights[position]
+            if shard == self.index - 1:
+                selected.add(position)
+        self.positions = dict((paths[position], position)
+                              for position in selected)
+        return [path for position, path in enumerate(paths)
+                if position in selected]
+
+
+def write_partial(partial_file, tool, shard, files):
+    """
+    Write the partial report of a shard.
+
+    param {str} partial_file: [optional] where to, defaults to stdout.
+    param {list} files: [position, path, results] of every file of the
+        shard, the results depending on the tool.
+    """
+    partial = {'version': PARTIAL_VERSION, 'tool': tool,
+               'shard': [shard.index, shard.count], 'files': files}
+    if not partial_file:
+        json.dump(partial, sys.stdout, sort_keys=True)
+        sys.stdout.write("\n")
+        return
+    tmp_file = partial_file + '.tmp'
+    fd = open(tmp_file, 'w')
+    try:
+        json.dump(partial, fd, sort_keys=True)
+    finally:
+        fd.close()
+    os.rename(tmp_file, partial_file)
+
+
+def _encode(value):
+    # json decodes to unicode, the checkers report in byte strings
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    if isinstance(value, list):
+        return [_encode(item) for item in value]
+    if isinstance(value, dict):
+        return dict((_encode(key), _encode(item))
+                    for key, item in value.iteritems())
+    return value
+
+
+def load_partials(partial_files):
+    """
+    Return the tool => [position, path, results] of all the files of a
+    set of partials, in the order a single run would have checked them.
+    Raises ValueError unless each tool has every shard exactly once.
+    """
+    shards = {}  # tool => list of (index, count)
+    files = {}
+    for partial_file in partial_files:
+        fd = open(partial_file)
+        try:
+            partial = json.load(fd)
+        finally:
+            fd.close()
+        if partial.get('version') != PARTIAL_VERSION:
+            raise ValueError("Not a partial report: %s" % partial_file)
+        shards.setdefault(partial['tool'], []).append(tuple(partial['shard']))
+        files.setdefault(partial['tool'], []).extend(
+            _encode(partial['files']))
+    for tool, tool_shards in shards.iteritems():
+        count = tool_shards[0][1]
+        if sorted(tool_shards) != [(index, count)
+                                   for index in range(1, count + 1)]:
+            raise ValueError("The %s partials are not shards 1 to %d "
+                             "exactly once: %s" % (
+                                 tool, count, ', '.join(
+                                     '%d/%d' % shard
+                                     for shard in sorted(tool_shards))))
+    for tool_files in files.itervalues():
+        tool_files.sort()
+    return files
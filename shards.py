@@ -0,0 +1,116 @@
+#!/usr/bin/python2.7
+
+"""
+Copyright (C) 2012 KevinX Chang.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, Inc., 675 Mass Ave, Cambridge MA 02139,
+USA; either version 2 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+
+Split a checker's work across machines, and merge the partial reports.
+
+With '--shard i/N', check_pylint and check_todos only check the i-th of
+N shards of the files they discover, and write a partial report (JSON)
+to --partial instead of their text report. The shards are deterministic:
+every machine that checks out the same tree computes the same ones. The
+files are balanced by size, or by how long they took in an earlier run
+if --shard-weights names a --trace file of it.
+
+'shards.py merge' combines the partials of all the shards into the
+report the checker would have printed on a single machine. With '--format
+jsonl' no partial is needed: the records of the shards can simply be
+concatenated.
+
+Usage:
+check_pylint.py --recursive --shard=1/4 --partial=pylint-1.json
+check_todos.py --shard=1/4 --partial=todos-1.json
+shards.py merge pylint-*.json
+shards.py merge todos-*.json
+"""
+import argparse
+import sys
+
+from check_pylint import InfoContainer
+from check_todos import format_todos, Todo
+from sharding import load_partials
+
+MERGE = 'merge'
+COMMANDS = (MERGE,)
+
+
+def merge_pylint(files, authors=None, path_depth=1):
+    """
+    Print the check_pylint report of the files of the pylint partials.
+    """
+    rootinfo = InfoContainer(authors, path_depth)
+    for _position, pyfile, (score, author_line_count) in files:
+        if not score:
+            print "Error, no score: %s" % pyfile
+            continue
+        rootinfo.add_file_scores(pyfile, author_line_count, score)
+    print(rootinfo)
+
+
+def merge_todos(files):
+    """
+    Print the check_todos report of the files of the todos partials.
+    """
+    author_to_todolist = {}
+    for _position, _path, todo_fields in files:
+        for fields in todo_fields:
+            todo = Todo(*fields)
+            author_to_todolist.setdefault(todo.get_author(), []).append(todo)
+    if author_to_todolist:
+        print format_todos(author_to_todolist)
+
+
+def configure_argument_parser(parser=argparse.ArgumentParser()):
+    """
+    param {argparse.ArgumentParser} parser: a parser that we populate
+        specific options.
+    """
+    parser.add_argument('command', choices=COMMANDS,
+                        help='Merge partial reports')
+    parser.add_argument('partials', nargs='+',
+                        help='Partial reports of every shard')
+    parser.add_argument('--authors', dest='authors',
+                        nargs='*',
+                        help='[optional] Only output these authors')
+    parser.add_argument('--path-depth', dest='path_depth',
+                        action='store',
+                        type=int,
+                        help='Directory levels of the path summary, 0 for '
+                             'all of them',
+                        default=1)
+    return parser
+
+
+def run():
+    parser = configure_argument_parser()
+    options = parser.parse_args(sys.argv[1:])
+    try:
+        files = load_partials(options.partials)
+    except ValueError as e:
+        print "Error, %s" % e
+        sys.exit(1)
+    if 'pylint' in files:
+        merge_pylint(files['pylint'], options.authors, options.path_depth)
+    if 'todos' in files:
+        merge_todos(files['todos'])
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,97 @@
+"""
+Copyright (C) 2012 KevinX Chang.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, Inc., 675 Mass Ave, Cambridge MA 02139,
+USA; either version 2 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+
+Tests of blame_index. Run with python -m unittest discover -s tests
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+import blame_index  # noqa: E402
+import vcs  # noqa: E402
+from result_cache import ResultCache  # noqa: E402
+
+
+def git(*args):
+    subprocess.check_call(('git',) + args, stdout=subprocess.PIPE)
+
+
+def fail_to_blame(*args):
+    raise AssertionError('Blamed %r again' % (args,))
+
+
+class BlameLinesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.root = tempfile.mkdtemp(prefix='pynalysis-test-')
+        os.chdir(self.root)
+        git('init', '-q', '.')
+        git('config', 'user.email', 'a@x.com')
+        git('config', 'user.name', 'A')
+        with open('todo.py', 'w') as output:
+            output.write('a = 1\n# TODO(a): b\nc = 2\n# TODO: d\n')
+        git('add', 'todo.py')
+        git('commit', '-q', '-m', 'todo')
+        self.cache = ResultCache(os.path.join(self.root, '.cache'))
+        vcs._DETECTED = None
+        blame_index.reset_blob_shas()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.root)
+        vcs._DETECTED = None
+        blame_index.reset_blob_shas()
+
+    def test_committed_file_is_indexed(self):
+        index = blame_index.BlameIndex(self.cache)
+        blamed = index.blame_lines('todo.py', [1, 3])
+        self.assertEqual(sorted(blamed), [1, 3])
+        self.assertEqual(blamed[1][0], 'a@x.com')
+        run_blame = blame_index.run_blame
+        run_blame_lines = blame_index.run_blame_lines
+        blame_index.run_blame = blame_index.run_blame_lines = fail_to_blame
+        try:
+            index = blame_index.BlameIndex(self.cache)
+            self.assertEqual(index.blame_lines('todo.py', [1, 3]), blamed)
+            self.assertEqual(index.blame_lines('todo.py', [1]),
+                             {1: blamed[1]})
+        finally:
+            blame_index.run_blame = run_blame
+            blame_index.run_blame_lines = run_blame_lines
+
+    def test_changed_file_is_blamed_live(self):
+        with open('todo.py', 'a') as output:
+            output.write('# TODO: e\n')
+        index = blame_index.BlameIndex(self.cache)
+        blamed = index.blame_lines('todo.py', [1, 4])
+        self.assertEqual(sorted(blamed), [1, 4])
+        self.assertFalse(os.path.isdir(self.cache.cache_dir) and
+                         os.listdir(self.cache.cache_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
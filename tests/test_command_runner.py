@@ -0,0 +1,72 @@
+"""
+Copyright (C) 2012 KevinX Chang.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, Inc., 675 Mass Ave, Cambridge MA 02139,
+USA; either version 2 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+
+Tests of command_runner. Run with
+python -m unittest discover -s tests
+"""
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+import command_runner  # noqa: E402
+
+
+class CommandTest(unittest.TestCase):
+
+    def test_commands_from_threads(self):
+        outputs = []
+
+        def run(index):
+            outputs.append(command_runner.read_command(
+                ['echo', 'a b', str(index)], timeout=30))
+        threads = [threading.Thread(target=run, args=(index,))
+                   for index in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(outputs),
+                         sorted('a b %d\n' % index for index in range(16)))
+
+    def test_timeout_kills_the_session(self):
+        for cmd in ('sleep 30 & sleep 30; echo done',
+                    ['sh', '-c', 'sleep 30 & sleep 30; echo done']):
+            started = time.time()
+            self.assertRaises(command_runner.CommandTimeout,
+                              command_runner.read_command, cmd, 0.5)
+            lines = command_runner.iter_command_lines(cmd, 0.5)
+            self.assertRaises(command_runner.CommandTimeout, list, lines)
+            self.assertTrue(time.time() - started < 10)
+
+    def test_session_is_the_command(self):
+        # the command itself leads the session, which _kill_session kills
+        output = command_runner.read_command(
+            ['sh', '-c', 'echo $$; ps -o sid= -p $$'])
+        pid, sid = output.split()
+        self.assertEqual(pid, sid)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+"""
+Copyright (C) 2012 KevinX Chang.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, Inc., 675 Mass Ave, Cambridge MA 02139,
+USA; either version 2 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+
+Tests of discovery. Run with python -m unittest discover -s tests
+"""
+import os
+import re
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from discovery import iter_files  # noqa: E402
+
+FILES = ['check_todos.py', 'main.py', 'pkg/check_todos.py', 'pkg/main.py',
+         'pkg/test_main.py', 'test_dir/main.py']
+
+
+class SkipTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.root = tempfile.mkdtemp(prefix='pynalysis-test-')
+        os.chdir(self.root)
+        for path in FILES:
+            if os.path.dirname(path) and not os.path.isdir(
+                    os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            open(path, 'w').close()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.root)
+
+    def get_paths(self, skip, **kwargs):
+        return [entry.path for entry in
+                iter_files('.', re.compile(skip), use_git=False, **kwargs)]
+
+    def test_skip_relative_paths(self):
+        self.assertEqual(self.get_paths(r'^test_|^check_todos\.py'),
+                         ['main.py', 'pkg/check_todos.py', 'pkg/main.py',
+                          'pkg/test_main.py'])
+
+    def test_skip_file_names(self):
+        # directories still match by relative path
+        self.assertEqual(self.get_paths(r'^test_|^check_todos\.py',
+                                        skip_file_names=True),
+                         ['main.py', 'pkg/main.py'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+"""
+Copyright (C) 2012 KevinX Chang.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, Inc., 675 Mass Ave, Cambridge MA 02139,
+USA; either version 2 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+
+Tests of linter_backends. Run with python -m unittest discover -s tests
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+import linter_backends  # noqa: E402
+
+try:
+    import pylint
+except ImportError:
+    pylint = None
+
+RCFILE = os.path.join(linter_backends.REPORTERS_DIR, 'pylint.rc')
+
+HELPER = ('"""Helper."""\n\n\n'
+          'def compute(value):\n'
+          '    """Double."""\n'
+          '    return value * 2\n')
+USER = ('"""User."""\nimport helper\n\n\n'
+        'def go():\n'
+        '    """Go."""\n'
+        '    return helper.compute(2)\n')
+OTHER_HELPER = ('"""Other helper."""\n\n\n'
+                'class Thing(object):\n'
+                '    """Thing."""\n'
+                '    def run(self):\n'
+                '        """Run."""\n'
+                '        return 1\n')
+MAIN = ('"""Main."""\nimport helper\n\n\n'
+        'def go():\n'
+        '    """Go."""\n'
+        '    return helper.Thing().run()\n')
+
+# directories with a module, or a package, of the same name, each used by
+# a module that only scores 10 against its own helper; and a directory
+# that a shell would split and run
+PROJECT = {
+    'lib/helper.py': HELPER,
+    'lib/user.py': USER,
+    'sub/deep/helper.py': OTHER_HELPER,
+    'sub/deep/main.py': MAIN,
+    'pkg_lib/helper/__init__.py': HELPER,
+    'pkg_lib/user.py': USER,
+    'pkg_sub/deep/helper/__init__.py': OTHER_HELPER,
+    'pkg_sub/deep/main.py': MAIN,
+    "odd dir;touch pwned&'/user.py": HELPER,
+}
+PYFILES = ['lib/user.py', 'sub/deep/main.py', 'pkg_lib/user.py',
+           'pkg_sub/deep/main.py', 'pkg_sub/deep/helper/__init__.py',
+           "odd dir;touch pwned&'/user.py"]
+
+
+class Pep8BackendsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='pynalysis-test-')
+        self.pyfile = os.path.join(self.root, 'style.py')
+        with open(self.pyfile, 'w') as output:
+            output.write('import re\nx=re.compile("\\d")\n'
+                         'f = lambda: 1\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_backends_run_the_same_tool(self):
+        tool = linter_backends.get_pep8_tool()
+        inprocess = linter_backends.get_pep8_backend(linter_backends.INPROCESS)
+        subprocess_backend = linter_backends.get_pep8_backend(
+            linter_backends.SUBPROCESS)
+        self.assertEqual(inprocess.name, tool)
+        self.assertEqual(subprocess_backend.name, tool)
+        self.assertEqual(inprocess.version, subprocess_backend.version)
+        messages = inprocess.check(self.pyfile)
+        self.assertTrue(messages)
+        self.assertEqual(messages, subprocess_backend.check(self.pyfile))
+
+
+class PylintBatchesTest(unittest.TestCase):
+
+    def test_batches_are_directories(self):
+        self.assertEqual(linter_backends.get_pylint_batches(
+            ['a.py', 'b.py', 'c.py', 'd/a.py', 'd/b.py', 'e.py'], 2),
+            [['a.py', 'b.py'], ['c.py'], ['d/a.py', 'd/b.py'], ['e.py']])
+
+
+@unittest.skipIf(pylint is None, 'pylint is not installed')
+class PylintBackendsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.root = tempfile.mkdtemp(prefix='pynalysis-test-')
+        for path, contents in PROJECT.items():
+            path = os.path.join(self.root, path)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as output:
+                output.write(contents)
+        os.chdir(self.root)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.root)
+
+    def get_scores(self, backend, pyfiles, batch=False):
+        if batch:
+            return backend.check_batch(pyfiles)
+        return [backend.check(pyfile) for pyfile in pyfiles]
+
+    def test_scores_do_not_depend_on_the_order(self):
+        for batch in (False, True):
+            backend = linter_backends.InProcessPylint(RCFILE)
+            forward = self.get_scores(backend, PYFILES, batch)
+            backend = linter_backends.InProcessPylint(RCFILE)
+            backward = self.get_scores(backend, PYFILES[::-1], batch)
+            self.assertEqual(forward, backward[::-1])
+            self.assertEqual(forward, [10.0] * len(PYFILES))
+
+    def test_batches_score_as_single_files(self):
+        for backend in (linter_backends.InProcessPylint(RCFILE),
+                        linter_backends.SubprocessPylint(RCFILE)):
+            self.assertEqual(self.get_scores(backend, PYFILES, batch=True),
+                             self.get_scores(backend, PYFILES))
+        self.assertFalse(os.path.exists('pwned'))
+
+    def test_scores_match_the_subprocess_backend(self):
+        backend = linter_backends.InProcessPylint(RCFILE)
+        subprocess_backend = linter_backends.SubprocessPylint(RCFILE)
+        self.assertEqual(self.get_scores(backend, PYFILES),
+                         self.get_scores(subprocess_backend, PYFILES))
+        self.assertEqual(self.get_scores(backend, PYFILES, batch=True),
+                         self.get_scores(subprocess_backend, PYFILES,
+                                         batch=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
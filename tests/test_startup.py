@@ -0,0 +1,103 @@
+"""
+Copyright (C) 2012 KevinX Chang.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, Inc., 675 Mass Ave, Cambridge MA 02139,
+USA; either version 2 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+
+Tests of what starting a command costs. Run with
+python -m unittest discover -s tests
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PACKAGE_DIR)
+
+import benchmark  # noqa: E402
+
+MODULES = ['pynalysis', 'check_pylint', 'check_pep8', 'check_todos',
+           'check_misc', 'daemon', 'history', 'shards', 'benchmark']
+LINTER_MODULES = ['pylint', 'astroid', 'pylint_reporters']
+VCS_COMMANDS = ['git', 'svn']
+# seconds that 'pynalysis.py TOOL --help' may take, far more than the
+# tenth of a second it takes without the linters
+MAX_STARTUP = 2.0
+
+# imports the modules, then prints the linter modules that were imported
+IMPORT_SCRIPT = '''
+import sys
+for module in %r:
+    __import__(module)
+print ' '.join(module for module in %r if module in sys.modules)
+''' % (MODULES, LINTER_MODULES)
+
+
+class StartupTest(unittest.TestCase):
+
+    def setUp(self):
+        # git and svn commands that only log that they were run
+        self.bin_dir = tempfile.mkdtemp(prefix='pynalysis-test-')
+        self.log_file = os.path.join(self.bin_dir, 'log')
+        for command in VCS_COMMANDS:
+            path = os.path.join(self.bin_dir, command)
+            with open(path, 'w') as output:
+                output.write('#!/bin/sh\necho %s "$@" >> %s\nexit 1\n' % (
+                    command, self.log_file))
+            os.chmod(path, 0755)
+
+    def tearDown(self):
+        shutil.rmtree(self.bin_dir)
+
+    def run_python(self, *args):
+        env = dict(os.environ)
+        env['PATH'] = os.pathsep.join([self.bin_dir, env.get('PATH', '')])
+        env['PYTHONPATH'] = PACKAGE_DIR
+        return subprocess.check_output((sys.executable,) + args,
+                                       cwd=self.bin_dir, env=env)
+
+    def get_vcs_commands(self):
+        if not os.path.exists(self.log_file):
+            return []
+        with open(self.log_file) as log:
+            return log.read().splitlines()
+
+    def test_imports_do_not_import_the_linters(self):
+        self.assertEqual(self.run_python('-c', IMPORT_SCRIPT).strip(), '')
+        self.assertEqual(self.get_vcs_commands(), [])
+
+    def test_help_does_not_run_vcs_commands(self):
+        self.run_python(os.path.join(PACKAGE_DIR, 'pynalysis.py'), '--help')
+        for module in ('check_pylint', 'check_todos'):
+            self.run_python(os.path.join(PACKAGE_DIR, 'pynalysis.py'),
+                            module.split('_')[1], '--help')
+        self.assertEqual(self.get_vcs_commands(), [])
+
+    def test_startup_time(self):
+        for tool in ('pylint', 'pep8', 'todos'):
+            for repo in (self.bin_dir, PACKAGE_DIR):
+                seconds = benchmark.measure_startup(repo, tool, repeat=3)
+                self.assertTrue(seconds < MAX_STARTUP,
+                                '%s starts in %.2fs in %s' % (tool, seconds,
+                                                              repo))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+"""
+Copyright (C) 2012 KevinX Chang.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, Inc., 675 Mass Ave, Cambridge MA 02139,
+USA; either version 2 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+
+Tests against a local svn repository (file://), skipped without svn.
+Run with python -m unittest discover -s tests
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from distutils.spawn import find_executable
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+import blame_index  # noqa: E402
+import vcs  # noqa: E402
+from check_todos import get_todo_list  # noqa: E402
+from result_cache import ResultCache  # noqa: E402
+
+HAS_SVN = bool(find_executable('svn') and find_executable('svnadmin'))
+
+
+def fail_to_blame(*args):
+    raise AssertionError('Blamed %r again' % (args,))
+
+
+@unittest.skipUnless(HAS_SVN, 'svn and svnadmin are not installed')
+class SvnTestCase(unittest.TestCase):
+    """
+    Runs every test in the working copy of a new file:// repository.
+    """
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.root = tempfile.mkdtemp(prefix='pynalysis-test-')
+        repository = os.path.join(self.root, 'repository')
+        self.work_tree = os.path.join(self.root, 'work tree')
+        self.svn_admin('create', repository)
+        self.svn('checkout', '-q', 'file://' + repository, self.work_tree)
+        os.chdir(self.work_tree)
+        self.cache = ResultCache(os.path.join(self.root, 'cache'))
+        vcs._DETECTED = None
+        blame_index.reset_blob_shas()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.root)
+        vcs._DETECTED = None
+        blame_index.reset_blob_shas()
+
+    def svn(self, *args):
+        subprocess.check_call(('svn',) + args, stdout=subprocess.PIPE)
+
+    def svn_admin(self, *args):
+        subprocess.check_call(('svnadmin',) + args, stdout=subprocess.PIPE)
+
+    def commit(self, files):
+        """
+        Add and commit files, a dict of path to contents, as alice.
+        """
+        for path, contents in sorted(files.items()):
+            if os.path.dirname(path) and not os.path.isdir(
+                    os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as output:
+                output.write(contents)
+        self.svn('add', '-q', '--force', '.')
+        self.svn('commit', '-q', '-m', 'commit', '--non-interactive',
+                 '--username', 'alice')
+        self.svn('update', '-q')
+
+
+class VcsSvnTest(SvnTestCase):
+
+    # paths that a shell would split, expand or run
+    PATHS = ['a dir/my file.py', "b;touch pwned&'\"$(touch pwned).py"]
+
+    def setUp(self):
+        super(VcsSvnTest, self).setUp()
+        self.commit(dict((path, 'a = 1\n\nb = 2\n') for path in self.PATHS))
+
+    def test_blame_args_are_a_list(self):
+        self.assertEqual(vcs.get_vcs(), 'svn')
+        path = self.PATHS[1]
+        self.assertEqual(vcs._get_blame_args(path),
+                         ['svn', 'blame', '-v', path])
+        self.assertEqual(vcs._get_blame_args(path, '1'),
+                         ['svn', 'blame', '-v', '-r', '1', path])
+
+    def test_blame_paths_with_shell_characters(self):
+        for path in self.PATHS:
+            for rev in (None, '1'):
+                blamed = vcs.run_blame(path, rev=rev)
+                self.assertEqual([entry[0] for entry in blamed],
+                                 ['alice'] * 3)
+                self.assertEqual([entry[2] for entry in blamed],
+                                 [True, False, True])
+                self.assertTrue(all(entry[1] for entry in blamed))
+                self.assertEqual(vcs.run_blame_lines(path, [2, 0], rev),
+                                 {0: blamed[0], 2: blamed[2]})
+        self.assertFalse(os.path.exists('pwned'))
+
+
+class CheckTodosSvnTest(SvnTestCase):
+
+    def test_blames_are_indexed(self):
+        self.commit({'todo.py': 'a = 1\n# TODO(bob): b\nc = 2\n# TODO: d\n'})
+        todos = get_todo_list('todo.py', blame_index.BlameIndex(self.cache))
+        self.assertEqual(sorted((todo.line, todo.name, todo.checkin_name)
+                                for todo in todos),
+                         [(2, 'bob', 'alice'), (4, None, 'alice')])
+        self.assertTrue(all(todo.datestamp for todo in todos))
+        run_blame = blame_index.run_blame
+        run_blame_lines = blame_index.run_blame_lines
+        blame_index.run_blame = blame_index.run_blame_lines = fail_to_blame
+        try:
+            blame_index.reset_blob_shas()
+            indexed_todos = get_todo_list(
+                'todo.py', blame_index.BlameIndex(self.cache))
+        finally:
+            blame_index.run_blame = run_blame
+            blame_index.run_blame_lines = run_blame_lines
+        self.assertEqual(sorted(str(todo) for todo in indexed_todos),
+                         sorted(str(todo) for todo in todos))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,351 @@
+"""
+Copyright (C) 2012 KevinX Chang.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, Inc., 675 Mass Ave, Cambridge MA 02139,
+USA; either version 2 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+
+
+Version control helpers shared by the checkers: detection of the VCS in
+use, its blame command and the mapping of committer emails to authors.
+
+Commands are run from an argument vector, without a shell, so paths with
+spaces or shell characters are passed as they are. git blame runs once
+per file (git can't blame several files in one process) and its
+--porcelain output is parsed as it streams; git objects are read through
+a pool of long-lived 'git cat-file --batch' processes (see read_blob), so
+that reading a file of a revision costs no process start.
+
+Blame entries are [email, datestamp, has_code], where datestamp is the
+epoch of the line's commit, parsed once here whatever the VCS.
+"""
+import calendar
+import os
+import re
+import time
+import subprocess
+import threading
+from contextlib import closing
+
+from command_runner import iter_command_lines
+from profiling import span
+
+
+# vcs => (command that succeeds in a work tree of the vcs, blame command,
+# regex of a blame output line unless it's parsed as --porcelain)
+VCS_PROBES = (('git', 'git rev-parse --git-dir', 'git blame --porcelain',
+               None),
+              ('svn', 'svn info', 'svn blame -v',
+               r'\s+\d+\s+(?P<email>.+)\s+'
+               '(?P<datestamp>\d{4}.+ \(.+\d{4}\)) '
+               '(?P<msg>.*)'))
+
+# 2012-01-02 12:34:56 -0800 (Mon, 02 Jan 2012)
+SVN_DATESTAMP_REGEX = re.compile(r'(?P<time>\d{4}-\d{2}-\d{2} '
+                                 r'\d{2}:\d{2}:\d{2}) '
+                                 r'(?P<sign>[+-])(?P<hours>\d{2})'
+                                 r'(?P<minutes>\d{2})')
+
+_DETECTED = None  # (vcs, blame command, blame regex)
+
+
+def _detect():
+    """
+    Detect the VCS of the current directory on first use, rather than on
+    import, so that commands that don't need it (such as --help) don't pay
+    for it. The probes only look for the repository, they don't scan the
+    work tree. Memoized per process.
+    """
+    global _DETECTED
+    if _DETECTED is None:
+        for vcs, probe, blame_cmd, blame_regex in VCS_PROBES:
+            try:
+                if subprocess.call(probe.split(' '),
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE) == 0:
+                    _DETECTED = (vcs, blame_cmd,
+                                 blame_regex and re.compile(blame_regex))
+                    break
+            except OSError:
+                pass
+        else:
+            raise RuntimeError("Please run this in a git or svn directory")
+    return _DETECTED
+
+
+def get_vcs():
+    """
+    Return the VCS of the current directory: 'git' or 'svn'.
+    """
+    return _detect()[0]
+
+
+def get_blame_cmd():
+    """
+    Return the blame command of the VCS, without the file to blame.
+    """
+    return _detect()[1]
+
+
+def get_blame_regex():
+    """
+    Return the compiled regex of a blame output line, or None for git,
+    whose blame output is parsed as --porcelain.
+    """
+    return _detect()[2]
+
+
+try:
+    from author_mapping import AUTHOR_MAPPING
+except ImportError:
+    AUTHOR_MAPPING = {}
+
+
+def get_author_alias(author):
+    """
+    Map a committer email (or a TODO owner) to the author's name.
+    """
+    if author in AUTHOR_MAPPING:
+        return AUTHOR_MAPPING[author]
+    return author
+
+
+def parse_svn_datestamp(datestamp):
+    """
+    Return the epoch of a datestamp of 'svn blame -v', or None if it
+    can't be parsed.
+    """
+    matched = SVN_DATESTAMP_REGEX.match(datestamp)
+    if not matched:
+        return None
+    local_time = calendar.timegm(time.strptime(matched.group('time'),
+                                               '%Y-%m-%d %H:%M:%S'))
+    offset = (int(matched.group('hours')) * 3600 +
+              int(matched.group('minutes')) * 60)
+    if matched.group('sign') == '-':
+        offset = -offset
+    return local_time - offset
+
+
+def _iter_blame_output(lines):
+    """
+    Parse the output lines of 'svn blame -v' as they are read.
+    """
+    blame_regex = get_blame_regex()
+    for line in lines:
+        matched = blame_regex.match(line.rstrip("\n"))
+        if matched:
+            email, datestamp, code_line = matched.group(
+                'email', 'datestamp', 'msg')
+            yield [email, parse_svn_datestamp(datestamp), bool(code_line)]
+        else:
+            yield None
+
+
+def _iter_porcelain_output(lines):
+    """
+    Parse the output lines of 'git blame --porcelain' as they are read.
+    Yields a (0-based line number, entry) per blamed line, in line order.
+    The details of a commit are only output with its first line, so they
+    are kept by commit.
+    """
+    commits = {}  # sha => [email, datestamp]
+    commit = None
+    line_number = None
+    for line in lines:
+        if line.startswith("\t"):
+            yield line_number, [commit[0], commit[1],
+                                bool(line[1:].rstrip("\n"))]
+            commit = None
+        elif commit is None:
+            # <sha> SP <source line> SP <result line> [SP <lines in group>]
+            fields = line.split(' ')
+            commit = commits.setdefault(fields[0], [None, None])
+            line_number = int(fields[2]) - 1
+        else:
+            key, _, value = line.rstrip("\n").partition(' ')
+            if key == 'author-mail':
+                commit[0] = value.strip('<>')
+            elif key == 'author-time':
+                commit[1] = int(value)
+
+
+def _get_blame_args(file_path, rev=None, options=()):
+    blame_args = get_blame_cmd().split(' ') + list(options)
+    if get_vcs() == 'git':
+        return blame_args + filter(None, [rev, '--', file_path])
+    if rev is None:
+        return blame_args + [file_path]
+    return blame_args + ['-r', rev, file_path]
+
+
+def run_blame(file_path, timeout=None, rev=None):
+    """
+    Blame a file. Returns one entry per line of the file: None if the
+    line could not be parsed, otherwise [email, datestamp, has_code],
+    where has_code tells whether the blamed line is not empty.
+
+    param {float} timeout: [optional] see command_runner.read_command.
+    param {str} rev: [optional] blame the file as of this revision rather
+        than as it is in the work tree.
+    """
+    blame_output = iter_command_lines(_get_blame_args(file_path, rev),
+                                      timeout)
+    if get_vcs() == 'git':
+        return [blame_line for _line_number, blame_line in
+                _iter_porcelain_output(blame_output)]
+    return list(_iter_blame_output(blame_output))
+
+
+def get_line_ranges(line_numbers):
+    """
+    Coalesce sorted line numbers into a list of [first, last] ranges.
+    """
+    line_ranges = []
+    for line_number in line_numbers:
+        if line_ranges and line_ranges[-1][1] == line_number - 1:
+            line_ranges[-1][1] = line_number
+        else:
+            line_ranges.append([line_number, line_number])
+    return line_ranges
+
+
+def run_blame_lines(file_path, line_numbers, rev=None):
+    """
+    Blame some lines of a file. Returns a dict of 0-based line number to
+    the entry run_blame() would have for it. git blames only the ranges
+    of lines asked for; svn can't, so it blames the file up to the last
+    line asked for, and stops reading there.
+
+    param {str} rev: [optional] see run_blame.
+    """
+    line_numbers = sorted(set(line_numbers))
+    if get_vcs() == 'git':
+        range_args = []
+        for first, last in get_line_ranges(line_numbers):
+            range_args.extend(['-L', '%d,%d' % (first + 1, last + 1)])
+        blame_output = iter_command_lines(
+            _get_blame_args(file_path, rev, range_args), quiet=True)
+        return dict(_iter_porcelain_output(blame_output))
+    with closing(iter_command_lines(_get_blame_args(file_path, rev))) as (
+            blame_output):
+        blamed = {}
+        wanted = set(line_numbers)
+        for line_number, blame_line in enumerate(
+                _iter_blame_output(blame_output)):
+            if not wanted:
+                break
+            if line_number in wanted:
+                blamed[line_number] = blame_line
+                wanted.remove(line_number)
+        return blamed
+
+
+class CatFile(object):
+    """
+    A long-lived 'git cat-file --batch' process, that reads any number of
+    objects, one after the other.
+    """
+    def __init__(self):
+        self.process = subprocess.Popen(['git', 'cat-file', '--batch'],
+                                        stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE,
+                                        bufsize=1 << 16)
+
+    def read(self, object_name):
+        """
+        Return the contents of an object, or None if there is no such
+        object.
+        """
+        self.process.stdin.write(object_name + "\n")
+        self.process.stdin.flush()
+        # <sha> SP <type> SP <size> LF <contents> LF, or <name> SP missing
+        header = self.process.stdout.readline()
+        if not header:
+            raise RuntimeError("git cat-file exited")
+        header = header.split()
+        if len(header) != 3:
+            return None
+        contents = self.process.stdout.read(int(header[2]))
+        self.process.stdout.read(1)
+        return contents
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+
+
+class CatFilePool(object):
+    """
+    The CatFile processes of this process: one per thread reading objects
+    at the same time, kept until close(). A forked worker starts its own,
+    since it can't share the pipes of its parent.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.idle = []
+        self.pid = os.getpid()
+
+    def read(self, object_name):
+        """
+        Same as CatFile.read, with a process of the pool.
+        """
+        with self.lock:
+            if self.pid != os.getpid():
+                self.idle = []
+                self.pid = os.getpid()
+            cat_file = self.idle and self.idle.pop() or None
+        if cat_file is None:
+            cat_file = CatFile()
+        try:
+            contents = cat_file.read(object_name)
+        except Exception:
+            cat_file.close()
+            raise
+        with self.lock:
+            if self.pid == os.getpid():
+                self.idle.append(cat_file)
+        return contents
+
+    def close(self):
+        """
+        Stop the processes of the pool.
+        """
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for cat_file in idle:
+            cat_file.close()
+
+
+_CAT_FILES = CatFilePool()
+
+
+def read_blob(object_name):
+    """
+    Return the contents of a git object (such as a blob SHA, or
+    'REV:path'), read through the pool of cat-file processes.
+    """
+    with span('cat-file'):
+        contents = _CAT_FILES.read(object_name)
+    if contents is None:
+        raise RuntimeError("No such git object: %s" % object_name)
+    return contents
+
+
+def close_cat_files():
+    """
+    Stop the cat-file processes, for the end of a run.
+    """
+    _CAT_FILES.close()